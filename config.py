@@ -293,6 +293,15 @@ MODELS = {
         "forecast_hour_digits": 2,
         "max_hours_by_init": {"00": 48, "06": 48, "12": 48, "18": 48, "default": 18},
         "tile_resolution_deg": 0.03,
+        # Token buckets per download host (strictest across models wins)
+        "download_limits": {"noaa-hrrr-bdp-pds.s3.amazonaws.com": {"rate_per_s": 50.0, "burst": 50}},
+        # Byte cap for this model's cached GRIB messages (evicted LRU first)
+        "grib_cache_quota_mb": 512,
+        # Paths under a GRIB_MIRROR_URL, as in the upstream bucket ({date}: run init, {fxx}: hour)
+        "mirror_layout": {
+            "grib": "hrrr.{date:%Y%m%d}/conus/hrrr.t{date:%H}z.wrfsfcf{fxx:02d}.grib2",
+            "idx": "hrrr.{date:%Y%m%d}/conus/hrrr.t{date:%H}z.wrfsfcf{fxx:02d}.grib2.idx",
+        },
     },
     "nam_nest": {
         "name": "NAM 3km CONUS",
@@ -301,6 +310,14 @@ MODELS = {
         "max_forecast_hours": 60,
         "update_frequency_hours": 6,
         "forecast_hour_digits": 2,
+        # NOMADS throttles per request: fewer, larger range requests
+        "range_merge_gap_bytes": 2 * 1024 * 1024,
+        "download_limits": {"nomads.ncep.noaa.gov": {"rate_per_s": 2.0, "burst": 1, "backoff_s": 5.0, "probe_concurrency": 2}},
+        "grib_cache_quota_mb": 256,
+        "mirror_layout": {
+            "grib": "nam.{date:%Y%m%d}/nam.t{date:%H}z.conusnest.hiresf{fxx:02d}.tm00.grib2",
+            "idx": "nam.{date:%Y%m%d}/nam.t{date:%H}z.conusnest.hiresf{fxx:02d}.tm00.grib2.idx",
+        },
     },
     "gfs": {
         "name": "GFS",
@@ -314,6 +331,12 @@ MODELS = {
             {"start": 246, "end": 384, "step": 6},
         ],
         "tile_resolution_deg": 0.25,
+        "download_limits": {"noaa-gfs-bdp-pds.s3.amazonaws.com": {"rate_per_s": 50.0, "burst": 50}},
+        "grib_cache_quota_mb": 768,
+        "mirror_layout": {
+            "grib": "gfs.{date:%Y%m%d}/{date:%H}/atmos/gfs.t{date:%H}z.pgrb2.0p25.f{fxx:03d}",
+            "idx": "gfs.{date:%Y%m%d}/{date:%H}/atmos/gfs.t{date:%H}z.pgrb2.0p25.f{fxx:03d}.idx",
+        },
     },
     "nbm": {
         "name": "National Blend (NBM)",
@@ -330,6 +353,14 @@ MODELS = {
             "default": 36,
             "00": 264, "06": 264, "12": 264, "18": 264,
         },
+        # NOMADS throttles per request: fewer, larger range requests
+        "range_merge_gap_bytes": 2 * 1024 * 1024,
+        "download_limits": {"nomads.ncep.noaa.gov": {"rate_per_s": 2.0, "burst": 1, "backoff_s": 5.0, "probe_concurrency": 2}},
+        "grib_cache_quota_mb": 512,
+        "mirror_layout": {
+            "grib": "blend.{date:%Y%m%d}/{date:%H}/core/blend.t{date:%H}z.core.f{fxx:03d}.co.grib2",
+            "idx": "blend.{date:%Y%m%d}/{date:%H}/core/blend.t{date:%H}z.core.f{fxx:03d}.co.grib2.idx",
+        },
     },
     "ecmwf_hres": {
         "name": "ECMWF HRES",
@@ -349,14 +380,57 @@ MODELS = {
             "06": 144, "18": 144,
             "default": 144,
         },
+        "download_limits": {"data.ecmwf.int": {"rate_per_s": 5.0, "burst": 5}},
+        "grib_cache_quota_mb": 768,
+        "mirror_layout": {
+            "grib": "{date:%Y%m%d}/{date:%H}z/ifs/0p25/oper/{date:%Y%m%d%H}0000-{fxx}h-oper-fc.grib2",
+            "idx": "{date:%Y%m%d}/{date:%H}z/ifs/0p25/oper/{date:%Y%m%d%H}0000-{fxx}h-oper-fc.index",
+            "idx_style": "eccodes",
+        },
     },
 }
 
+def _grib_mirrors() -> dict:
+    """Mirror root per model: GRIB_MIRROR_URL_<MODEL_ID> or else GRIB_MIRROR_URL.
+
+    A root is a directory (plain path or file://) or a Range-capable http(s)
+    URL holding files at each model's mirror_layout paths.
+    """
+    default = os.environ.get("GRIB_MIRROR_URL", "")
+    mirrors = {}
+    for model_id in MODELS:
+        root = os.environ.get(f"GRIB_MIRROR_URL_{model_id.upper()}", default)
+        if root:
+            mirrors[model_id] = root
+    return mirrors
+
+
 repomap = {
     "CACHE_DIR": "cache",
     "TILES_DIR": "cache/tiles",
     "DB_PATH": "cache/jobs.db",
     "HERBIE_SAVE_DIR": os.environ.get("HERBIE_SAVE_DIR", "cache/herbie"),
+    "CELL_MAP_DIR": "cache/cell_maps",
+    "TILE_CACHE_MAX_MB": int(os.environ.get("TILE_CACHE_MAX_MB", "128")),
+    # Remote metadata cache (resolved GRIB URL + idx inventory per model/run/fxx)
+    "REMOTE_META_TTL_S": int(os.environ.get("REMOTE_META_TTL_S", str(6 * 3600))),
+    "REMOTE_META_NEGATIVE_TTL_S": int(os.environ.get("REMOTE_META_NEGATIVE_TTL_S", "600")),
+    # Concurrent ranged GETs per process; hosts without download_limits get the default bucket
+    "DOWNLOAD_POOL_SIZE": int(os.environ.get("DOWNLOAD_POOL_SIZE", "8")),
+    "DOWNLOAD_DEFAULT_LIMIT": {"rate_per_s": 10.0, "burst": 10, "backoff_s": 5.0, "probe_concurrency": 4},
+    "DOWNLOAD_MAX_RETRIES": int(os.environ.get("DOWNLOAD_MAX_RETRIES", "4")),
+    # Threads for scheduler availability probes and idx planning (capped per host by probe_concurrency)
+    "PROBE_POOL_SIZE": int(os.environ.get("PROBE_POOL_SIZE", "16")),
+    # "eccodes": decode messages straight into NumPy, skipping cfgrib/xarray
+    # (falls back to the xarray decode for any variable it cannot handle)
+    "GRIB_DECODER": os.environ.get("GRIB_DECODER", "xarray"),
+    # LRU budget for cached GRIB messages in HERBIE_SAVE_DIR (0 disables caching);
+    # per-model cap: MODELS[...]["grib_cache_quota_mb"]
+    "GRIB_CACHE_MAX_MB": int(os.environ.get("GRIB_CACHE_MAX_MB", "2048")),
+    "GRIB_MIRRORS": _grib_mirrors(),
+    # GRIB messages closer than this are fetched in one ranged GET (gap bytes discarded);
+    # per-model override: MODELS[...]["range_merge_gap_bytes"]
+    "GRIB_RANGE_MERGE_GAP_BYTES": int(os.environ.get("GRIB_RANGE_MERGE_GAP_BYTES", str(256 * 1024))),
     "DEFAULT_MODEL": "hrrr",
     "DEFAULT_VARIABLE": "t2m",
     "WEATHER_VARIABLES": WEATHER_VARIABLES,
@@ -0,0 +1,612 @@
+"""SQLite connection management and schema migrations.
+
+Shared by jobs.py, tile_db.py, status_utils.py and the status routes. The
+schema is versioned with ``PRAGMA user_version``: ``connect()`` applies any
+pending entries of ``MIGRATIONS`` once, so an up-to-date database is opened
+without executing DDL. ``get_connection()`` hands out one long-lived
+connection per thread for read-heavy request paths.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, col_def: str) -> None:
+    try:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_def}")
+    except sqlite3.OperationalError as exc:
+        if "duplicate column name" not in str(exc):
+            raise
+
+
+def _migration_base_schema(conn: sqlite3.Connection) -> None:
+    """jobs + tile_* tables as created before versioning (idempotent on old DBs)."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            type            TEXT    NOT NULL,
+            args_json       TEXT    NOT NULL,
+            args_hash       TEXT    NOT NULL,
+            priority        INTEGER NOT NULL DEFAULT 0,
+            status          TEXT    NOT NULL DEFAULT 'pending',
+            worker_id       TEXT,
+            created_at      TEXT    NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+            started_at      TEXT,
+            completed_at    TEXT,
+            retry_after     TEXT,
+            error_message   TEXT,
+            retry_count     INTEGER NOT NULL DEFAULT 0,
+            parent_job_id   INTEGER,
+            UNIQUE(type, args_hash)
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_claimable
+            ON jobs(status, retry_after, priority DESC, created_at ASC)
+            WHERE status = 'pending';
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_by_type_status
+            ON jobs(type, status);
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tile_runs (
+            region_id TEXT NOT NULL,
+            resolution_deg REAL NOT NULL,
+            model_id TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            init_time_utc TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (region_id, resolution_deg, model_id, run_id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tile_variables (
+            region_id TEXT NOT NULL,
+            resolution_deg REAL NOT NULL,
+            model_id TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            variable_id TEXT NOT NULL,
+            job_id INTEGER,
+            npz_path TEXT NOT NULL,
+            meta_path TEXT NOT NULL,
+            hours_json TEXT,
+            size_bytes INTEGER,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (region_id, resolution_deg, model_id, run_id, variable_id)
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tile_hours (
+            region_id TEXT NOT NULL,
+            resolution_deg REAL NOT NULL,
+            model_id TEXT NOT NULL,
+            run_id TEXT NOT NULL,
+            variable_id TEXT NOT NULL,
+            forecast_hour INTEGER NOT NULL,
+            job_id INTEGER,
+            npz_path TEXT NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (
+                region_id, resolution_deg, model_id, run_id, variable_id, forecast_hour
+            )
+        )
+        """
+    )
+    _ensure_column(conn, "tile_variables", "job_id", "INTEGER")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_tile_runs_model
+        ON tile_runs (region_id, resolution_deg, model_id, run_id)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_tile_vars_run
+        ON tile_variables (region_id, resolution_deg, model_id, run_id, variable_id)
+        """
+    )
+    # Drop legacy unique indexes that conflict with v2 worker (job_id=0 for finalize)
+    conn.execute("DROP INDEX IF EXISTS idx_tile_vars_job_id")
+    conn.execute("DROP INDEX IF EXISTS idx_tile_hours_job_id")
+
+
+def _migration_catalog(conn: sqlite3.Connection) -> None:
+    """Tile bounds on tile_runs and a generation counter bumped by catalog writes."""
+    for column in ("lat_min", "lat_max", "lon_min", "lon_max", "index_lon_min"):
+        _ensure_column(conn, "tile_runs", column, "REAL")
+    _ensure_column(conn, "tile_runs", "lon_0_360", "INTEGER")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalog_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO catalog_state (id, generation) VALUES (1, 0)")
+    # Triggers so writers that don't know about the counter (Rust worker) bump it too
+    for table in ("tile_runs", "tile_variables"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_generation
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE catalog_state SET generation = generation + 1 WHERE id = 1;
+                END
+                """
+            )
+
+
+# build_tile_hour args promoted to indexed columns (see _migration_job_columns)
+JOB_ARG_COLUMNS = (
+    ("region_id", "TEXT"),
+    ("model_id", "TEXT"),
+    ("run_id", "TEXT"),
+    ("variable_id", "TEXT"),
+    ("forecast_hour", "INTEGER"),
+)
+
+
+def _migration_job_columns(conn: sqlite3.Connection) -> None:
+    """Job args as generated columns with claim / run-completion indexes.
+
+    VIRTUAL generated columns (the only kind ALTER TABLE can add) derive from
+    args_json, so rows written by any client, including the Rust server's
+    enqueue, stay consistent. Building the indexes backfills existing rows.
+    """
+    for column, col_type in JOB_ARG_COLUMNS:
+        _ensure_column(
+            conn, "jobs", column,
+            f"{col_type} GENERATED ALWAYS AS (json_extract(args_json, '$.{column}')) VIRTUAL",
+        )
+    # Superseded by idx_jobs_claim_order, which returns pending jobs already in
+    # claim order instead of sorting every pending row per claim
+    conn.execute("DROP INDEX IF EXISTS idx_jobs_claimable")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_claim_order
+            ON jobs(priority DESC, created_at ASC, id ASC)
+            WHERE status = 'pending';
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_claim_model
+            ON jobs(model_id, priority DESC, created_at ASC, id ASC)
+            WHERE status = 'pending';
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_run_status
+            ON jobs(model_id, run_id, status);
+        """
+    )
+
+
+# run_progress status buckets; 'cancelled' (Rust status route) counts as failed
+_PROGRESS_BUCKETS = {
+    "pending": "= 'pending'",
+    "processing": "= 'processing'",
+    "completed": "= 'completed'",
+    "failed": "IN ('failed', 'cancelled')",
+}
+
+
+def _progress_delta(row: str, sign: str) -> str:
+    """SET list applying one job row (NEW/OLD) to the run_progress counters."""
+    parts = [f"total = total {sign} 1"]
+    parts += [f"{bucket} = {bucket} {sign} ({row}.status {test})" for bucket, test in _PROGRESS_BUCKETS.items()]
+    return ", ".join(parts)
+
+
+def _progress_transition() -> str:
+    """SET list moving one job from OLD.status to NEW.status (total unchanged)."""
+    return ", ".join(
+        f"{bucket} = {bucket} - (OLD.status {test}) + (NEW.status {test})"
+        for bucket, test in _PROGRESS_BUCKETS.items()
+    )
+
+
+def _progress_key(row: str) -> str:
+    return (
+        f"model_id = {row}.model_id AND run_id = {row}.run_id"
+        f" AND region_id = COALESCE({row}.region_id, '')"
+        f" AND variable_id = COALESCE({row}.variable_id, '')"
+    )
+
+
+def _migration_run_progress(conn: sqlite3.Connection) -> None:
+    """Per-run job counters kept in step with jobs by triggers, plus a backfill.
+
+    Triggers run inside the writing statement's transaction, so every writer
+    (enqueue, claim, complete, fail, cancel, prune, and the Rust worker) keeps
+    the counts exact without extra round trips.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS run_progress (
+            model_id    TEXT    NOT NULL,
+            run_id      TEXT    NOT NULL,
+            region_id   TEXT    NOT NULL,
+            variable_id TEXT    NOT NULL,
+            total       INTEGER NOT NULL DEFAULT 0,
+            pending     INTEGER NOT NULL DEFAULT 0,
+            processing  INTEGER NOT NULL DEFAULT 0,
+            completed   INTEGER NOT NULL DEFAULT 0,
+            failed      INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (model_id, run_id, region_id, variable_id)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute("DELETE FROM run_progress")
+    bucket_sums = ", ".join(f"SUM(status {test})" for test in _PROGRESS_BUCKETS.values())
+    conn.execute(
+        f"""
+        INSERT INTO run_progress (model_id, run_id, region_id, variable_id, total, {', '.join(_PROGRESS_BUCKETS)})
+        SELECT model_id, run_id, COALESCE(region_id, ''), COALESCE(variable_id, ''), COUNT(*), {bucket_sums}
+        FROM jobs
+        WHERE model_id IS NOT NULL AND run_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_progress_insert
+        AFTER INSERT ON jobs
+        WHEN NEW.model_id IS NOT NULL AND NEW.run_id IS NOT NULL
+        BEGIN
+            INSERT OR IGNORE INTO run_progress (model_id, run_id, region_id, variable_id)
+            VALUES (NEW.model_id, NEW.run_id, COALESCE(NEW.region_id, ''), COALESCE(NEW.variable_id, ''));
+            UPDATE run_progress SET {_progress_delta('NEW', '+')} WHERE {_progress_key('NEW')};
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_progress_status
+        AFTER UPDATE OF status ON jobs
+        WHEN NEW.model_id IS NOT NULL AND NEW.run_id IS NOT NULL AND OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE run_progress SET {_progress_transition()}
+            WHERE {_progress_key('NEW')};
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_jobs_progress_delete
+        AFTER DELETE ON jobs
+        WHEN OLD.model_id IS NOT NULL AND OLD.run_id IS NOT NULL
+        BEGIN
+            UPDATE run_progress SET {_progress_delta('OLD', '-')} WHERE {_progress_key('OLD')};
+            DELETE FROM run_progress WHERE {_progress_key('OLD')} AND total <= 0;
+        END
+        """
+    )
+
+
+def _migration_leases(conn: sqlite3.Connection) -> None:
+    """Job leases renewed by worker heartbeats, plus the worker registry.
+
+    Rows claimed by clients that do not set a lease keep lease_expires_at NULL
+    and are only reset by recover_stale()'s started_at window.
+    """
+    _ensure_column(conn, "jobs", "lease_expires_at", "TEXT")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_jobs_lease
+            ON jobs(lease_expires_at)
+            WHERE status = 'processing';
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id       TEXT PRIMARY KEY,
+            pid             INTEGER,
+            hostname        TEXT,
+            model_id        TEXT,
+            started_at      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+            heartbeat_at    TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+            current_job_id  INTEGER
+        );
+        """
+    )
+
+
+def _migration_remote_meta(conn: sqlite3.Connection) -> None:
+    """Resolved GRIB source + parsed idx per (model, run, forecast hour).
+
+    A NULL grib_url is a cached negative result (not published yet).
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS remote_meta (
+            model_id        TEXT NOT NULL,
+            run_id          TEXT NOT NULL,
+            forecast_hour   INTEGER NOT NULL,
+            grib_url        TEXT,
+            idx_url         TEXT,
+            inventory_json  TEXT,
+            checked_at      TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
+            expires_at      TEXT NOT NULL,
+            PRIMARY KEY (model_id, run_id, forecast_hour)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def _migration_grib_cache(conn: sqlite3.Connection) -> None:
+    """Index of GRIB messages cached under HERBIE_SAVE_DIR, built from the access log."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS grib_cache (
+            path            TEXT PRIMARY KEY,
+            model_id        TEXT NOT NULL,
+            bytes           INTEGER NOT NULL,
+            last_access     TEXT NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_grib_cache_lru
+            ON grib_cache(model_id, last_access);
+        """
+    )
+
+
+def _migration_run_publish(conn: sqlite3.Connection) -> None:
+    """When each run's first and last forecast hours were seen missing / available.
+
+    *_missing_at is the latest probe that found the hour absent before it
+    appeared; a publish time only counts as an observation when it is set.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS run_publish (
+            model_id            TEXT    NOT NULL,
+            run_id              TEXT    NOT NULL,
+            init_time           TEXT    NOT NULL,
+            init_hour           INTEGER NOT NULL,
+            first_missing_at    TEXT,
+            first_available_at  TEXT,
+            last_missing_at     TEXT,
+            last_available_at   TEXT,
+            PRIMARY KEY (model_id, run_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_run_publish_history
+            ON run_publish(model_id, init_hour, init_time DESC);
+        """
+    )
+
+
+def _migration_run_watermark(conn: sqlite3.Connection) -> None:
+    """Per-run "published through" forecast hour (scheduler's incremental enqueue)."""
+    _ensure_column(conn, "run_publish", "published_through", "INTEGER")
+
+
+def _migration_tile_hours_mask(conn: sqlite3.Connection) -> None:
+    """Per-variable forecast-hour bitmap on tile_variables (scheduler completeness checks)."""
+    _ensure_column(conn, "tile_variables", "hours_mask", "BLOB")
+    # Bit h set for each built hour, little-endian bytes (tile_db.hours_mask)
+    rows = conn.execute("SELECT rowid, hours_json FROM tile_variables WHERE hours_mask IS NULL").fetchall()
+    updates = []
+    for rowid, hours_json in rows:
+        mask = sum(1 << int(h) for h in set(json.loads(hours_json or "[]")))
+        updates.append((mask.to_bytes((mask.bit_length() + 7) // 8, "little"), rowid))
+    conn.executemany("UPDATE tile_variables SET hours_mask = ? WHERE rowid = ?", updates)
+
+
+# run_YYYYMMDD_HH -> synoptic flag / ISO init time (NULL init for other ids)
+_RUN_ID_GLOB = "'run_[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_[0-9][0-9]'"
+
+
+def _run_is_synoptic_sql(run_id: str) -> str:
+    return f"CASE WHEN {run_id} GLOB {_RUN_ID_GLOB} THEN CAST(substr({run_id}, 14, 2) AS INTEGER) % 6 = 0 ELSE 0 END"
+
+
+def _run_init_time_sql(run_id: str) -> str:
+    return (
+        f"CASE WHEN {run_id} GLOB {_RUN_ID_GLOB} THEN substr({run_id}, 5, 4) || '-' || substr({run_id}, 9, 2)"
+        f" || '-' || substr({run_id}, 11, 2) || 'T' || substr({run_id}, 14, 2) || ':00:00Z' END"
+    )
+
+
+def _migration_tile_run_retention(conn: sqlite3.Connection) -> None:
+    """Indexed synoptic flag + init time on tile_runs (scheduler retention sweep)
+    and the queue of tile files it leaves for background deletion."""
+    _ensure_column(conn, "tile_runs", "is_synoptic", "INTEGER")
+    conn.execute(
+        f"""
+        UPDATE tile_runs SET
+            is_synoptic = {_run_is_synoptic_sql("run_id")},
+            init_time_utc = COALESCE(init_time_utc, {_run_init_time_sql("run_id")})
+        """
+    )
+    # Triggers so writers that don't know about the columns (Rust worker) fill them too
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tile_runs_insert_retention
+        AFTER INSERT ON tile_runs
+        WHEN NEW.is_synoptic IS NULL OR NEW.init_time_utc IS NULL
+        BEGIN
+            UPDATE tile_runs SET
+                is_synoptic = COALESCE(is_synoptic, {_run_is_synoptic_sql("NEW.run_id")}),
+                init_time_utc = COALESCE(init_time_utc, {_run_init_time_sql("NEW.run_id")})
+            WHERE rowid = NEW.rowid;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tile_runs_update_retention
+        AFTER UPDATE OF init_time_utc ON tile_runs
+        WHEN NEW.init_time_utc IS NULL
+        BEGIN
+            UPDATE tile_runs SET init_time_utc = {_run_init_time_sql("NEW.run_id")}
+            WHERE rowid = NEW.rowid;
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_tile_runs_retention
+            ON tile_runs(model_id, region_id, resolution_deg, is_synoptic, init_time_utc DESC)
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tile_deletions (
+            path TEXT PRIMARY KEY,
+            queued_at TEXT NOT NULL
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _migration_run_idx_gaps(conn: sqlite3.Connection) -> None:
+    """Published forecast hours whose idx has no message for a variable.
+
+    The scheduler enqueues no job for those (variable, hour) pairs, so the
+    completeness check must not wait for them. hours_mask as in tile_variables.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS run_idx_gaps (
+            model_id    TEXT NOT NULL,
+            run_id      TEXT NOT NULL,
+            variable_id TEXT NOT NULL,
+            hours_mask  BLOB NOT NULL,
+            PRIMARY KEY (model_id, run_id, variable_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+# Ordered schema steps; MIGRATIONS[i] brings user_version from i to i + 1.
+# Append only — never edit or reorder an entry that has shipped.
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _migration_base_schema,
+    _migration_catalog,
+    _migration_job_columns,
+    _migration_run_progress,
+    _migration_leases,
+    _migration_remote_meta,
+    _migration_grib_cache,
+    _migration_run_publish,
+    _migration_run_watermark,
+    _migration_tile_hours_mask,
+    _migration_tile_run_retention,
+    _migration_run_idx_gaps,
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations. Returns the resulting schema version."""
+    target = len(MIGRATIONS)
+    if schema_version(conn) >= target:
+        return target
+    conn.commit()
+    # Serialise concurrent starters; re-check once the write lock is held
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = schema_version(conn)
+        for step in MIGRATIONS[version:]:
+            step(conn)
+        conn.execute(f"PRAGMA user_version = {max(version, target)}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return target
+
+
+def connect(db_path: str, busy_timeout_ms: int = 30000, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a new connection with the standard pragmas and an up-to-date schema."""
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_ms / 1000, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    return conn
+
+
+_local = threading.local()
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """Return this thread's long-lived connection to ``db_path``.
+
+    The connection is opened (and migrated) on first use and reused afterwards;
+    callers must not close it. Any transaction left open by a previous caller
+    on this thread is rolled back. Use ``busy_timeout()`` to change its
+    timeout for one block only.
+    """
+    conns: Optional[Dict[str, sqlite3.Connection]] = getattr(_local, "conns", None)
+    # Connections must not cross a fork (gunicorn preload, multiprocessing)
+    if conns is None or getattr(_local, "pid", None) != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = connect(db_path)
+    elif conn.in_transaction:
+        conn.rollback()
+    return conn
+
+
+@contextmanager
+def busy_timeout(conn: sqlite3.Connection, busy_timeout_ms: int) -> Iterator[sqlite3.Connection]:
+    """Set ``conn``'s busy_timeout for the block, restoring the previous value after.
+
+    For shared get_connection() connections, where a plain PRAGMA would
+    silently apply to every later user of the thread's connection.
+    """
+    previous = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    try:
+        yield conn
+    finally:
+        conn.execute(f"PRAGMA busy_timeout={int(previous)}")
+
+
+def close_thread_connections() -> None:
+    """Close every connection cached for the calling thread."""
+    conns = getattr(_local, "conns", None) or {}
+    if getattr(_local, "pid", None) == os.getpid():
+        for conn in conns.values():
+            conn.close()
+    _local.conns = {}
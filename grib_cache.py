@@ -0,0 +1,237 @@
+"""Size-budgeted LRU cache of fetched GRIB messages under HERBIE_SAVE_DIR.
+
+Workers store each message they download as
+<model_id>/<YYYYMMDD>/<source file>.<start byte>.grib2 and append one line per
+store or hit to the access log. The scheduler's sweep() folds the log into the
+grib_cache table of the jobs DB and evicts least recently used files, first
+down to each model's grib_cache_quota_mb, then down to GRIB_CACHE_MAX_MB.
+Usage is read from the table; only adopt_untracked() walks the directory.
+"""
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import repomap
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+ACCESS_LOG_NAME = "access.log"
+
+_MB = 1024 * 1024
+
+
+def _cache_dir() -> str:
+    return repomap.get("HERBIE_SAVE_DIR", "cache/herbie")
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def enabled() -> bool:
+    return repomap.get("GRIB_CACHE_MAX_MB", 0) > 0
+
+
+def message_path(model_id: str, run_dt: datetime, source: str, start_byte: int) -> str:
+    """Cache-relative path of the message at start_byte of a remote GRIB file."""
+    name = os.path.basename(urlparse(source).path)
+    return f"{model_id}/{run_dt:%Y%m%d}/{name}.{start_byte}.grib2"
+
+
+def _log_access(model_id: str, rel_path: str, nbytes: int) -> None:
+    """Append one access record. Appenders share the lock; sweep() takes it exclusively."""
+    line = f"{_now()}\t{model_id}\t{nbytes}\t{rel_path}\n".encode("utf-8")
+    fd = os.open(os.path.join(_cache_dir(), ACCESS_LOG_NAME), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def read_message(model_id: str, rel_path: str) -> Optional[bytes]:
+    """Cached message bytes, or None on a miss (including a file evicted under us)."""
+    try:
+        with open(os.path.join(_cache_dir(), rel_path), "rb") as f:
+            data = f.read()
+        _log_access(model_id, rel_path, len(data))
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        logger.warning(f"GRIB cache read failed for {rel_path}: {exc}")
+        return None
+    return data
+
+
+def store_message(model_id: str, rel_path: str, data: bytes) -> None:
+    """Write a message atomically and log it. Failures only cost a future re-fetch."""
+    path = os.path.join(_cache_dir(), rel_path)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        _log_access(model_id, rel_path, len(data))
+    except OSError as exc:
+        logger.warning(f"GRIB cache write failed for {rel_path}: {exc}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _drain_access_log() -> List[Tuple[str, str, int, str]]:
+    """Read and truncate the access log. Returns (path, model_id, bytes, accessed_at)."""
+    log_path = os.path.join(_cache_dir(), ACCESS_LOG_NAME)
+    try:
+        with open(log_path, "r+b") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            data = f.read()
+            # O_APPEND writers blocked on the lock continue at the new end of file
+            f.truncate(0)
+    except FileNotFoundError:
+        return []
+
+    entries = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        parts = line.split("\t")
+        if len(parts) != 4 or not parts[2].isdigit():
+            continue
+        accessed_at, model_id, nbytes, rel_path = parts
+        entries.append((rel_path, model_id, int(nbytes), accessed_at))
+    return entries
+
+
+def ingest_access_log(conn: sqlite3.Connection) -> int:
+    """Fold the access log into the grib_cache index. Returns the number of records."""
+    entries = [
+        entry for entry in _drain_access_log()
+        # A hit logged just before its file was evicted must not resurrect the row
+        if os.path.exists(os.path.join(_cache_dir(), entry[0]))
+    ]
+    conn.executemany(
+        """
+        INSERT INTO grib_cache (path, model_id, bytes, last_access)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+            bytes = excluded.bytes,
+            last_access = MAX(last_access, excluded.last_access);
+        """,
+        entries,
+    )
+    conn.commit()
+    return len(entries)
+
+
+def cache_usage(conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+    """Indexed bytes: {"total": n, <model_id>: n, ...}."""
+    conn = conn or get_connection(repomap["DB_PATH"])
+    usage = {"total": 0}
+    for model_id, nbytes in conn.execute(
+        "SELECT model_id, SUM(bytes) FROM grib_cache GROUP BY model_id;"
+    ):
+        usage[model_id] = int(nbytes)
+        usage["total"] += int(nbytes)
+    return usage
+
+
+def _evict(conn: sqlite3.Connection, excess: int, model_id: Optional[str] = None) -> Tuple[int, int]:
+    """Delete least recently used files until excess bytes are freed. Returns (files, bytes)."""
+    if model_id is None:
+        rows = conn.execute("SELECT path, bytes FROM grib_cache ORDER BY last_access;")
+    else:
+        rows = conn.execute(
+            "SELECT path, bytes FROM grib_cache WHERE model_id = ? ORDER BY last_access;",
+            (model_id,),
+        )
+    victims = []
+    freed = 0
+    for rel_path, nbytes in rows:
+        if freed >= excess:
+            break
+        path = os.path.join(_cache_dir(), rel_path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning(f"GRIB cache eviction failed for {rel_path}: {exc}")
+            continue
+        try:
+            os.rmdir(os.path.dirname(path))  # drop emptied date directories
+        except OSError:
+            pass
+        victims.append((rel_path,))
+        freed += nbytes
+    conn.executemany("DELETE FROM grib_cache WHERE path = ?;", victims)
+    return len(victims), freed
+
+
+def sweep(conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+    """Ingest the access log, then enforce per-model quotas and the total budget."""
+    conn = conn or get_connection(repomap["DB_PATH"])
+    ingested = ingest_access_log(conn)
+    evicted = freed = 0
+
+    usage = cache_usage(conn)
+    for model_id, model_cfg in repomap["MODELS"].items():
+        quota = int(model_cfg.get("grib_cache_quota_mb", 0) * _MB)
+        if quota and usage.get(model_id, 0) > quota:
+            n, b = _evict(conn, usage[model_id] - quota, model_id)
+            evicted += n
+            freed += b
+
+    budget = int(repomap.get("GRIB_CACHE_MAX_MB", 0) * _MB)
+    total = usage["total"] - freed
+    if total > budget:
+        n, b = _evict(conn, total - budget)
+        evicted += n
+        freed += b
+    conn.commit()
+    return {"ingested": ingested, "evicted": evicted, "freed_bytes": freed}
+
+
+def adopt_untracked(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Index files missing from grib_cache (e.g. from before the index existed).
+
+    The one walk of the cache directory; run at scheduler startup. Files are
+    attributed to their top-level directory and aged by mtime.
+    """
+    conn = conn or get_connection(repomap["DB_PATH"])
+    cache_dir = _cache_dir()
+    rows = []
+    for root, _dirs, files in os.walk(cache_dir):
+        for name in files:
+            if name == ACCESS_LOG_NAME or ".tmp-" in name:
+                continue
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, cache_dir)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            mtime = datetime.fromtimestamp(st.st_mtime, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+            rows.append((rel_path, rel_path.split(os.sep)[0], st.st_size, mtime))
+    cursor = conn.executemany(
+        "INSERT OR IGNORE INTO grib_cache (path, model_id, bytes, last_access) VALUES (?, ?, ?, ?);",
+        rows,
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def reset(conn: Optional[sqlite3.Connection] = None) -> None:
+    """Forget every entry (after the cache directory was wiped)."""
+    conn = conn or get_connection(repomap["DB_PATH"])
+    conn.execute("DELETE FROM grib_cache;")
+    conn.commit()
@@ -1,18 +1,34 @@
 """Unified GRIB fetcher using Herbie for all models.
 
-Herbie handles downloading, caching, and idx-based byte-range subsetting.
-We never touch GRIB files directly — H.xarray(search) returns xarray Datasets.
+Herbie resolves the source URL and parses the .idx inventory. The matched
+messages are fetched here with coalesced byte-range requests
+(fetch_grib_messages) and decoded with cfgrib into xarray Datasets, or
+straight into NumPy with eccodes when GRIB_DECODER=eccodes.
 """
 from __future__ import annotations
 
+import fcntl
+import io
+import json
 import logging
 import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
 
 import numpy as np
+import pandas as pd
+import requests
 import xarray as xr
 from herbie import Herbie
 
+import grib_cache
 from config import repomap
+from db import get_connection
 from utils import GribDownloadError, format_forecast_hour
 
 logger = logging.getLogger(__name__)
@@ -88,62 +104,869 @@ def open_as_xarray(
     date_str: str,
     init_hour: str,
     forecast_hour: int,
+    planned: dict | None = None,
 ) -> xr.Dataset:
     """Fetch GRIB data via Herbie and return as xarray Dataset.
 
     Handles special cases:
     - Wind U/V: computes speed via ds.herbie.with_wind()
     - ECMWF snod: computes physical depth from sd (water equiv) and rsn (density)
+
+    planned: byte ranges from the job args (see open_hour_as_xarray).
     """
-    model_cfg = repomap["MODELS"][model_id]
-    herbie_model = model_cfg["herbie_model"]
+    datasets, errors = open_hour_as_xarray(model_id, [variable_id], date_str, init_hour, forecast_hour, planned)
+    if variable_id in errors:
+        raise GribDownloadError(errors[variable_id])
+    return datasets[variable_id]
+
+
+def _ecmwf_snod_dataset(ds_sd: xr.Dataset, ds_rsn: xr.Dataset) -> xr.Dataset:
+    """ECMWF snow depth: sd (water equiv) / rsn (density) -> physical depth."""
+    sd = ds_sd[list(ds_sd.data_vars)[0]]
+    rsn = ds_rsn[list(ds_rsn.data_vars)[0]]
 
+    # physical_depth_m = sd_water_equiv_m * 1000 / density_kg_m3
+    rsn_safe = rsn.where(rsn > 10.0, np.nan)
+    physical_depth = sd * 1000.0 / rsn_safe
+    physical_depth = physical_depth.fillna(0.0)
+
+    result = physical_depth.to_dataset(name="snod")
+    result.attrs = ds_sd.attrs
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Remote metadata cache: resolved source URL + parsed idx per (model, run, fxx),
+# shared by scheduler and workers through the jobs DB
+# ---------------------------------------------------------------------------
+
+_INVENTORY_COLUMNS = ["grib_message", "start_byte", "end_byte", "search_this"]
+
+
+class RemoteGrib:
+    """A resolved GRIB file: the parts of a Herbie object fetch_grib_messages uses."""
+
+    def __init__(self, model: str, date: datetime, fxx: int, grib: str, idx: str, inventory: pd.DataFrame):
+        self.model = model
+        self.date = date
+        self.fxx = fxx
+        self.grib = grib
+        self.idx = idx
+        self._inventory = inventory
+
+    def inventory(self) -> pd.DataFrame:
+        return self._inventory
+
+
+def _cached_remote(model_id: str, run_id: str, forecast_hour: int) -> sqlite3.Row | None:
     try:
-        H = _build_herbie(model_id, date_str, init_hour, forecast_hour)
+        return get_connection(repomap["DB_PATH"]).execute(
+            """
+            SELECT grib_url, idx_url, inventory_json FROM remote_meta
+            WHERE model_id = ? AND run_id = ? AND forecast_hour = ?
+              AND expires_at > strftime('%Y-%m-%dT%H:%M:%SZ','now');
+            """,
+            (model_id, run_id, forecast_hour),
+        ).fetchone()
+    except sqlite3.Error as exc:
+        logger.warning(f"remote_meta lookup failed: {exc}")
+        return None
+
+
+def _store_remote(
+    model_id: str,
+    run_id: str,
+    forecast_hour: int,
+    remote: RemoteGrib | None,
+) -> None:
+    if remote is None:
+        values = (None, None, None, repomap["REMOTE_META_NEGATIVE_TTL_S"])
+    else:
+        inventory = remote.inventory()
+        inventory_json = json.dumps({
+            column: [None if pd.isna(v) else v for v in inventory[column].tolist()]
+            for column in _INVENTORY_COLUMNS
+        })
+        values = (remote.grib, remote.idx, inventory_json, repomap["REMOTE_META_TTL_S"])
+    grib_url, idx_url, inventory_json, ttl_s = values
+    try:
+        conn = get_connection(repomap["DB_PATH"])
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO remote_meta
+                (model_id, run_id, forecast_hour, grib_url, idx_url, inventory_json, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?, strftime('%Y-%m-%dT%H:%M:%SZ','now', ?));
+            """,
+            (model_id, run_id, forecast_hour, grib_url, idx_url, inventory_json, f"+{ttl_s} seconds"),
+        )
+        conn.commit()
+    except sqlite3.Error as exc:
+        logger.warning(f"remote_meta store failed: {exc}")
+
+
+def resolve_remote(
+    model_id: str,
+    date_str: str,
+    init_hour: str,
+    forecast_hour: int,
+    use_negative_cache: bool = True,
+) -> RemoteGrib | None:
+    """Source URL and idx inventory for one GRIB file, or None if not published.
+
+    Served from remote_meta while fresh (REMOTE_META_TTL_S for hits,
+    REMOTE_META_NEGATIVE_TTL_S for misses); otherwise Herbie probes its
+    source list and parses the idx once and the result is stored. Publish
+    detection (scheduler probes) passes use_negative_cache=False so a cached
+    miss is probed again rather than reported for up to the negative TTL.
+    Models with a GRIB_MIRRORS entry resolve against the mirror only, uncached.
+    """
+    run_id = f"run_{date_str}_{init_hour}"
+    run_dt = datetime.strptime(f"{date_str}{init_hour}", "%Y%m%d%H")
+    herbie_model = repomap["MODELS"][model_id]["herbie_model"]
+    if model_id in repomap["GRIB_MIRRORS"]:
+        return _resolve_mirror(model_id, run_dt, forecast_hour)
+
+    row = _cached_remote(model_id, run_id, forecast_hour)
+    if row is not None and (row["grib_url"] is not None or use_negative_cache):
+        if row["grib_url"] is None:
+            return None
+        inventory = pd.DataFrame(json.loads(row["inventory_json"]), columns=_INVENTORY_COLUMNS)
+        inventory["end_byte"] = inventory["end_byte"].astype(float)
+        return RemoteGrib(herbie_model, run_dt, forecast_hour, row["grib_url"], row["idx_url"], inventory)
+
+    H = _build_herbie(model_id, date_str, init_hour, forecast_hour)
+    if H.grib is None or H.idx is None:
+        _store_remote(model_id, run_id, forecast_hour, None)
+        return None
+    remote = RemoteGrib(
+        herbie_model, run_dt, forecast_hour, str(H.grib), str(H.idx), H.inventory()[_INVENTORY_COLUMNS]
+    )
+    # Local copies (Herbie's full-file cache) can be cleaned up under us; only remember URLs
+    if remote.grib.startswith(("http://", "https://")):
+        _store_remote(model_id, run_id, forecast_hour, remote)
+    return remote
+
+
+def invalidate_remote_meta(model_id: str, run_id: str) -> int:
+    """Drop cached metadata for a run (e.g. once it is fully built)."""
+    conn = get_connection(repomap["DB_PATH"])
+    cursor = conn.execute(
+        "DELETE FROM remote_meta WHERE model_id = ? AND run_id = ?;",
+        (model_id, run_id),
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def prune_remote_meta() -> int:
+    """Delete expired remote_meta entries."""
+    conn = get_connection(repomap["DB_PATH"])
+    cursor = conn.execute(
+        "DELETE FROM remote_meta WHERE expires_at <= strftime('%Y-%m-%dT%H:%M:%SZ','now');"
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+# ---------------------------------------------------------------------------
+# Local mirror source (GRIB_MIRROR_URL): .grib2 + idx files laid out like the
+# upstream buckets, served from a directory or a Range-capable HTTP server
+# ---------------------------------------------------------------------------
+
+_WGRIB2_IDX_COLUMNS = ["grib_message", "start_byte", "reference_time", "variable", "level", "forecast_time", "?", "??", "???"]
+_ECCODES_SEARCH_COLUMNS = ["param", "levelist", "levtype", "number", "domain", "expver", "class", "type", "stream"]
 
-        # Special case: ECMWF snow depth needs sd + rsn
-        if variable_id == "snod" and herbie_model == "ifs":
-            return _fetch_ecmwf_snod(H)
+_LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
 
-        search = _get_search_string(variable_id, model_id)
-        if not search:
-            raise GribDownloadError(
-                f"No Herbie search string for {variable_id}/{model_id}"
+
+def _parse_idx(text: str, style: str) -> pd.DataFrame:
+    """Inventory columns (_INVENTORY_COLUMNS) of an idx file, computed as Herbie does.
+
+    style is "wgrib2" (NOAA ':'-separated lines) or "eccodes" (ECMWF JSON lines).
+    """
+    if style == "eccodes":
+        df = pd.DataFrame([json.loads(line) for line in text.splitlines() if line])
+        df["grib_message"] = df.index + 1
+        df["start_byte"] = df["_offset"]
+        df["end_byte"] = df["_offset"] + df["_length"]
+        df = df.reindex(columns=_INVENTORY_COLUMNS[:3] + _ECCODES_SEARCH_COLUMNS)
+        df["search_this"] = (
+            ":" + df.loc[:, "param":].astype(str).apply(lambda x: x.str.cat(sep=":"), axis=1).str.replace(":nan:", ":")
+            + ":"
+        )
+    else:
+        df = pd.read_csv(io.StringIO(text), sep=":", names=_WGRIB2_IDX_COLUMNS)
+        df["start_byte"] = df["start_byte"].astype(int)
+        df["end_byte"] = df["start_byte"].shift(-1) - 1
+        df = df.dropna(how="all", axis=1)
+        search_columns = [c for c in _WGRIB2_IDX_COLUMNS[3:] if c in df.columns]
+        df["search_this"] = (
+            ":" + df[search_columns].astype(str).apply(lambda x: x.str.cat(sep=":"), axis=1).replace(":nan:", ":")
+            + ":"
+        )
+    df = df[_INVENTORY_COLUMNS].copy()
+    df["end_byte"] = df["end_byte"].astype(float)
+    return df
+
+
+def _mirror_location(root: str, path: str) -> str:
+    """URL (http mirrors) or local path (file:// or plain directory) of a mirrored file."""
+    parsed = urlparse(root)
+    if parsed.scheme in ("http", "https"):
+        return f"{root.rstrip('/')}/{path}"
+    return os.path.join(parsed.path if parsed.scheme == "file" else root, path)
+
+
+def _read_mirror_text(location: str) -> str | None:
+    if not location.startswith(("http://", "https://")):
+        try:
+            with open(location, "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    response = _session_for(urlparse(location).hostname or "").get(location, timeout=60)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.text
+
+
+def _resolve_mirror(model_id: str, run_dt: datetime, forecast_hour: int) -> RemoteGrib | None:
+    """RemoteGrib for a mirrored file from the model's mirror_layout, or None if not staged."""
+    model_cfg = repomap["MODELS"][model_id]
+    root = repomap["GRIB_MIRRORS"][model_id]
+    layout = model_cfg["mirror_layout"]
+    grib = _mirror_location(root, layout["grib"].format(date=run_dt, fxx=forecast_hour))
+    idx = _mirror_location(root, layout["idx"].format(date=run_dt, fxx=forecast_hour))
+    text = _read_mirror_text(idx)
+    if text is None:
+        return None
+    inventory = _parse_idx(text, layout.get("idx_style", "wgrib2"))
+    return RemoteGrib(model_cfg["herbie_model"], run_dt, forecast_hour, grib, idx, inventory)
+
+
+# ---------------------------------------------------------------------------
+# Byte-range fetch layer: idx-resolved messages, coalesced into few requests
+# ---------------------------------------------------------------------------
+
+def coalesce_ranges(
+    ranges: list[tuple[int, int | None]],
+    max_gap_bytes: int,
+) -> list[tuple[int, int | None]]:
+    """Merge inclusive (start, end) byte ranges at most max_gap_bytes apart.
+
+    end=None means "to end of file" and absorbs every later range.
+    """
+    merged: list[tuple[int, int | None]] = []
+    for start, end in sorted(set(ranges), key=lambda r: (r[0], r[1] is None, r[1] or 0)):
+        if merged:
+            m_start, m_end = merged[-1]
+            if m_end is None:
+                continue
+            if start - m_end - 1 <= max_gap_bytes:
+                merged[-1] = (m_start, None if end is None else max(m_end, end))
+                continue
+        merged.append((start, end))
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# Download pool: bounded threads, keep-alive Session and token bucket per host
+# ---------------------------------------------------------------------------
+
+class HostRateLimiter:
+    """Token bucket for one download host, shared by every process on the machine.
+
+    State (tokens, last refill, blocked-until) lives in a small flock'ed file,
+    so all workers together stay under the host's limit.
+    """
+
+    def __init__(self, state_path: str, rate_per_s: float, burst: int):
+        self.state_path = state_path
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+
+    def _update(self, fn):
+        with open(self.state_path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                tokens, updated, blocked_until = (float(v) for v in f.read().split())
+            except ValueError:
+                tokens, updated, blocked_until = float(self.burst), time.time(), 0.0
+            now = time.time()
+            tokens = min(float(self.burst), tokens + (now - updated) * self.rate_per_s)
+            tokens, blocked_until, result = fn(now, tokens, blocked_until)
+            f.seek(0)
+            f.truncate()
+            f.write(f"{tokens} {now} {blocked_until}")
+            return result
+
+    def acquire(self) -> None:
+        """Block until a request to this host is allowed."""
+        def take(now, tokens, blocked_until):
+            if now < blocked_until:
+                return tokens, blocked_until, blocked_until - now
+            if tokens >= 1.0:
+                return tokens - 1.0, blocked_until, 0.0
+            return tokens, blocked_until, (1.0 - tokens) / self.rate_per_s
+
+        while True:
+            wait_s = self._update(take)
+            if wait_s <= 0:
+                return
+            time.sleep(wait_s)
+
+    def block_for(self, seconds: float) -> None:
+        """Hold off every process's requests to this host (302/429 backoff)."""
+        self._update(lambda now, tokens, blocked_until: (0.0, max(blocked_until, now + seconds), None))
+
+
+_download_lock = threading.Lock()
+_sessions: dict[str, requests.Session] = {}
+_limiters: dict[str, HostRateLimiter] = {}
+_download_pool: tuple[int, ThreadPoolExecutor] | None = None
+
+
+def _host_limit(host: str) -> dict:
+    """download_limits entry for a host; the strictest one if several models list it."""
+    configured = [
+        cfg["download_limits"][host]
+        for cfg in repomap["MODELS"].values()
+        if host in cfg.get("download_limits", {})
+    ]
+    limit = dict(repomap["DOWNLOAD_DEFAULT_LIMIT"])
+    if configured:
+        limit.update(min(configured, key=lambda l: l.get("rate_per_s", float("inf"))))
+    return limit
+
+
+def _session_for(host: str) -> requests.Session:
+    with _download_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=repomap["DOWNLOAD_POOL_SIZE"])
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return session
+
+
+def _limiter_for(host: str) -> HostRateLimiter:
+    with _download_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limit = _host_limit(host)
+            limiter = HostRateLimiter(
+                os.path.join(tempfile.gettempdir(), f"rc-rate-{host}"),
+                float(limit["rate_per_s"]),
+                int(limit["burst"]),
             )
+            _limiters[host] = limiter
+        return limiter
 
-        ds = H.xarray(search)
 
-        # Wind: if we fetched U/V components, compute magnitude
-        if variable_id == "wind_10m" and herbie_model not in ("nbm",):
-            ds = ds.herbie.with_wind(which="speed")
+def _pool() -> ThreadPoolExecutor:
+    global _download_pool
+    with _download_lock:
+        # Recreate after fork: executor threads do not survive it
+        if _download_pool is None or _download_pool[0] != os.getpid():
+            _download_pool = (
+                os.getpid(),
+                ThreadPoolExecutor(repomap["DOWNLOAD_POOL_SIZE"], thread_name_prefix="grib-download"),
+            )
+        return _download_pool[1]
 
-        return ds
 
-    except GribDownloadError:
-        raise
-    except Exception as exc:
+def _read_range(source: str, start: int, end: int | None) -> bytes:
+    """Bytes start..end (inclusive; None = EOF) of a remote URL or local file."""
+    if not source.startswith(("http://", "https://")):
+        with open(source, "rb") as f:
+            f.seek(start)
+            return f.read() if end is None else f.read(end - start + 1)
+
+    host = urlparse(source).hostname or ""
+    # Loopback mirrors are not throttled
+    limiter = None if host in _LOOPBACK_HOSTS else _limiter_for(host)
+    session = _session_for(host)
+    backoff_s = float(_host_limit(host)["backoff_s"])
+    max_retries = repomap["DOWNLOAD_MAX_RETRIES"]
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        response = session.get(
+            source,
+            headers={"Range": f"bytes={start}-{'' if end is None else end}"},
+            timeout=60,
+            allow_redirects=False,  # NOMADS signals rate limiting with a 302
+        )
+        if response.status_code in (302, 429):
+            retry_after = response.headers.get("Retry-After", "")
+            wait_s = float(retry_after) if retry_after.isdigit() else backoff_s * 2**attempt
+            response.close()
+            logger.warning(f"{host} returned {response.status_code}; backing off {wait_s:.1f}s")
+            if limiter:
+                limiter.block_for(wait_s)
+            else:
+                time.sleep(wait_s)
+            continue
+        if response.status_code == 404:
+            raise GribDownloadError(f"GRIB2 file not found: {source}")
+        response.raise_for_status()
+        if response.status_code != 206:
+            # A proxy dropping the Range header would hand us the whole file
+            raise GribDownloadError(f"Range request not honored by {source} (HTTP {response.status_code})")
+        return response.content
+    raise GribDownloadError(f"Rate limited by {host}: gave up after {max_retries + 1} attempts")
+
+
+def fetch_grib_messages(
+    H: Herbie | RemoteGrib,
+    searches: list[str],
+    max_gap_bytes: int | None = None,
+    model_id: str | None = None,
+) -> dict[str, list[bytes]]:
+    """Fetch the GRIB messages matching each search with as few requests as possible.
+
+    Searches are resolved against the .idx inventory; the byte ranges of all
+    matched messages are merged when at most max_gap_bytes apart (the gap
+    bytes are downloaded and discarded) and each merged span is one ranged
+    GET. With a model_id, remote messages are served from and stored in the
+    GRIB cache (grib_cache). Returns {search: [message bytes, in inventory order]}.
+    """
+    if max_gap_bytes is None:
+        max_gap_bytes = repomap["GRIB_RANGE_MERGE_GAP_BYTES"]
+    if H.grib is None:
+        raise GribDownloadError(f"GRIB2 file not found: {H.model} {H.date:%Y-%m-%d %H}z f{H.fxx}")
+    if H.idx is None:
+        raise GribDownloadError(f"GRIB2 index not found: {H.model} {H.date:%Y-%m-%d %H}z f{H.fxx}")
+
+    inventory = H.inventory()
+    matches = {
+        search: inventory[inventory.search_this.str.contains(search)]
+        for search in searches
+    }
+    spans = {}
+    for rows in matches.values():
+        for row in rows.itertuples():
+            end = None if pd.isna(row.end_byte) else int(row.end_byte)
+            spans[int(row.grib_message)] = (int(row.start_byte), end)
+    if not spans:
         raise GribDownloadError(
-            f"Herbie fetch failed for {model_id}/{variable_id} "
-            f"{date_str} {init_hour}z f{forecast_hour}: {exc}"
-        ) from exc
+            f"No GRIB messages in {H.model} {H.date:%Y-%m-%d %H}z f{H.fxx} match {searches}"
+        )
 
+    fetched = fetch_byte_ranges(str(H.grib), H.date, list(spans.values()), max_gap_bytes, model_id)
+    return {
+        search: [fetched[spans[int(m)][0]] for m in rows.grib_message]
+        for search, rows in matches.items()
+    }
 
-def _fetch_ecmwf_snod(H: Herbie) -> xr.Dataset:
-    """Fetch ECMWF snow depth: sd (water equiv) / rsn (density) -> physical depth."""
-    ds_sd = H.xarray(":sd:")
-    ds_rsn = H.xarray(":rsn:")
 
-    sd = ds_sd[list(ds_sd.data_vars)[0]]
-    rsn = ds_rsn[list(ds_rsn.data_vars)[0]]
+def fetch_byte_ranges(
+    source: str,
+    run_dt: datetime,
+    ranges: list[tuple[int, int | None]],
+    max_gap_bytes: int,
+    model_id: str | None = None,
+) -> dict[int, bytes]:
+    """Fetch GRIB messages by (start, end) byte range. Returns {start: message bytes}.
 
-    # physical_depth_m = sd_water_equiv_m * 1000 / density_kg_m3
-    rsn_safe = rsn.where(rsn > 10.0, np.nan)
-    physical_depth = sd * 1000.0 / rsn_safe
-    physical_depth = physical_depth.fillna(0.0)
+    Ranges at most max_gap_bytes apart share one GET. With a model_id, remote
+    messages are served from and stored in the GRIB cache (grib_cache).
+    """
+    # Only upstream downloads are cached; local files and mirrors are read in place
+    cache_model = None
+    if model_id and model_id not in repomap["GRIB_MIRRORS"] and source.startswith(("http://", "https://")):
+        cache_model = model_id if grib_cache.enabled() else None
+    fetched: dict[int, bytes] = {}
+    if cache_model:
+        for start, _ in ranges:
+            data = grib_cache.read_message(cache_model, grib_cache.message_path(cache_model, run_dt, source, start))
+            if data is not None:
+                fetched[start] = data
+    missing = {start: end for start, end in ranges if start not in fetched}
+    if not missing:
+        logger.debug(f"All {len(ranges)} GRIB messages from {source} served from cache")
+        return fetched
 
-    result = physical_depth.to_dataset(name="snod")
-    result.attrs = ds_sd.attrs
-    return result
+    merged = coalesce_ranges(list(missing.items()), max_gap_bytes)
+    # Spans download concurrently; per-host limiters keep throttled sources paced
+    payloads = _pool().map(lambda span: _read_range(source, *span), merged)
+    blobs = [(start, end, blob) for (start, end), blob in zip(merged, payloads)]
+    logger.debug(
+        f"Fetched {len(missing)} GRIB messages in {len(blobs)} range requests from {source} "
+        f"({len(fetched)} cached)"
+    )
+
+    def message_bytes(start: int, end: int | None) -> bytes:
+        for b_start, b_end, blob in blobs:
+            if b_start <= start and (b_end is None or (end is not None and end <= b_end)):
+                offset = start - b_start
+                return blob[offset:] if end is None else blob[offset:offset + end - start + 1]
+        raise GribDownloadError(f"Byte range {start}-{end} missing from fetched spans")
+
+    for start, end in missing.items():
+        fetched[start] = message_bytes(start, end)
+        if cache_model:
+            grib_cache.store_message(
+                cache_model, grib_cache.message_path(cache_model, run_dt, source, start), fetched[start]
+            )
+    return fetched
+
+
+def _decode_messages(buffers: list[bytes]) -> xr.Dataset:
+    """Decode raw GRIB messages into one Dataset (loaded into memory)."""
+    # Imported here, after herbie: loading eccodes ahead of pyproj's PROJ
+    # libraries can abort the interpreter on some builds
+    import cfgrib
+
+    fd, scratch_path = tempfile.mkstemp(suffix=".grib2")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for buffer in buffers:
+                f.write(buffer)
+        datasets = [
+            ds.load()
+            for ds in cfgrib.open_datasets(scratch_path, backend_kwargs={"indexpath": ""}, decode_timedelta=True)
+        ]
+    finally:
+        os.remove(scratch_path)
+    if len(datasets) == 1:
+        return datasets[0]
+    # Several hypercubes for one search (e.g. HRRR subhourly): join on step as H.xarray does
+    return xr.concat(datasets, dim="step")
+
+
+# ---------------------------------------------------------------------------
+# Direct eccodes decode (GRIB_DECODER=eccodes): message bytes -> float32 NumPy,
+# no cfgrib index, no xarray Dataset, coordinates only on demand
+# ---------------------------------------------------------------------------
+
+# Grid-definition keys copied into GribField.attrs under cfgrib's GRIB_ names,
+# so tiles._grid_fingerprint() keys both decoders to the same cell mapping
+_GRID_KEYS = (
+    "gridType",
+    "Nx",
+    "Ny",
+    "latitudeOfFirstGridPointInDegrees",
+    "longitudeOfFirstGridPointInDegrees",
+    "latitudeOfLastGridPointInDegrees",
+    "longitudeOfLastGridPointInDegrees",
+    "iDirectionIncrementInDegrees",
+    "jDirectionIncrementInDegrees",
+    "DxInMetres",
+    "DyInMetres",
+    "LaDInDegrees",
+    "LoVInDegrees",
+    "Latin1InDegrees",
+    "Latin2InDegrees",
+    "iScansNegatively",
+    "jScansPositively",
+    "jPointsAreConsecutive",
+)
+
+_WIND_SHORT_NAMES = {"u10", "v10", "10u", "10v"}
+
+
+class GribField:
+    """One decoded 2D field in place of a single-variable xarray Dataset.
+
+    Carries float32 values shaped like cfgrib's, the units and the GRIB grid
+    attributes. latitude/longitude are decoded from the message only when
+    read, i.e. when tiles.get_cell_mapping() has no mapping for the grid.
+    """
+
+    def __init__(self, values: np.ndarray, attrs: dict, message: bytes):
+        self.values = values
+        self.attrs = attrs
+        self._message = message
+        self._coords: tuple[np.ndarray, np.ndarray] | None = None
+
+    def _decode_coords(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._coords is None:
+            import eccodes
+
+            gid = eccodes.codes_new_from_message(self._message)
+            try:
+                lats = eccodes.codes_get_array(gid, "latitudes").reshape(self.values.shape)
+                lons = eccodes.codes_get_array(gid, "longitudes").reshape(self.values.shape)
+            finally:
+                eccodes.codes_release(gid)
+            self._coords = (lats, lons)
+        return self._coords
+
+    @property
+    def latitude(self) -> np.ndarray:
+        return self._decode_coords()[0]
+
+    @property
+    def longitude(self) -> np.ndarray:
+        return self._decode_coords()[1]
+
+    def close(self) -> None:
+        self._message = b""
+        self._coords = None
+
+
+def _decode_field(message: bytes) -> tuple[np.ndarray, dict]:
+    """Decode one GRIB message to (float32 values, attrs), matching cfgrib's array."""
+    import eccodes
+
+    gid = eccodes.codes_new_from_message(message)
+    try:
+        if eccodes.codes_get(gid, "gridType") not in ("regular_ll", "lambert"):
+            raise ValueError(f"unsupported grid {eccodes.codes_get(gid, 'gridType')}")
+        if eccodes.codes_is_defined(gid, "Nx"):
+            shape = (eccodes.codes_get(gid, "Ny"), eccodes.codes_get(gid, "Nx"))
+        else:
+            shape = (eccodes.codes_get(gid, "Nj"), eccodes.codes_get(gid, "Ni"))
+        raw = eccodes.codes_get_values(gid)
+        missing = eccodes.codes_get(gid, "missingValue")
+        values = np.empty(shape, dtype=np.float32)
+        values.ravel()[:] = raw
+        values[raw.reshape(shape) == missing] = np.nan
+        del raw
+        # Same row order as cfgrib: boustrophedon rows are flipped back
+        if eccodes.codes_get(gid, "alternativeRowScanning"):
+            values[1::2] = values[1::2, ::-1]
+        attrs = {"units": eccodes.codes_get(gid, "units"), "shortName": eccodes.codes_get(gid, "shortName")}
+        for key in _GRID_KEYS:
+            if eccodes.codes_is_defined(gid, key):
+                attrs[f"GRIB_{key}"] = eccodes.codes_get(gid, key)
+    finally:
+        eccodes.codes_release(gid)
+    return values, attrs
+
+
+def _decode_variable_direct(variable_id: str, herbie_model: str, parts: list[list[bytes]]) -> GribField:
+    """Decode one variable's messages (one list per search) into a GribField.
+
+    Handles plain single-message fields, 10 m wind speed from U/V (computed in
+    the U buffer) and ECMWF snow depth from sd/rsn. Anything else raises, and
+    the caller falls back to the xarray decode.
+    """
+    if variable_id == "snod" and herbie_model == "ifs":
+        (sd_msgs, rsn_msgs) = parts
+        if len(sd_msgs) != 1 or len(rsn_msgs) != 1:
+            raise ValueError("expected one sd and one rsn message")
+        sd, attrs = _decode_field(sd_msgs[0])
+        rsn, _ = _decode_field(rsn_msgs[0])
+        # As _ecmwf_snod_dataset: sd * 1000 / rsn, low density and NaN -> 0
+        rsn[~(rsn > 10.0)] = np.nan
+        sd *= 1000.0
+        sd /= rsn
+        np.nan_to_num(sd, copy=False, nan=0.0)
+        attrs.pop("units")
+        return GribField(sd, attrs, sd_msgs[0])
+
+    (messages,) = parts
+    if variable_id == "wind_10m" and herbie_model != "nbm":
+        if len(messages) != 2:
+            raise ValueError(f"expected U and V messages, got {len(messages)}")
+        u, attrs = _decode_field(messages[0])
+        v, v_attrs = _decode_field(messages[1])
+        if {attrs["shortName"], v_attrs["shortName"]} - _WIND_SHORT_NAMES:
+            raise ValueError(f"unexpected wind components {attrs['shortName']}/{v_attrs['shortName']}")
+        # Same float32 arithmetic as herbie's with_wind: sqrt(u**2 + v**2)
+        np.multiply(u, u, out=u)
+        np.multiply(v, v, out=v)
+        u += v
+        np.sqrt(u, out=u)
+        return GribField(u, attrs, messages[0])
+
+    if len(messages) != 1:
+        raise ValueError(f"expected one message, got {len(messages)}")
+    values, attrs = _decode_field(messages[0])
+    return GribField(values, attrs, messages[0])
+
+
+# ---------------------------------------------------------------------------
+# Hour-level fetch: every variable of one forecast hour in one pass
+# ---------------------------------------------------------------------------
+
+def _variable_searches(variable_id: str, model_id: str) -> list[str]:
+    """Herbie searches whose messages make up a variable, in decode order."""
+    if variable_id == "snod" and repomap["MODELS"][model_id]["herbie_model"] == "ifs":
+        return [":sd:", ":rsn:"]
+    search = _get_search_string(variable_id, model_id)
+    if not search:
+        raise GribDownloadError(f"No Herbie search string for {variable_id}/{model_id}")
+    return [search]
+
+
+def plan_hour_messages(
+    model_id: str,
+    variable_ids: list[str],
+    date_str: str,
+    init_hour: str,
+    forecast_hour: int,
+    use_negative_cache: bool = True,
+) -> dict | None:
+    """Byte ranges of each variable's messages in one forecast hour, from its idx.
+
+    Returns None if the hour is not published, else {"grib_url": url,
+    "messages": {variable_id: [[[start, end], ...] per search]}} (JSON-ready;
+    end None = to EOF). Variables with a search that matches nothing are left
+    out. grib_url is None for a local Herbie copy, which only this host can read.
+    use_negative_cache is passed to resolve_remote().
+    """
+    with _probe_slot(model_id):
+        remote = resolve_remote(model_id, date_str, init_hour, forecast_hour, use_negative_cache)
+    if remote is None:
+        return None
+    inventory = remote.inventory()
+    messages = {}
+    for variable_id in variable_ids:
+        try:
+            var_searches = _variable_searches(variable_id, model_id)
+        except GribDownloadError:
+            continue
+        parts = []
+        for search in var_searches:
+            rows = inventory[inventory.search_this.str.contains(search)]
+            if rows.empty:
+                break
+            parts.append([
+                [int(row.start_byte), None if pd.isna(row.end_byte) else int(row.end_byte)]
+                for row in rows.itertuples()
+            ])
+        else:
+            messages[variable_id] = parts
+    remote_source = remote.grib.startswith(("http://", "https://")) or model_id in repomap["GRIB_MIRRORS"]
+    return {"grib_url": remote.grib if remote_source else None, "messages": messages}
+
+
+def plan_run_messages(
+    model_id: str,
+    variable_ids: list[str],
+    date_str: str,
+    init_hour: str,
+    forecast_hours: list[int],
+    use_negative_cache: bool = True,
+) -> dict[int, dict | None]:
+    """plan_hour_messages() for several hours of a run, idx lookups on the probe pool.
+
+    An hour whose lookup fails is reported as unpublished (None); the next
+    scheduler cycle plans it again.
+    """
+    def plan(forecast_hour: int) -> dict | None:
+        try:
+            return plan_hour_messages(model_id, variable_ids, date_str, init_hour, forecast_hour, use_negative_cache)
+        except Exception as exc:
+            logger.warning(f"Inventory lookup failed for {model_id} {date_str} {init_hour}z f{forecast_hour}: {exc}")
+            return None
+
+    return dict(zip(forecast_hours, _probe_executor().map(plan, forecast_hours)))
+
+
+def _fetch_planned(
+    model_id: str,
+    planned: dict,
+    searches: dict[str, list[str]],
+    run_dt: datetime,
+) -> dict[str, list[bytes]]:
+    """fetch_grib_messages() from a plan_hour_messages() plan, without the idx."""
+    ranges = {
+        search: [(start, end) for start, end in planned["messages"][variable_id][i]]
+        for variable_id, var_searches in searches.items()
+        for i, search in enumerate(var_searches)
+    }
+    max_gap_bytes = repomap["MODELS"][model_id].get("range_merge_gap_bytes", repomap["GRIB_RANGE_MERGE_GAP_BYTES"])
+    fetched = fetch_byte_ranges(
+        planned["grib_url"], run_dt, [r for rs in ranges.values() for r in rs], max_gap_bytes, model_id
+    )
+    return {search: [fetched[start] for start, _ in rs] for search, rs in ranges.items()}
+
+
+def open_hour_as_xarray(
+    model_id: str,
+    variable_ids: list[str],
+    date_str: str,
+    init_hour: str,
+    forecast_hour: int,
+    planned: dict | None = None,
+) -> tuple[dict[str, xr.Dataset], dict[str, str]]:
+    """Fetch several variables of one forecast hour in one pass.
+
+    One Herbie object and one idx parse serve all variables; their messages
+    (U/V for wind, sd + rsn for ECMWF snod) are fetched together through
+    fetch_grib_messages(), then decoded per variable. Returns
+    ({variable_id: Dataset}, {variable_id: error}); raises GribDownloadError
+    if the hour itself cannot be fetched. With GRIB_DECODER=eccodes the
+    values are GribField objects wherever the direct decode applies.
+
+    planned (a plan_hour_messages() result with a grib_url, as stored in
+    job args by the scheduler) supplies the byte ranges, so no idx is read.
+    """
+    model_cfg = repomap["MODELS"][model_id]
+    herbie_model = model_cfg["herbie_model"]
+    datasets: dict[str, xr.Dataset] = {}
+    errors: dict[str, str] = {}
+
+    searches = {}
+    for variable_id in variable_ids:
+        try:
+            searches[variable_id] = _variable_searches(variable_id, model_id)
+        except GribDownloadError as exc:
+            errors[variable_id] = str(exc)
+    if not searches:
+        return datasets, errors
+
+    try:
+        if planned and planned.get("grib_url") and all(v in planned["messages"] for v in searches):
+            run_dt = datetime.strptime(f"{date_str}{init_hour}", "%Y%m%d%H")
+            messages = _fetch_planned(model_id, planned, searches, run_dt)
+        else:
+            remote = resolve_remote(model_id, date_str, init_hour, forecast_hour)
+            if remote is None:
+                raise GribDownloadError(
+                    f"GRIB2 file not found: {model_id} {date_str} {init_hour}z f{forecast_hour}"
+                )
+            messages = fetch_grib_messages(
+                remote,
+                [s for var_searches in searches.values() for s in var_searches],
+                model_cfg.get("range_merge_gap_bytes"),
+                model_id,
+            )
+    except GribDownloadError:
+        raise
+    except Exception as exc:
+        raise GribDownloadError(
+            f"Herbie fetch failed for {model_id} {date_str} {init_hour}z f{forecast_hour}: {exc}"
+        ) from exc
+
+    direct = repomap.get("GRIB_DECODER") == "eccodes"
+    for variable_id, var_searches in searches.items():
+        if direct and all(messages[search] for search in var_searches):
+            try:
+                datasets[variable_id] = _decode_variable_direct(
+                    variable_id, herbie_model, [messages[search] for search in var_searches]
+                )
+                continue
+            except Exception as exc:
+                logger.debug(f"Direct decode of {model_id}/{variable_id} failed, using xarray: {exc}")
+        try:
+            parts = []
+            for search in var_searches:
+                if not messages[search]:
+                    raise GribDownloadError(f"No GRIB message matches {search}")
+                parts.append(_decode_messages(messages[search]))
+            if variable_id == "snod" and herbie_model == "ifs":
+                ds = _ecmwf_snod_dataset(*parts)
+            else:
+                ds = parts[0]
+                # Wind: if we fetched U/V components, compute magnitude
+                if variable_id == "wind_10m" and herbie_model not in ("nbm",):
+                    ds = ds.herbie.with_wind(which="speed")
+            datasets[variable_id] = ds
+        except Exception as exc:
+            errors[variable_id] = (
+                f"Decode failed for {model_id}/{variable_id} "
+                f"{date_str} {init_hour}z f{forecast_hour}: {exc}"
+            )
+    return datasets, errors
 
 
 def check_availability(
@@ -151,11 +974,68 @@ def check_availability(
     date_str: str,
     init_hour: str,
     forecast_hour: int,
+    use_negative_cache: bool = True,
 ) -> bool:
     """Check if data is available for a model run at a specific forecast hour."""
     try:
-        H = _build_herbie(model_id, date_str, init_hour, forecast_hour)
-        inv = H.inventory(verbose=False)
-        return not inv.empty
+        remote = resolve_remote(model_id, date_str, init_hour, forecast_hour, use_negative_cache)
+        return remote is not None and not remote.inventory().empty
     except Exception:
         return False
+
+
+# ---------------------------------------------------------------------------
+# Availability probing: many runs at once, bounded per source host
+# ---------------------------------------------------------------------------
+
+_probe_lock = threading.Lock()
+_probe_slots: dict[str, threading.BoundedSemaphore] = {}
+_probe_pool: tuple[int, ThreadPoolExecutor] | None = None
+
+
+def _source_host(model_id: str) -> str:
+    """Host a model's files resolve from: its mirror, else its first download_limits host."""
+    mirror = repomap["GRIB_MIRRORS"].get(model_id)
+    if mirror:
+        return urlparse(mirror).hostname or "localhost"
+    return next(iter(repomap["MODELS"][model_id].get("download_limits", {})), model_id)
+
+
+def _probe_slot(model_id: str) -> threading.BoundedSemaphore:
+    """Semaphore capping concurrent source/idx lookups per host (probe_concurrency)."""
+    host = _source_host(model_id)
+    with _probe_lock:
+        slot = _probe_slots.get(host)
+        if slot is None:
+            slot = _probe_slots[host] = threading.BoundedSemaphore(int(_host_limit(host)["probe_concurrency"]))
+        return slot
+
+
+def _probe_executor() -> ThreadPoolExecutor:
+    global _probe_pool
+    with _probe_lock:
+        if _probe_pool is None or _probe_pool[0] != os.getpid():
+            _probe_pool = (
+                os.getpid(),
+                ThreadPoolExecutor(repomap["PROBE_POOL_SIZE"], thread_name_prefix="grib-probe"),
+            )
+        return _probe_pool[1]
+
+
+def probe_availability(
+    probes: list[tuple[str, str, str, int]],
+    use_negative_cache: bool = True,
+) -> dict[tuple[str, str, str, int], bool]:
+    """check_availability() for many (model_id, date_str, init_hour, forecast_hour) at once.
+
+    Probes run concurrently on the probe pool, at most probe_concurrency at a
+    time per source host, and duplicates are probed once. Results are cached
+    in remote_meta like any resolve_remote() lookup.
+    """
+    unique = list(dict.fromkeys(probes))
+
+    def probe(key: tuple[str, str, str, int]) -> bool:
+        with _probe_slot(key[0]):
+            return check_availability(*key, use_negative_cache=use_negative_cache)
+
+    return dict(zip(unique, _probe_executor().map(probe, unique)))
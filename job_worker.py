@@ -8,19 +8,41 @@ import subprocess
 import time
 from typing import Any, Dict
 
+import numpy as np
+
 logger = logging.getLogger("job_worker")
 
-from grib_fetcher import open_as_xarray
+from grib_fetcher import open_as_xarray, open_hour_as_xarray
 from config import repomap, get_tile_resolution
-from jobs import cancel_siblings, claim, complete, fail, init_db
+from jobs import (
+    WAKEUP_RECHECK_S,
+    LeaseHeartbeat,
+    cancel_siblings,
+    claim_batch,
+    claim_blocking,
+    complete_many,
+    enqueue,
+    fail,
+    fail_many,
+    init_db,
+    register_worker,
+    remaining_jobs_for_run,
+    unregister_worker,
+)
 from tile_db import init_db as init_tile_db
 from tile_db import record_tile_hour, record_tile_run, record_tile_variable
 from tiles import build_tiles_for_variable, upsert_tiles_npz
+from utils import GribDownloadError
 
 # Synoptic models that must all be loaded before triggering auto-forecast
 SYNOPTIC_MODELS = {"gfs", "nam_nest", "ecmwf_hres"}
 FORECAST_TRIGGER_FILE = os.path.join(repomap["CACHE_DIR"], "last_forecast_trigger.txt")
 
+# Upper bound on tile hours held in memory across all run accumulators
+ACCUMULATOR_MAX_MB = int(os.environ.get("TILE_ACCUMULATOR_MAX_MB", "256"))
+# Jobs claimed per round trip; a batch shares model, run and forecast hour
+CLAIM_BATCH_SIZE = int(os.environ.get("WORKER_CLAIM_BATCH", "16"))
+
 
 def _parse_run_id(run_id: str) -> tuple[str, str]:
     parts = run_id.split("_")
@@ -29,7 +51,57 @@ def _parse_run_id(run_id: str) -> tuple[str, str]:
     return parts[1], parts[2]
 
 
-def process_build_tile_hour(conn, job: Dict[str, Any]) -> None:
+class RunAccumulator:
+    """In-memory tile hours for one (region, resolution, model, run, variable).
+
+    Mirrors the Rust worker's RunAccumulator: hours are collected as jobs
+    are processed and written to the run's NPZ in a single upsert on flush,
+    instead of decompressing and rewriting the whole (T, ny, nx) cube once per
+    hour. The jobs stay claimed until then (see flush_accumulators).
+    """
+
+    def __init__(self, region_id: str, resolution_deg: float, model_id: str, run_id: str, variable_id: str):
+        self.region_id = region_id
+        self.resolution_deg = resolution_deg
+        self.model_id = model_id
+        self.run_id = run_id
+        self.variable_id = variable_id
+        self.meta: Dict[str, Any] = {}
+        self.init_time_utc: str | None = None
+        # forecast_hour -> (min, max, mean) 2D arrays
+        self.hours: Dict[int, tuple] = {}
+        # forecast_hour -> job id that produced it
+        self.job_ids: Dict[int, int | None] = {}
+        # Jobs with hours held here; completed only once written
+        self.jobs: set[int] = set()
+
+    @property
+    def key(self) -> tuple:
+        return (self.region_id, self.resolution_deg, self.model_id, self.run_id, self.variable_id)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for stats in self.hours.values() for a in stats)
+
+    def add_hours(self, hours, mins, maxs, means, meta: Dict[str, Any], init_time_utc: str | None, job_id: int | None) -> None:
+        for idx, hour in enumerate(hours):
+            self.hours[int(hour)] = (mins[idx], maxs[idx], means[idx])
+            self.job_ids[int(hour)] = job_id
+        if job_id is not None:
+            self.jobs.add(job_id)
+        self.meta = meta
+        self.init_time_utc = init_time_utc
+
+    def stacked(self):
+        hours = sorted(self.hours)
+        mins = np.stack([self.hours[h][0] for h in hours])
+        maxs = np.stack([self.hours[h][1] for h in hours])
+        means = np.stack([self.hours[h][2] for h in hours])
+        return hours, mins, maxs, means
+
+
+def _build_tile_hour(job: Dict[str, Any]) -> tuple:
+    """Fetch and tile one forecast hour. Returns (accumulator key, tile data, meta)."""
     args = json.loads(job["args_json"])
     region_id = args["region_id"]
     model_id = args["model_id"]
@@ -43,6 +115,25 @@ def process_build_tile_hour(conn, job: Dict[str, Any]) -> None:
         )
     )
 
+    date_str, init_hour = _parse_run_id(run_id)
+
+    logger.debug(f"  fetching via Herbie: {model_id}/{run_id}/{variable_id} f{forecast_hour}")
+    # Scheduler-planned jobs carry grib_url + messages byte ranges: no idx lookup
+    planned = args if args.get("grib_url") else None
+    ds = open_as_xarray(model_id, variable_id, date_str, init_hour, forecast_hour, planned)
+    return _tile_dataset(ds, region_id, model_id, run_id, variable_id, forecast_hour, resolution_deg)
+
+
+def _tile_dataset(
+    ds,
+    region_id: str,
+    model_id: str,
+    run_id: str,
+    variable_id: str,
+    forecast_hour: int,
+    resolution_deg: float,
+) -> tuple:
+    """Tile one variable's dataset for a forecast hour (closes ds)."""
     region = repomap["TILING_REGIONS"][region_id]
     lat_min = float(region["lat_min"])
     lat_max = float(region["lat_max"])
@@ -51,9 +142,6 @@ def process_build_tile_hour(conn, job: Dict[str, Any]) -> None:
 
     date_str, init_hour = _parse_run_id(run_id)
 
-    logger.debug(f"  fetching via Herbie: {model_id}/{run_id}/{variable_id} f{forecast_hour}")
-    ds = open_as_xarray(model_id, variable_id, date_str, init_hour, forecast_hour)
-
     variable_config = repomap["WEATHER_VARIABLES"][variable_id]
     try:
         mins, maxs, means, hours, index_meta = build_tiles_for_variable(
@@ -94,20 +182,28 @@ def process_build_tile_hour(conn, job: Dict[str, Any]) -> None:
         "init_time_utc": init_time_utc,
     }
 
-    record_tile_run(conn, region_id, resolution_deg, model_id, run_id, init_time_utc)
+    key = (region_id, resolution_deg, model_id, run_id, variable_id)
+    return key, (mins, maxs, means, hours), meta, init_time_utc
+
+
+def _write_tile_hours(conn, acc: RunAccumulator) -> None:
+    """Upsert an accumulator's hours into the run NPZ and record them in the tile DB."""
+    hours, mins, maxs, means = acc.stacked()
+
+    record_tile_run(conn, acc.region_id, acc.resolution_deg, acc.model_id, acc.run_id, acc.init_time_utc, acc.meta)
 
     npz_path, merged_hours = upsert_tiles_npz(
         repomap["TILES_DIR"],
-        region_id,
-        resolution_deg,
-        model_id,
-        run_id,
-        variable_id,
+        acc.region_id,
+        acc.resolution_deg,
+        acc.model_id,
+        acc.run_id,
+        acc.variable_id,
         mins,
         maxs,
         means,
         hours,
-        meta,
+        acc.meta,
     )
 
     try:
@@ -117,70 +213,207 @@ def process_build_tile_hour(conn, job: Dict[str, Any]) -> None:
 
     record_tile_variable(
         conn,
-        region_id,
-        resolution_deg,
-        model_id,
-        run_id,
-        variable_id,
+        acc.region_id,
+        acc.resolution_deg,
+        acc.model_id,
+        acc.run_id,
+        acc.variable_id,
         npz_path,
-        os.path.join(os.path.dirname(npz_path), f"{variable_id}.meta.json"),
+        os.path.join(os.path.dirname(npz_path), f"{acc.variable_id}.meta.json"),
         merged_hours,
         size_bytes,
     )
 
-    record_tile_hour(
-        conn,
-        region_id,
-        resolution_deg,
-        model_id,
-        run_id,
-        variable_id,
-        forecast_hour,
-        npz_path,
-        job_id=job["id"],
-    )
+    for hour in hours:
+        record_tile_hour(
+            conn,
+            acc.region_id,
+            acc.resolution_deg,
+            acc.model_id,
+            acc.run_id,
+            acc.variable_id,
+            hour,
+            npz_path,
+            job_id=acc.job_ids.get(hour),
+        )
+
+
+def process_build_tile_hour(conn, job: Dict[str, Any], accumulators: Dict[tuple, RunAccumulator] | None = None) -> None:
+    """Build one forecast hour's tiles.
+
+    With accumulators, the hour is held in memory until the run is flushed;
+    without, it is written to the run NPZ immediately.
+    """
+    _accumulate(conn, job, _build_tile_hour(job), accumulators)
+
+
+def _accumulate(conn, job: Dict[str, Any], built: tuple, accumulators: Dict[tuple, RunAccumulator] | None) -> None:
+    key, (mins, maxs, means, hours), meta, init_time_utc = built
+
+    acc = accumulators.get(key) if accumulators is not None else None
+    if acc is None:
+        acc = RunAccumulator(*key)
+    acc.add_hours(hours, mins, maxs, means, meta, init_time_utc, job["id"])
+
+    if accumulators is None:
+        _write_tile_hours(conn, acc)
+    else:
+        accumulators[key] = acc
+
+
+def process_build_run_hour(conn, job: Dict[str, Any], accumulators: Dict[tuple, RunAccumulator] | None = None) -> None:
+    """Build every variable of one forecast hour from a single GRIB fetch.
+
+    args["variables"] maps variable_id -> resolution_deg. If only some
+    variables fail, the job succeeds for the rest and a follow-up
+    build_run_hour job is enqueued for just the failed ones, so the hour is
+    not refetched and retiled in full. The job fails only if none succeed.
+    """
+    args = json.loads(job["args_json"])
+    region_id = args["region_id"]
+    model_id = args["model_id"]
+    run_id = args["run_id"]
+    forecast_hour = int(args["forecast_hour"])
+    variables = args["variables"]
+
+    date_str, init_hour = _parse_run_id(run_id)
+
+    logger.debug(f"  fetching via Herbie: {model_id}/{run_id} {sorted(variables)} f{forecast_hour}")
+    planned = args if args.get("grib_url") else None
+    datasets, errors = open_hour_as_xarray(model_id, list(variables), date_str, init_hour, forecast_hour, planned)
+    built_any = False
+    for variable_id, ds in datasets.items():
+        try:
+            built = _tile_dataset(
+                ds, region_id, model_id, run_id, variable_id, forecast_hour, float(variables[variable_id])
+            )
+        except Exception as exc:
+            errors[variable_id] = str(exc)
+            continue
+        _accumulate(conn, job, built, accumulators)
+        built_any = True
+
+    if not errors:
+        return
+    message = "; ".join(f"{variable_id}: {error}" for variable_id, error in sorted(errors.items()))
+    if not built_any:
+        raise GribDownloadError(message)
+
+    retry_args = {**args, "variables": {v: variables[v] for v in errors}}
+    if "messages" in args:
+        retry_args["messages"] = {v: args["messages"][v] for v in errors if v in args["messages"]}
+    retry_id = enqueue(conn, "build_run_hour", retry_args, job.get("priority") or 0)
+    logger.warning(f"  {model_id}/{run_id} f{forecast_hour}: retrying {sorted(errors)} as job {retry_id} ({message})")
+
+
+def _held_jobs(accumulators: Dict[tuple, RunAccumulator]) -> set[int]:
+    """Jobs with hours in some accumulator (processed but not yet written)."""
+    return {job_id for acc in accumulators.values() for job_id in acc.jobs}
+
+
+def _drop_jobs(accumulators: Dict[tuple, RunAccumulator], job_ids) -> None:
+    """Discard the hours produced by job_ids (the jobs failed and will be redone)."""
+    job_ids = set(job_ids)
+    for key, acc in list(accumulators.items()):
+        if not acc.jobs & job_ids:
+            continue
+        for hour in [h for h, job_id in acc.job_ids.items() if job_id in job_ids]:
+            del acc.hours[hour]
+            del acc.job_ids[hour]
+        acc.jobs -= job_ids
+        if not acc.hours:
+            del accumulators[key]
+
+
+def flush_accumulators(conn, accumulators: Dict[tuple, RunAccumulator], predicate=None, wlog=None) -> int:
+    """Write out (and drop) every accumulator matching predicate. Returns hours written.
+
+    A job is completed once no accumulator holds its hours any more. If a
+    write fails, its jobs are failed (and their other held hours dropped) so
+    the scheduler re-enqueues them instead of the hours being lost.
+    """
+    log = wlog or logger
+    written = 0
+    flushed: set[int] = set()
+    failed: set[int] = set()
+    for key in [k for k, acc in accumulators.items() if predicate is None or predicate(acc)]:
+        acc = accumulators.pop(key, None)
+        if acc is None:
+            continue  # dropped by an earlier failure in this flush
+        if not acc.hours:
+            flushed |= acc.jobs
+            continue
+        try:
+            _write_tile_hours(conn, acc)
+            conn.commit()
+            written += len(acc.hours)
+            flushed |= acc.jobs
+            log.info(f"Flushed {acc.model_id}/{acc.run_id}/{acc.variable_id}: {len(acc.hours)} hours")
+        except Exception as exc:
+            conn.rollback()
+            log.error(f"Flush failed for {acc.model_id}/{acc.run_id}/{acc.variable_id}: {exc}")
+            failed |= acc.jobs
+            fail_many(conn, sorted(acc.jobs), f"tile flush failed: {exc}")
+            _drop_jobs(accumulators, acc.jobs)
+
+    done = flushed - failed - _held_jobs(accumulators)
+    if done:
+        complete_many(conn, sorted(done))
+    return written
+
+
+def _accumulated_runs(accumulators: Dict[tuple, RunAccumulator]) -> list[tuple[str, str]]:
+    return sorted({(acc.model_id, acc.run_id) for acc in accumulators.values()})
+
+
+def _flush_finished_runs(conn, accumulators: Dict[tuple, RunAccumulator], wlog) -> None:
+    """Flush accumulators whose run has no other pending/processing jobs left, then enforce the memory budget."""
+    for model_id, run_id in _accumulated_runs(accumulators):
+        held = _held_jobs(
+            {key: acc for key, acc in accumulators.items() if (acc.model_id, acc.run_id) == (model_id, run_id)}
+        )
+        # Our held jobs are still 'processing' until the flush completes them
+        if _remaining_jobs_for_run(conn, model_id, run_id) == len(held):
+            flush_accumulators(
+                conn, accumulators,
+                lambda acc: acc.model_id == model_id and acc.run_id == run_id,
+                wlog,
+            )
+
+    # Memory guard for long runs (GFS 384h): flush largest accumulators first.
+    budget = ACCUMULATOR_MAX_MB * 1024 * 1024
+    while accumulators and sum(acc.nbytes for acc in accumulators.values()) > budget:
+        largest = max(accumulators.values(), key=lambda acc: acc.nbytes)
+        flush_accumulators(conn, accumulators, lambda acc: acc is largest, wlog)
 
 
 def _remaining_jobs_for_run(conn, model_id: str, run_id: str) -> int:
     """Count pending + processing jobs for a specific model+run."""
-    row = conn.execute(
-        """
-        SELECT COUNT(*) as cnt FROM jobs
-        WHERE status IN ('pending', 'processing')
-          AND args_json LIKE ?
-          AND args_json LIKE ?
-        """,
-        (f'%"model_id":"{model_id}"%', f'%"run_id":"{run_id}"%'),
-    ).fetchone()
-    return row["cnt"] if row else 0
+    return remaining_jobs_for_run(conn, model_id, run_id)
 
 
 def _latest_complete_synoptic_run(conn, model_id: str, init_hour: str) -> str | None:
     """Find the most recent fully-loaded run for a model at a given init hour.
 
-    A run is "fully loaded" if it has 0 pending/processing jobs.
-    Looks back 36 hours to find a match.
+    A run is "fully loaded" if it has completed jobs and 0 pending/processing
+    jobs. Looks back 3 days of run_ids in one run_progress lookup.
     """
     from datetime import datetime, timedelta, timezone
     now = datetime.now(timezone.utc)
+    run_ids = [f"run_{(now - timedelta(days=d)).strftime('%Y%m%d')}_{init_hour}" for d in range(3)]
 
-    for days_back in range(3):
-        dt = now - timedelta(days=days_back)
-        date_str = dt.strftime("%Y%m%d")
-        run_id = f"run_{date_str}_{init_hour}"
-
-        # Check if tiles exist for this run
-        res = get_tile_resolution("ne", model_id)
-        res_dir = f"{res:.3f}deg".rstrip("0").rstrip(".")
-        run_dir = os.path.join(repomap["TILES_DIR"], "ne", res_dir, model_id, run_id)
-        if not os.path.isdir(run_dir):
-            continue
-
-        # Check no remaining jobs
-        if _remaining_jobs_for_run(conn, model_id, run_id) == 0:
-            return run_id
-
-    return None
+    row = conn.execute(
+        f"""
+        SELECT run_id FROM run_progress
+        WHERE model_id = ? AND run_id IN ({', '.join('?' for _ in run_ids)})
+        GROUP BY run_id
+        HAVING SUM(pending + processing) = 0 AND SUM(completed) > 0
+        ORDER BY run_id DESC
+        LIMIT 1
+        """,
+        [model_id, *run_ids],
+    ).fetchone()
+    return row["run_id"] if row else None
 
 
 def _check_and_trigger_forecast(conn, completed_model: str, completed_run_id: str, wlog) -> None:
@@ -278,51 +511,98 @@ def run_worker(worker_id: str | None = None, poll_interval_s: float = 5.0, once:
 
     conn = init_tile_db(repomap["DB_PATH"])
     processed = 0
+    accumulators: Dict[tuple, RunAccumulator] = {}
+    register_worker(conn, worker_id, model_id)
+    # Renews the lease of the job in hand while downloads/decodes block this thread
+    heartbeat = LeaseHeartbeat(repomap["DB_PATH"], worker_id).start()
     try:
         while True:
-            job = claim(conn, worker_id, model_id=model_id)
-            if job is None:
+            batch_size = 1 if once else CLAIM_BATCH_SIZE
+            if max_jobs:
+                batch_size = min(batch_size, max_jobs - processed)
+            batch = claim_batch(
+                conn, worker_id, batch_size, model_id=model_id, prefer_runs=_accumulated_runs(accumulators)
+            )
+            if not batch:
+                # Queue idle: finalize everything we hold before sleeping
+                flushed_runs = _accumulated_runs(accumulators)
+                flush_accumulators(conn, accumulators, wlog=wlog)
+                heartbeat.job_ids = ()
+                for flushed_model, flushed_run in flushed_runs:
+                    _check_and_trigger_forecast(conn, flushed_model, flushed_run, wlog)
                 if once:
                     wlog.info(f"No jobs available, exiting (--once). Processed {processed} total.")
                     break
-                time.sleep(poll_interval_s)
-                continue
-
-            args = json.loads(job["args_json"]) if isinstance(job.get("args_json"), str) else job.get("args_json", {})
-            job_label = (
-                f"{args.get('model_id')}/{args.get('run_id')}/{args.get('variable_id')} f{args.get('forecast_hour')}"
-                if args else job["type"]
+                # Park until an enqueue signals us (polls only without a wakeup channel)
+                job = claim_blocking(
+                    conn, worker_id, WAKEUP_RECHECK_S, model_id=model_id, poll_interval_s=poll_interval_s
+                )
+                if job is None:
+                    continue
+                batch = [job]
+
+            heartbeat.job_ids = tuple(job["id"] for job in batch) + tuple(_held_jobs(accumulators))
+            # One group key per batch: same type, model, run and forecast hour
+            args = json.loads(batch[0]["args_json"]) if isinstance(batch[0].get("args_json"), str) else batch[0].get("args_json", {})
+
+            # Run change: finalize older runs of this model before starting a new one
+            flush_accumulators(
+                conn, accumulators,
+                lambda acc: acc.model_id == args.get("model_id") and acc.run_id != args.get("run_id"),
+                wlog,
             )
 
-            t0 = time.monotonic()
-            try:
-                if job["type"] == "build_tile_hour":
-                    wlog.info(f"Job {job['id']}: {job_label}")
-                    process_build_tile_hour(conn, job)
-                    complete(conn, job["id"])
-                    processed += 1
+            done = []
+            for index, job in enumerate(batch):
+                job_args = json.loads(job["args_json"]) if isinstance(job.get("args_json"), str) else job.get("args_json", {})
+                job_label = (
+                    f"{job_args.get('model_id')}/{job_args.get('run_id')}/{job_args.get('variable_id', 'all')} f{job_args.get('forecast_hour')}"
+                    if job_args else job["type"]
+                )
+                t0 = time.monotonic()
+                try:
+                    if job["type"] in ("build_tile_hour", "build_run_hour"):
+                        wlog.info(f"Job {job['id']}: {job_label}")
+                        if job["type"] == "build_tile_hour":
+                            process_build_tile_hour(conn, job, accumulators)
+                        else:
+                            process_build_run_hour(conn, job, accumulators)
+                        done.append(job["id"])
+                        elapsed = time.monotonic() - t0
+                        wlog.info(f"Job {job['id']} done in {elapsed:.1f}s ({processed + len(done)} total)")
+                    else:
+                        fail(conn, job["id"], f"Unsupported job type: {job['type']}")
+                        wlog.warning(f"Job {job['id']} unsupported type: {job['type']}")
+                except Exception as exc:
                     elapsed = time.monotonic() - t0
-                    wlog.info(f"Job {job['id']} done in {elapsed:.1f}s ({processed} total)")
-                    # Check if all synoptic models are loaded → auto-trigger forecast
-                    _check_and_trigger_forecast(
-                        conn, args.get("model_id", ""), args.get("run_id", ""), wlog
-                    )
-                else:
-                    fail(conn, job["id"], f"Unsupported job type: {job['type']}")
-                    wlog.warning(f"Job {job['id']} unsupported type: {job['type']}")
-            except Exception as exc:
-                elapsed = time.monotonic() - t0
-                error_str = str(exc)
-                wlog.error(f"Job {job['id']} FAILED after {elapsed:.1f}s ({job_label}): {error_str}")
-                fail(conn, job["id"], error_str)
-                # Cancel siblings when the whole model run is unavailable
-                # (e.g. run published but hours not yet posted).
-                run_unavailable = "GRIB2 file not found" in error_str or "not found" in error_str.lower()
-                if run_unavailable:
-                    cancelled = cancel_siblings(conn, job)
-                    if cancelled:
-                        wlog.info(f"Cancelled {cancelled} sibling jobs — run data not available")
-
+                    error_str = str(exc)
+                    wlog.error(f"Job {job['id']} FAILED after {elapsed:.1f}s ({job_label}): {error_str}")
+                    fail(conn, job["id"], error_str)
+                    _drop_jobs(accumulators, {job["id"]})
+                    # Cancel siblings when the whole model run is unavailable
+                    # (e.g. run published but hours not yet posted).
+                    run_unavailable = "GRIB2 file not found" in error_str or "not found" in error_str.lower()
+                    if run_unavailable:
+                        cancelled = cancel_siblings(conn, job)
+                        # The rest of this batch is the same run and hour
+                        rest = [other["id"] for other in batch[index + 1:]]
+                        fail_many(conn, rest, "cancelled: sibling job failed")
+                        if cancelled or rest:
+                            wlog.info(f"Cancelled {cancelled + len(rest)} sibling jobs — run data not available")
+                        break
+
+            if done:
+                # Jobs whose hours are accumulated complete when they are flushed
+                held = _held_jobs(accumulators)
+                complete_many(conn, [job_id for job_id in done if job_id not in held])
+                processed += len(done)
+                _flush_finished_runs(conn, accumulators, wlog)
+                # Check if all synoptic models are loaded → auto-trigger forecast
+                _check_and_trigger_forecast(
+                    conn, args.get("model_id", ""), args.get("run_id", ""), wlog
+                )
+
+            heartbeat.job_ids = tuple(_held_jobs(accumulators))
             gc.collect()
 
             if once:
@@ -331,6 +611,10 @@ def run_worker(worker_id: str | None = None, poll_interval_s: float = 5.0, once:
                 wlog.info(f"Reached max_jobs={max_jobs}, exiting for memory cleanup")
                 break
     finally:
+        # Never exit (--once, --max-jobs, errors) holding unwritten hours
+        flush_accumulators(conn, accumulators, wlog=wlog)
+        heartbeat.stop()
+        unregister_worker(conn, worker_id)
         conn.close()
         wlog.info(f"Worker {worker_id} shut down. Processed {processed} jobs.")
 
@@ -1,20 +1,41 @@
+import atexit
 import hashlib
 import json
 import os
+import select
+import socket
 import sqlite3
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from db import JOB_ARG_COLUMNS, connect
 
 DEFAULT_DB_PATH = "cache/jobs.db"
 
+# A claimed job belongs to its worker until lease_expires_at; LeaseHeartbeat
+# renews it every LEASE_SECONDS / 4, so only a dead worker lets it lapse.
+LEASE_SECONDS = 120
+# Workers whose registry heartbeat is older than this are not counted as live
+WORKER_LIVE_SECONDS = 2 * LEASE_SECONDS
+
+
+# Where a scheduler-planned job fetches from (grib_fetcher.plan_hour_messages).
+# The source can change between cycles, so these args are not part of a job's
+# identity: they are left out of args_hash and refreshed on enqueue instead.
+PLAN_ARGS = ("grib_url", "messages")
+
 
 def _args_json(args: Dict[str, Any]) -> str:
     return json.dumps(args, sort_keys=True, separators=(",", ":"))
 
 
-def _args_hash(job_type: str, args_json: str) -> str:
+def _args_hash(job_type: str, args: Dict[str, Any]) -> str:
+    identity = _args_json({key: value for key, value in args.items() if key not in PLAN_ARGS})
     digest = hashlib.sha256()
-    digest.update(f"{job_type}:{args_json}".encode("utf-8"))
+    digest.update(f"{job_type}:{identity}".encode("utf-8"))
     return digest.hexdigest()
 
 
@@ -23,48 +44,108 @@ def _dict_from_row(row: sqlite3.Row) -> Dict[str, Any]:
 
 
 def init_db(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path, timeout=30)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA busy_timeout=30000")
-    conn.execute("PRAGMA foreign_keys=ON")
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS jobs (
-            id              INTEGER PRIMARY KEY AUTOINCREMENT,
-            type            TEXT    NOT NULL,
-            args_json       TEXT    NOT NULL,
-            args_hash       TEXT    NOT NULL,
-            priority        INTEGER NOT NULL DEFAULT 0,
-            status          TEXT    NOT NULL DEFAULT 'pending',
-            worker_id       TEXT,
-            created_at      TEXT    NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%SZ','now')),
-            started_at      TEXT,
-            completed_at    TEXT,
-            retry_after     TEXT,
-            error_message   TEXT,
-            retry_count     INTEGER NOT NULL DEFAULT 0,
-            parent_job_id   INTEGER,
-            UNIQUE(type, args_hash)
-        );
-        """
-    )
-    conn.execute(
-        """
-        CREATE INDEX IF NOT EXISTS idx_jobs_claimable
-            ON jobs(status, retry_after, priority DESC, created_at ASC)
-            WHERE status = 'pending';
-        """
-    )
-    conn.execute(
-        """
-        CREATE INDEX IF NOT EXISTS idx_jobs_by_type_status
-            ON jobs(type, status);
-        """
-    )
-    conn.commit()
-    return conn
+    """Open a new connection (caller closes it). Schema is managed by db.migrate()."""
+    return connect(db_path)
+
+
+# ---------------------------------------------------------------------------
+# Wakeup channel: idle workers park on a UNIX datagram socket per process in a
+# directory derived from the DB path; anything that makes jobs claimable sends
+# one byte to every socket there. Lost or coalesced datagrams are harmless
+# because waiters always re-claim after waking.
+# ---------------------------------------------------------------------------
+
+# Even with a channel, re-check the queue this often: jobs can also become
+# claimable without a signal (retry_after expiry, writers outside this module).
+WAKEUP_RECHECK_S = 60.0
+
+_waiters: Dict[Tuple[int, str], Optional["_WakeupSocket"]] = {}
+
+
+def _db_file(conn: sqlite3.Connection) -> str:
+    for row in conn.execute("PRAGMA database_list"):
+        if row[1] == "main":
+            return row[2] or ""
+    return ""
+
+
+def _wakeup_dir(db_file: str) -> str:
+    # Kept short: AF_UNIX socket paths are limited to ~104-108 bytes
+    digest = hashlib.sha1(os.path.realpath(db_file).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"rc-wake-{digest}")
+
+
+class _WakeupSocket:
+    def __init__(self, directory: str):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.path = os.path.join(directory, f"{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.sock.bind(self.path)
+        atexit.register(self.close)
+
+    def drain(self) -> None:
+        try:
+            while self.sock.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def wait(self, timeout: float) -> bool:
+        readable, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+        return bool(readable)
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def _wakeup_socket(conn: sqlite3.Connection) -> Optional[_WakeupSocket]:
+    """This process's wakeup socket for conn's DB, or None if unsupported."""
+    db_file = _db_file(conn)
+    key = (os.getpid(), db_file)
+    if key not in _waiters:
+        waiter = None
+        if db_file and hasattr(socket, "AF_UNIX"):
+            try:
+                waiter = _WakeupSocket(_wakeup_dir(db_file))
+            except OSError:
+                waiter = None
+        _waiters[key] = waiter
+    return _waiters[key]
+
+
+def notify_waiters(conn: sqlite3.Connection) -> None:
+    """Wake every worker parked in claim_blocking() on conn's DB. Best effort."""
+    db_file = _db_file(conn)
+    if not db_file or not hasattr(socket, "AF_UNIX"):
+        return
+    directory = _wakeup_dir(db_file)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+        sender.setblocking(False)
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                sender.sendto(b"\0", path)
+            except BlockingIOError:
+                pass  # queue full: that waiter is already signalled
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Socket left behind by a dead worker
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                pass
 
 
 def enqueue(    conn: sqlite3.Connection,
@@ -73,7 +154,7 @@ def enqueue(    conn: sqlite3.Connection,
     priority: int = 0,
 ) -> Optional[int]:
     args_json = _args_json(args)
-    args_hash = _args_hash(job_type, args_json)
+    args_hash = _args_hash(job_type, args)
     cursor = conn.execute(
         """
         INSERT OR IGNORE INTO jobs (type, args_json, args_hash, priority)
@@ -83,13 +164,23 @@ def enqueue(    conn: sqlite3.Connection,
     )
     conn.commit()
     if cursor.rowcount > 0:
+        notify_waiters(conn)
         return cursor.lastrowid
     # Job already exists — reset if it previously failed/was cancelled so it can
-    # be retried. Leaves pending/processing/completed jobs untouched.
+    # be retried, and give a pending one the latest plan. Leaves
+    # processing/completed jobs untouched.
+    conn.execute(
+        """
+        UPDATE jobs SET args_json = ?
+        WHERE type = ? AND args_hash = ? AND status = 'pending' AND args_json != ?;
+        """,
+        (args_json, job_type, args_hash, args_json),
+    )
     cursor = conn.execute(
         """
         UPDATE jobs
         SET status       = 'pending',
+            args_json     = ?,
             error_message = NULL,
             retry_after   = NULL,
             retry_count   = 0,
@@ -98,10 +189,11 @@ def enqueue(    conn: sqlite3.Connection,
             completed_at  = NULL
         WHERE type = ? AND args_hash = ? AND status IN ('failed', 'cancelled');
         """,
-        (job_type, args_hash),
+        (args_json, job_type, args_hash),
     )
     conn.commit()
     if cursor.rowcount > 0:
+        notify_waiters(conn)
         row = conn.execute(
             "SELECT id FROM jobs WHERE type = ? AND args_hash = ?;",
             (job_type, args_hash),
@@ -110,44 +202,139 @@ def enqueue(    conn: sqlite3.Connection,
     return None
 
 
-def claim(conn: sqlite3.Connection, worker_id: str, model_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    if model_id is not None:
-        cursor = conn.execute(
+def enqueue_many(    conn: sqlite3.Connection,
+    job_type: str,
+    jobs: Iterable[Tuple[Dict[str, Any], int]],
+) -> Tuple[int, int]:
+    """Enqueue (args, priority) pairs in one transaction.
+
+    Same semantics as enqueue() per job: new jobs are inserted, failed or
+    cancelled duplicates are reset to pending, pending ones get the new plan
+    (PLAN_ARGS), anything else is left alone. Returns (inserted, reset).
+    """
+    rows = []
+    for args, priority in jobs:
+        rows.append((job_type, _args_json(args), _args_hash(job_type, args), priority))
+    if not rows:
+        return 0, 0
+    try:
+        inserted = conn.executemany(
             """
-            UPDATE jobs
-            SET    status     = 'processing',
-                   worker_id  = ?,
-                   started_at = strftime('%Y-%m-%dT%H:%M:%SZ','now')
-            WHERE  id = (
-                SELECT id FROM jobs
-                WHERE  status = 'pending'
-                AND    (retry_after IS NULL OR retry_after <= strftime('%Y-%m-%dT%H:%M:%SZ','now'))
-                AND    args_json LIKE ?
-                ORDER BY priority DESC, created_at ASC, id ASC
-                LIMIT 1
-            )
-            RETURNING *;
+            INSERT OR IGNORE INTO jobs (type, args_json, args_hash, priority)
+            VALUES (?, ?, ?, ?);
+            """,
+            rows,
+        ).rowcount
+        conn.executemany(
+            """
+            UPDATE jobs SET args_json = ?
+            WHERE type = ? AND args_hash = ? AND status = 'pending' AND args_json != ?;
             """,
-            (worker_id, f'%"model_id":"{model_id}"%'),
+            [(row[1], row[0], row[2], row[1]) for row in rows],
         )
-    else:
-        cursor = conn.execute(
+        # Rows inserted above are pending, so only pre-existing failures match
+        reset = conn.executemany(
             """
             UPDATE jobs
-            SET    status     = 'processing',
-                   worker_id  = ?,
-                   started_at = strftime('%Y-%m-%dT%H:%M:%SZ','now')
-            WHERE  id = (
-                SELECT id FROM jobs
-                WHERE  status = 'pending'
-                AND    (retry_after IS NULL OR retry_after <= strftime('%Y-%m-%dT%H:%M:%SZ','now'))
-                ORDER BY priority DESC, created_at ASC, id ASC
-                LIMIT 1
-            )
-            RETURNING *;
+            SET status       = 'pending',
+                args_json     = ?,
+                error_message = NULL,
+                retry_after   = NULL,
+                retry_count   = 0,
+                worker_id     = NULL,
+                started_at    = NULL,
+                completed_at  = NULL
+            WHERE type = ? AND args_hash = ? AND status IN ('failed', 'cancelled');
             """,
-            (worker_id,),
+            [(row[1], row[0], row[2]) for row in rows],
+        ).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if inserted or reset:
+        notify_waiters(conn)
+    return inserted, reset
+
+
+def reset_failed_hours(    conn: sqlite3.Connection,
+    job_type: str,
+    region_id: str,
+    model_id: str,
+    run_id: str,
+    forecast_hours: Iterable[int],
+) -> int:
+    """Reset failed or cancelled jobs of a run's forecast hours to pending, whatever their other args.
+
+    Reaches the follow-up build_run_hour jobs the worker enqueues for an
+    hour's failed variables, whose args (and so args_hash) differ from the
+    scheduler's full-hour job. Returns jobs reset.
+    """
+    forecast_hours = list(forecast_hours)
+    if not forecast_hours:
+        return 0
+    cursor = conn.execute(
+        f"""
+        UPDATE jobs
+        SET status       = 'pending',
+            error_message = NULL,
+            retry_after   = NULL,
+            retry_count   = 0,
+            worker_id     = NULL,
+            started_at    = NULL,
+            completed_at  = NULL
+        WHERE model_id = ? AND run_id = ? AND region_id = ? AND type = ?
+          AND status IN ('failed', 'cancelled')
+          AND forecast_hour IN ({', '.join('?' for _ in forecast_hours)});
+        """,
+        [model_id, run_id, region_id, job_type, *forecast_hours],
+    )
+    conn.commit()
+    if cursor.rowcount:
+        notify_waiters(conn)
+    return cursor.rowcount
+
+
+def _reset_expired_leases(conn: sqlite3.Connection) -> int:
+    """Return jobs whose lease lapsed (worker died) to pending. Does not commit."""
+    return conn.execute(
+        """
+        UPDATE jobs
+        SET status = 'pending',
+            worker_id = NULL,
+            started_at = NULL,
+            lease_expires_at = NULL
+        WHERE status = 'processing'
+          AND lease_expires_at < strftime('%Y-%m-%dT%H:%M:%SZ','now');
+        """
+    ).rowcount
+
+
+def _claim_where(    conn: sqlite3.Connection,
+    worker_id: str,
+    clauses: list,
+    params: list,
+) -> Optional[Dict[str, Any]]:
+    _reset_expired_leases(conn)
+    cursor = conn.execute(
+        f"""
+        UPDATE jobs
+        SET    status           = 'processing',
+               worker_id        = ?,
+               started_at       = strftime('%Y-%m-%dT%H:%M:%SZ','now'),
+               lease_expires_at = strftime('%Y-%m-%dT%H:%M:%SZ','now', ?)
+        WHERE  id = (
+            SELECT id FROM jobs
+            WHERE  status = 'pending'
+              AND  (retry_after IS NULL OR retry_after <= strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+              {''.join(f' AND {clause}' for clause in clauses)}
+            ORDER BY priority DESC, created_at ASC, id ASC
+            LIMIT 1
         )
+        RETURNING *;
+        """,
+        [worker_id, f"+{LEASE_SECONDS} seconds", *params],
+    )
     row = cursor.fetchone()
     conn.commit()
     if row is None:
@@ -155,6 +342,153 @@ def claim(conn: sqlite3.Connection, worker_id: str, model_id: Optional[str] = No
     return _dict_from_row(row)
 
 
+def claim(
+    conn: sqlite3.Connection,
+    worker_id: str,
+    model_id: Optional[str] = None,
+    prefer_runs: Optional[Iterable[Tuple[str, str]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Atomically claim the next claimable job.
+
+    prefer_runs: (model_id, run_id) pairs the caller is already accumulating.
+    Jobs from those runs are claimed ahead of priority order so one worker
+    finishes a run instead of two workers splitting its tiles.
+    """
+    clauses = []
+    params: list = []
+    if model_id is not None:
+        clauses.append("model_id = ?")
+        params.append(model_id)
+
+    preferred = list(prefer_runs or [])
+    if preferred:
+        pairs = ", ".join("(?, ?)" for _ in preferred)
+        run_params = [value for pair in preferred for value in pair]
+        job = _claim_where(
+            conn, worker_id, clauses + [f"(model_id, run_id) IN (VALUES {pairs})"], params + run_params
+        )
+        if job is not None:
+            return job
+    return _claim_where(conn, worker_id, clauses, params)
+
+
+def _claim_batch_where(    conn: sqlite3.Connection,
+    worker_id: str,
+    max_jobs: int,
+    group_by: Tuple[str, ...],
+    clauses: list,
+    params: list,
+) -> list:
+    # The head job (first in claim order) picks the group; IS matches NULL keys
+    same_group = " AND ".join(f"j.{col} IS head.{col}" for col in group_by)
+    _reset_expired_leases(conn)
+    cursor = conn.execute(
+        f"""
+        UPDATE jobs
+        SET    status           = 'processing',
+               worker_id        = ?,
+               started_at       = strftime('%Y-%m-%dT%H:%M:%SZ','now'),
+               lease_expires_at = strftime('%Y-%m-%dT%H:%M:%SZ','now', ?)
+        WHERE  id IN (
+            SELECT j.id
+            FROM (
+                SELECT {', '.join(group_by)} FROM jobs
+                WHERE  status = 'pending'
+                  AND  (retry_after IS NULL OR retry_after <= strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+                  {''.join(f' AND {clause}' for clause in clauses)}
+                ORDER BY priority DESC, created_at ASC, id ASC
+                LIMIT 1
+            ) AS head
+            JOIN jobs AS j ON {same_group}
+            WHERE  j.status = 'pending'
+              AND  (j.retry_after IS NULL OR j.retry_after <= strftime('%Y-%m-%dT%H:%M:%SZ','now'))
+            ORDER BY j.priority DESC, j.created_at ASC, j.id ASC
+            LIMIT ?
+        )
+        RETURNING *;
+        """,
+        [worker_id, f"+{LEASE_SECONDS} seconds", *params, max_jobs],
+    )
+    rows = cursor.fetchall()
+    conn.commit()
+    jobs = [_dict_from_row(row) for row in rows]
+    # RETURNING order is unspecified
+    jobs.sort(key=lambda job: (-(job["priority"] or 0), job["created_at"], job["id"]))
+    return jobs
+
+
+def claim_batch(    conn: sqlite3.Connection,
+    worker_id: str,
+    max_jobs: int,
+    group_by: Tuple[str, ...] = ("model_id", "run_id", "forecast_hour"),
+    model_id: Optional[str] = None,
+    prefer_runs: Optional[Iterable[Tuple[str, str]]] = None,
+) -> list:
+    """Atomically claim up to max_jobs pending jobs sharing one group key.
+
+    The group is that of the job claim() would return next; the batch is
+    always a single job type. Returns the claimed jobs in claim order, or an
+    empty list when nothing is claimable.
+    """
+    group_by = ("type", *group_by)
+    if model_id is not None and "model_id" not in group_by:
+        # The filter applies to the head job; grouping on it covers the rest
+        group_by += ("model_id",)
+    allowed = {"type"} | {column for column, _ in JOB_ARG_COLUMNS}
+    unknown = [column for column in group_by if column not in allowed]
+    if unknown:
+        raise ValueError(f"Cannot group jobs by {unknown}; use {sorted(allowed)}")
+
+    clauses = []
+    params: list = []
+    if model_id is not None:
+        clauses.append("model_id = ?")
+        params.append(model_id)
+
+    preferred = list(prefer_runs or [])
+    if preferred:
+        pairs = ", ".join("(?, ?)" for _ in preferred)
+        run_params = [value for pair in preferred for value in pair]
+        jobs = _claim_batch_where(
+            conn, worker_id, max_jobs, group_by,
+            clauses + [f"(model_id, run_id) IN (VALUES {pairs})"], params + run_params,
+        )
+        if jobs:
+            return jobs
+    return _claim_batch_where(conn, worker_id, max_jobs, group_by, clauses, params)
+
+
+def claim_blocking(    conn: sqlite3.Connection,
+    worker_id: str,
+    timeout: float,
+    model_id: Optional[str] = None,
+    prefer_runs: Optional[Iterable[Tuple[str, str]]] = None,
+    poll_interval_s: float = 5.0,
+) -> Optional[Dict[str, Any]]:
+    """claim(), waiting up to ``timeout`` seconds for a job to be enqueued.
+
+    Parks on the wakeup channel and re-claims when signalled. Polls every
+    ``poll_interval_s`` only if the channel is unavailable. Returns None on
+    timeout.
+    """
+    waiter = _wakeup_socket(conn)
+    deadline = time.monotonic() + timeout
+    while True:
+        if waiter is not None:
+            # Drain before claiming so an enqueue landing after the claim still wakes us
+            waiter.drain()
+        job = claim(conn, worker_id, model_id=model_id, prefer_runs=prefer_runs)
+        if job is not None:
+            return job
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if waiter is None:
+            time.sleep(min(poll_interval_s, remaining))
+        else:
+            waiter.wait(min(WAKEUP_RECHECK_S, remaining))
+
+
 def complete(conn: sqlite3.Connection, job_id: int) -> None:
     conn.execute(
         """
@@ -168,6 +502,21 @@ def complete(conn: sqlite3.Connection, job_id: int) -> None:
     conn.commit()
 
 
+def complete_many(conn: sqlite3.Connection, job_ids: Iterable[int]) -> int:
+    """complete() for several jobs in one transaction. Returns rows updated."""
+    cursor = conn.executemany(
+        """
+        UPDATE jobs
+        SET status = 'completed',
+            completed_at = strftime('%Y-%m-%dT%H:%M:%SZ','now')
+        WHERE id = ?;
+        """,
+        [(job_id,) for job_id in job_ids],
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
 def _retry_after_timestamp(retry_count: int) -> str:
     delay_seconds = 60 * (2**retry_count)
     return (datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)).strftime(
@@ -175,10 +524,10 @@ def _retry_after_timestamp(retry_count: int) -> str:
     )
 
 
-def fail(    conn: sqlite3.Connection,
+def _fail_job(    conn: sqlite3.Connection,
     job_id: int,
     error: str,
-    max_retries: int = 0,
+    max_retries: int,
 ) -> None:
     row = conn.execute(
         "SELECT retry_count FROM jobs WHERE id = ?;",
@@ -214,15 +563,40 @@ def fail(    conn: sqlite3.Connection,
             """,
             (error, retry_count, job_id),
         )
+
+
+def fail(    conn: sqlite3.Connection,
+    job_id: int,
+    error: str,
+    max_retries: int = 0,
+) -> None:
+    _fail_job(conn, job_id, error, max_retries)
     conn.commit()
 
 
+def fail_many(    conn: sqlite3.Connection,
+    job_ids: Iterable[int],
+    error: str,
+    max_retries: int = 0,
+) -> None:
+    """fail() for several jobs in one transaction."""
+    try:
+        for job_id in job_ids:
+            _fail_job(conn, job_id, error, max_retries)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
 def recover_stale(conn: sqlite3.Connection, stale_minutes: int = 10) -> int:
-    """Reset jobs stuck in 'processing' for longer than stale_minutes.
+    """Reset 'processing' jobs whose worker is gone.
 
-    Only resets jobs whose started_at is old enough to be truly stuck,
-    avoiding a race with currently-running workers.
+    Leased jobs are reset as soon as their lease expires (claim() does this
+    too). Jobs claimed without a lease (Rust workers) fall back to the
+    started_at window: stuck for longer than stale_minutes.
     """
+    recovered = _reset_expired_leases(conn)
     cursor = conn.execute(
         """
         UPDATE jobs
@@ -230,14 +604,135 @@ def recover_stale(conn: sqlite3.Connection, stale_minutes: int = 10) -> int:
             worker_id = NULL,
             started_at = NULL
         WHERE status = 'processing'
+          AND lease_expires_at IS NULL
           AND started_at < strftime('%Y-%m-%dT%H:%M:%SZ', 'now', ?);
         """,
         (f"-{stale_minutes} minutes",),
     )
     conn.commit()
+    recovered += cursor.rowcount
+    if recovered:
+        notify_waiters(conn)
+    return recovered
+
+
+def renew_lease(conn: sqlite3.Connection, job_id: int, worker_id: str) -> bool:
+    """Extend a claimed job's lease. False if the job is no longer ours."""
+    cursor = conn.execute(
+        """
+        UPDATE jobs
+        SET lease_expires_at = strftime('%Y-%m-%dT%H:%M:%SZ','now', ?)
+        WHERE id = ? AND worker_id = ? AND status = 'processing';
+        """,
+        (f"+{LEASE_SECONDS} seconds", job_id, worker_id),
+    )
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def renew_leases(conn: sqlite3.Connection, job_ids: Iterable[int], worker_id: str) -> int:
+    """renew_lease() for several jobs in one transaction. Returns leases renewed."""
+    cursor = conn.executemany(
+        """
+        UPDATE jobs
+        SET lease_expires_at = strftime('%Y-%m-%dT%H:%M:%SZ','now', ?)
+        WHERE id = ? AND worker_id = ? AND status = 'processing';
+        """,
+        [(f"+{LEASE_SECONDS} seconds", job_id, worker_id) for job_id in job_ids],
+    )
+    conn.commit()
     return cursor.rowcount
 
 
+def register_worker(    conn: sqlite3.Connection,
+    worker_id: str,
+    model_id: Optional[str] = None,
+) -> None:
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO workers (worker_id, pid, hostname, model_id)
+        VALUES (?, ?, ?, ?);
+        """,
+        (worker_id, os.getpid(), socket.gethostname(), model_id),
+    )
+    conn.commit()
+
+
+def heartbeat_worker(    conn: sqlite3.Connection,
+    worker_id: str,
+    current_job_id: Optional[int] = None,
+) -> None:
+    conn.execute(
+        """
+        UPDATE workers
+        SET heartbeat_at = strftime('%Y-%m-%dT%H:%M:%SZ','now'),
+            current_job_id = ?
+        WHERE worker_id = ?;
+        """,
+        (current_job_id, worker_id),
+    )
+    conn.commit()
+
+
+def unregister_worker(conn: sqlite3.Connection, worker_id: str) -> None:
+    conn.execute("DELETE FROM workers WHERE worker_id = ?;", (worker_id,))
+    conn.commit()
+
+
+def count_live_workers(conn: sqlite3.Connection, within_seconds: int = WORKER_LIVE_SECONDS) -> int:
+    """Registered workers that sent a heartbeat in the last within_seconds."""
+    return conn.execute(
+        """
+        SELECT COUNT(*) FROM workers
+        WHERE heartbeat_at > strftime('%Y-%m-%dT%H:%M:%SZ','now', ?);
+        """,
+        (f"-{within_seconds} seconds",),
+    ).fetchone()[0]
+
+
+class LeaseHeartbeat:
+    """Background thread keeping a worker's registry row and job lease fresh.
+
+    Uses its own connection, so beats continue while the worker thread is
+    blocked in a long download or decode. Set ``job_ids`` to the claimed
+    batch plus any jobs whose output is still held in memory, and clear it
+    when the jobs are finished.
+    """
+
+    def __init__(self, db_path: str, worker_id: str, interval_s: float = LEASE_SECONDS / 4):
+        self.db_path = db_path
+        self.worker_id = worker_id
+        self.interval_s = interval_s
+        self.job_ids: Tuple[int, ...] = ()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{worker_id}", daemon=True)
+
+    def start(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self.interval_s + 5)
+
+    def beat(self, conn: sqlite3.Connection) -> None:
+        job_ids = self.job_ids
+        if job_ids:
+            renew_leases(conn, job_ids, self.worker_id)
+        heartbeat_worker(conn, self.worker_id, job_ids[0] if job_ids else None)
+
+    def _run(self) -> None:
+        conn = connect(self.db_path)
+        try:
+            while not self._stop.wait(self.interval_s):
+                try:
+                    self.beat(conn)
+                except sqlite3.Error:
+                    conn.rollback()  # Busy DB: the next beat is well inside the lease
+        finally:
+            conn.close()
+
+
 def prune_completed(conn: sqlite3.Connection, older_than_hours: int = 72) -> int:
     cursor = conn.execute(
         """
@@ -269,15 +764,46 @@ def count_pending_by_model(conn: sqlite3.Connection) -> dict:
     """Count pending jobs per model_id."""
     rows = conn.execute(
         """
-        SELECT json_extract(args_json, '$.model_id') as model_id, COUNT(*) as cnt
+        SELECT model_id, COUNT(*) as cnt
         FROM jobs
         WHERE status = 'pending'
-        GROUP BY 1;
+        GROUP BY model_id;
         """
     ).fetchall()
     return {row["model_id"]: row["cnt"] for row in rows}
 
 
+RUN_PROGRESS_COUNTS = ("total", "pending", "processing", "completed", "failed")
+
+
+def get_run_progress(    conn: sqlite3.Connection,
+    model_id: str,
+    run_id: str,
+    region_id: Optional[str] = None,
+) -> Dict[str, int]:
+    """Job counts for a run from run_progress (kept current by triggers on jobs)."""
+    clauses = ["model_id = ?", "run_id = ?"]
+    params: list = [model_id, run_id]
+    if region_id is not None:
+        clauses.append("region_id = ?")
+        params.append(region_id)
+    row = conn.execute(
+        f"""
+        SELECT {', '.join(f'COALESCE(SUM({c}), 0) AS {c}' for c in RUN_PROGRESS_COUNTS)}
+        FROM run_progress
+        WHERE {' AND '.join(clauses)};
+        """,
+        params,
+    ).fetchone()
+    return {c: row[c] for c in RUN_PROGRESS_COUNTS}
+
+
+def remaining_jobs_for_run(conn: sqlite3.Connection, model_id: str, run_id: str) -> int:
+    """Pending + processing jobs for a model run."""
+    progress = get_run_progress(conn, model_id, run_id)
+    return progress["pending"] + progress["processing"]
+
+
 def count_by_status(conn: sqlite3.Connection) -> Dict[str, int]:
     rows = conn.execute(
         "SELECT status, COUNT(*) as count FROM jobs GROUP BY status;"
@@ -323,24 +849,18 @@ def cancel_siblings(conn: sqlite3.Connection, failed_job: Dict[str, Any]) -> int
     if not model_id or not run_id:
         return 0
 
-    # Match pending jobs whose args_json contains the same model_id and run_id.
-    # Since args_json is canonical (sorted keys, no spaces), substring match is safe.
     cursor = conn.execute(
         """
         UPDATE jobs
         SET status = 'failed',
             error_message = 'cancelled: sibling job failed',
             completed_at = strftime('%Y-%m-%dT%H:%M:%SZ','now')
-        WHERE status = 'pending'
-          AND type = ?
-          AND args_json LIKE ?
-          AND args_json LIKE ?;
+        WHERE model_id = ?
+          AND run_id = ?
+          AND status = 'pending'
+          AND type = ?;
         """,
-        (
-            failed_job["type"],
-            f'%"model_id":"{model_id}"%',
-            f'%"run_id":"{run_id}"%',
-        ),
+        (model_id, run_id, failed_job["type"]),
     )
     conn.commit()
     return cursor.rowcount
@@ -414,4 +934,6 @@ def retry_all_failed(conn: sqlite3.Connection, job_id: Optional[int] = None) ->
             """
         )
     conn.commit()
+    if cursor.rowcount:
+        notify_waiters(conn)
     return cursor.rowcount
@@ -1,12 +1,14 @@
 from __future__ import annotations
 
 import os
+from contextlib import contextmanager
 from datetime import datetime
 
 from flask import Blueprint, request, jsonify, render_template
 import pytz
 
 from config import repomap
+from db import busy_timeout, get_connection
 from status_utils import (
     get_disk_usage,
     get_job_queue_status,
@@ -15,17 +17,16 @@ from status_utils import (
     read_scheduler_logs,
     read_scheduler_status,
 )
+from tiles import tile_cache_stats
 
 status_bp = Blueprint("status", __name__)
 
 
-def _get_jobs_db():
-    """Get a DB connection with short busy_timeout for API reads."""
-    import sqlite3 as _sqlite3
-    from tile_db import init_db as _init_tile_db
-    conn = _init_tile_db(repomap.get("DB_PATH", "cache/jobs.db"))
-    conn.execute("PRAGMA busy_timeout = 2000")
-    return conn
+@contextmanager
+def _jobs_db():
+    """This thread's DB connection with a short busy_timeout for the API call."""
+    with busy_timeout(get_connection(repomap.get("DB_PATH", "cache/jobs.db")), 2000) as conn:
+        yield conn
 
 
 # --- Status routes ---
@@ -73,6 +74,7 @@ def api_status_summary():
         "scheduler_status": scheduler_status,
         "job_queue": job_queue,
         "rebuild_eta": get_rebuild_eta(),
+        "tile_cache": tile_cache_stats(),
         "timestamp": datetime.now(pytz.UTC).isoformat()
     })
 
@@ -103,12 +105,9 @@ def api_jobs_list():
         limit = 50
     limit = min(limit, 200)
 
-    conn = _get_jobs_db()
-    try:
+    with _jobs_db() as conn:
         jobs = get_jobs(conn, job_type=type_filter, status=status_filter, limit=limit)
         counts = count_by_status(conn)
-    finally:
-        conn.close()
     return jsonify({"jobs": jobs, "counts": counts})
 
 
@@ -119,11 +118,8 @@ def api_jobs_retry_failed():
     data = request.get_json(silent=True) or {}
     job_id = data.get("job_id")
 
-    conn = _get_jobs_db()
-    try:
+    with _jobs_db() as conn:
         retried = retry_all_failed(conn, job_id=job_id)
-    finally:
-        conn.close()
     return jsonify({"retried": retried})
 
 
@@ -135,11 +131,8 @@ def api_jobs_cancel():
     job_id = data.get("job_id")
     status_filter = data.get("status")
 
-    conn = _get_jobs_db()
-    try:
+    with _jobs_db() as conn:
         cancelled = cancel(conn, job_id=job_id, status_filter=status_filter)
-    finally:
-        conn.close()
     return jsonify({"cancelled": cancelled})
 
 
@@ -161,9 +154,6 @@ def api_jobs_enqueue_run():
     default_max = model_cfg_entry["max_hours"] if model_cfg_entry else repomap["MODELS"].get(model_id, {}).get("max_forecast_hours", 48)
     max_hours = get_max_hours_for_run(model_id, run_id, default_max)
 
-    conn = _get_jobs_db()
-    try:
+    with _jobs_db() as conn:
         enqueued = enqueue_run_jobs(conn, region_id, model_id, run_id, max_hours)
-    finally:
-        conn.close()
     return jsonify({"enqueued": enqueued})
@@ -0,0 +1,224 @@
+"""Learned publish times of model runs, for adaptive scheduler polling.
+
+The scheduler records every probe of a run's first and last forecast hour
+in the run_publish table of the jobs DB: the latest time the hour was still
+missing, then the time it was found. predicted_delays() estimates how long
+after init a model's runs publish (median over recent runs at the same init
+hour, else of the same synoptic/hourly kind), and expected_publish() turns
+that into times for one run. The scheduler skips runs that cannot be out
+yet and polls densely around the expected times and while a run's hours are
+still appearing. published_through is the run's watermark: every scheduled
+forecast hour up to it is published, so only later hours need probing.
+idx_gaps are the published hours whose idx lacks a variable's message; no
+job is planned for them, so they do not count against a run being built.
+"""
+from __future__ import annotations
+
+import sqlite3
+import statistics
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tile_db import hours_mask
+
+STAGES = ("first", "last")
+
+# Runs per init hour the prediction looks back over, and the minimum to trust it
+HISTORY_RUNS = 10
+MIN_SAMPLES = 3
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _run_time(run_id: str) -> datetime:
+    _, date_str, init_hour = run_id.split("_")
+    return datetime.strptime(f"{date_str}{init_hour}", "%Y%m%d%H")
+
+
+def record_probes(
+    conn: sqlite3.Connection,
+    stage: str,
+    results: Iterable[Tuple[str, str, bool]],
+    at: datetime,
+) -> None:
+    """Record (model_id, run_id, available) probes of the first or last forecast hour.
+
+    Once an hour is recorded available, later probes leave the row alone.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown publish stage: {stage}")
+    rows = [(model_id, run_id, available) for model_id, run_id, available in results]
+    conn.executemany(
+        "INSERT OR IGNORE INTO run_publish (model_id, run_id, init_time, init_hour) VALUES (?, ?, ?, ?);",
+        [(model_id, run_id, _iso(_run_time(run_id)), _run_time(run_id).hour) for model_id, run_id, _ in rows],
+    )
+    for available in (False, True):
+        column = f"{stage}_available_at" if available else f"{stage}_missing_at"
+        conn.executemany(
+            f"""
+            UPDATE run_publish SET {column} = ?
+            WHERE model_id = ? AND run_id = ? AND {stage}_available_at IS NULL;
+            """,
+            [(_iso(at), model_id, run_id) for model_id, run_id, seen in rows if seen == available],
+        )
+    conn.commit()
+
+
+def _delays(conn: sqlite3.Connection, model_id: str, stage: str, where: str, params: tuple) -> list:
+    # Midpoint between the last miss and the first sighting, in seconds after init
+    return [
+        row[0]
+        for row in conn.execute(
+            f"""
+            SELECT ROUND(((julianday({stage}_missing_at) + julianday({stage}_available_at)) / 2
+                          - julianday(init_time)) * 86400)
+            FROM run_publish
+            WHERE model_id = ? AND {where}
+              AND {stage}_missing_at IS NOT NULL AND {stage}_available_at IS NOT NULL
+            ORDER BY init_time DESC
+            LIMIT ?;
+            """,
+            (model_id, *params, HISTORY_RUNS),
+        )
+    ]
+
+
+def predicted_delays(conn: sqlite3.Connection, model_id: str, init_hour: int) -> Dict[str, float]:
+    """{stage: seconds after init} for stages with enough observed publishes."""
+    synoptic = "init_hour % 6 = 0" if init_hour % 6 == 0 else "init_hour % 6 != 0"
+    predicted = {}
+    for stage in STAGES:
+        delays = _delays(conn, model_id, stage, "init_hour = ?", (init_hour,))
+        if len(delays) < MIN_SAMPLES:
+            delays = _delays(conn, model_id, stage, synoptic, ())
+        if len(delays) >= MIN_SAMPLES:
+            predicted[stage] = statistics.median(delays)
+    return predicted
+
+
+def published_stages(conn: sqlite3.Connection, model_id: str, run_id: str) -> set:
+    """Stages already recorded available for a run."""
+    row = conn.execute(
+        "SELECT first_available_at, last_available_at FROM run_publish WHERE model_id = ? AND run_id = ?;",
+        (model_id, run_id),
+    ).fetchone()
+    if row is None:
+        return set()
+    return {stage for stage, at in zip(STAGES, row) if at is not None}
+
+
+def expected_publish(
+    conn: sqlite3.Connection,
+    model_id: str,
+    run_id: str,
+    delays: Optional[Dict[str, float]] = None,
+) -> Dict[str, datetime]:
+    """Predicted (naive UTC) publish times of a run's stages not yet seen available."""
+    run_dt = _run_time(run_id)
+    if delays is None:
+        delays = predicted_delays(conn, model_id, run_dt.hour)
+    published = published_stages(conn, model_id, run_id)
+    return {
+        stage: run_dt + timedelta(seconds=delay)
+        for stage, delay in delays.items()
+        if stage not in published
+    }
+
+
+def published_through(conn: sqlite3.Connection, model_id: str, run_id: str) -> Optional[int]:
+    """The run's watermark: every scheduled forecast hour up to it is published."""
+    row = conn.execute(
+        "SELECT published_through FROM run_publish WHERE model_id = ? AND run_id = ?;",
+        (model_id, run_id),
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def set_published_through(conn: sqlite3.Connection, model_id: str, run_id: str, forecast_hour: int) -> None:
+    """Advance the watermark (never moves it back)."""
+    run_dt = _run_time(run_id)
+    conn.execute(
+        """
+        INSERT INTO run_publish (model_id, run_id, init_time, init_hour, published_through)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(model_id, run_id) DO UPDATE SET
+            published_through = MAX(COALESCE(published_through, -1), excluded.published_through);
+        """,
+        (model_id, run_id, _iso(run_dt), run_dt.hour, forecast_hour),
+    )
+    conn.commit()
+
+
+def record_idx_gaps(conn: sqlite3.Connection, model_id: str, run_id: str, gaps: Dict[str, List[int]]) -> None:
+    """Add {variable_id: [forecast_hour, ...]} to the run's hours missing from the idx."""
+    if not gaps:
+        return
+    try:
+        known = idx_gaps(conn, model_id, run_id)
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO run_idx_gaps (model_id, run_id, variable_id, hours_mask)
+            VALUES (?, ?, ?, ?);
+            """,
+            [
+                (model_id, run_id, variable_id, _mask_bytes(known.get(variable_id, 0) | _mask_int(hours)))
+                for variable_id, hours in gaps.items()
+            ],
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def idx_gaps(conn: sqlite3.Connection, model_id: str, run_id: str) -> Dict[str, int]:
+    """{variable_id: bitmap of hours missing from the idx} for a run."""
+    return {
+        row[0]: int.from_bytes(row[1], "little")
+        for row in conn.execute(
+            "SELECT variable_id, hours_mask FROM run_idx_gaps WHERE model_id = ? AND run_id = ?;",
+            (model_id, run_id),
+        )
+    }
+
+
+def _mask_int(hours: Iterable[int]) -> int:
+    return int.from_bytes(hours_mask(list(hours)), "little")
+
+
+def _mask_bytes(mask: int) -> bytes:
+    return mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+
+
+def publishing_runs(conn: sqlite3.Connection, seen_since: datetime) -> list:
+    """(model_id, run_id) first seen since seen_since whose last hour is not out yet."""
+    return [
+        (row[0], row[1])
+        for row in conn.execute(
+            """
+            SELECT model_id, run_id FROM run_publish
+            WHERE first_available_at >= ? AND last_available_at IS NULL;
+            """,
+            (_iso(seen_since),),
+        )
+    ]
+
+
+def prune(conn: sqlite3.Connection, older_than_days: int = 14) -> int:
+    """Delete observations of runs initialised more than older_than_days ago."""
+    cursor = conn.execute(
+        "DELETE FROM run_publish WHERE init_time < strftime('%Y-%m-%dT%H:%M:%SZ', 'now', ?);",
+        (f"-{int(older_than_days)} days",),
+    )
+    conn.execute(
+        """
+        DELETE FROM run_idx_gaps WHERE NOT EXISTS (
+            SELECT 1 FROM run_publish
+            WHERE run_publish.model_id = run_idx_gaps.model_id AND run_publish.run_id = run_idx_gaps.run_id
+        );
+        """
+    )
+    conn.commit()
+    return cursor.rowcount
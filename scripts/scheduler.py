@@ -2,7 +2,7 @@
 """Tile job scheduler for fly.io deployment.
 
 Runs as a background process that periodically:
-1. Checks for new model runs via Herbie inventory
+1. Checks for new model runs via Herbie inventory (all models and runs probed concurrently)
 2. Enqueues tile-building jobs for each model/run/variable/hour
 3. Cleans up old Herbie GRIB cache and tile runs to save disk space
 
@@ -15,25 +15,48 @@ Usage:
 Environment variables:
     TILE_BUILD_INTERVAL_MINUTES: How often to check for new runs (default: 15)
     TILE_BUILD_MAX_HOURS_<MODEL>: Override max forecast hours per model
+    PUBLISH_POLL_SECONDS: Cycle interval around a run's expected publish time (default: 60)
+    SCHEDULER_NOW_UTC: Pin the clock runs are chosen against (YYYYMMDDHH), e.g.
+        to replay a pre-staged GRIB_MIRROR_URL (see scripts/seed_mirror.py)
 """
 
 import datetime
 import logging
 import os
 import sys
+import threading
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import grib_cache
+import run_publish
 from config import repomap, get_tile_resolution
-from grib_fetcher import get_valid_forecast_hours, get_run_forecast_hours, check_availability
-from tile_db import init_db, delete_tile_run, delete_region_tiles
+from grib_fetcher import (
+    get_valid_forecast_hours,
+    get_run_forecast_hours,
+    invalidate_remote_meta,
+    plan_run_messages,
+    probe_availability,
+    prune_remote_meta,
+)
+from db import get_connection
+from tile_db import (
+    init_db,
+    delete_region_tiles,
+    drain_tile_deletions,
+    expire_tile_runs,
+    hours_mask,
+    run_hour_masks,
+)
 from jobs import (
     init_db as init_jobs_db,
-    enqueue,
+    enqueue_many,
     recover_stale,
+    reset_failed_hours,
     prune_completed,
     prune_failed,
     count_pending_by_model,
@@ -71,6 +94,9 @@ logger.setLevel(logging.INFO)
 # Configuration from environment with defaults
 BUILD_INTERVAL_MINUTES = int(os.environ.get("TILE_BUILD_INTERVAL_MINUTES", "15"))
 BUILD_VARIABLES_ENV = os.environ.get("TILE_BUILD_VARIABLES", "") or "apcp,asnow,snod,t2m,cloud_cover,dpt,dswrf,wind_10m,gust,refc"
+# "variable": one build_tile_hour job per variable per hour (understood by the Rust worker)
+# "hour": one build_run_hour job per hour covering all variables (Python worker only)
+JOB_GRANULARITY = os.environ.get("TILE_JOB_GRANULARITY", "variable")
 # Tile retention: keep N synoptic (00/06/12/18z) + M hourly runs per model
 # Global defaults; override per-model with TILE_BUILD_SYNOPTIC_RUNS_<MODEL>
 DEFAULT_SYNOPTIC_RUNS = int(os.environ.get("TILE_BUILD_SYNOPTIC_RUNS", "8"))
@@ -87,6 +113,26 @@ def _get_retention(model_id):
 # Prevents runaway enqueue from misconfigured hour limits.
 MAX_PENDING_PER_MODEL = int(os.environ.get("TILE_BUILD_MAX_PENDING_PER_MODEL", "500"))
 
+# Adaptive polling (run_publish): cycle every PUBLISH_POLL_SECONDS from
+# PUBLISH_LEAD_MINUTES before to PUBLISH_LAG_MINUTES after a run's expected
+# publish time; runs not expected within the lead are not probed
+PUBLISH_POLL_SECONDS = int(os.environ.get("PUBLISH_POLL_SECONDS", "60"))
+PUBLISH_LEAD_MINUTES = int(os.environ.get("PUBLISH_LEAD_MINUTES", "10"))
+PUBLISH_LAG_MINUTES = int(os.environ.get("PUBLISH_LAG_MINUTES", "30"))
+# Keep polling densely while a run first seen this recently is still publishing hours
+PUBLISH_PROGRESS_MINUTES = int(os.environ.get("PUBLISH_PROGRESS_MINUTES", "180"))
+# Forecast hours probed per batch beyond a run's published-through watermark
+PROBE_AHEAD_HOURS = int(os.environ.get("TILE_BUILD_PROBE_AHEAD_HOURS", "6"))
+
+# Fixed "now" for run selection and priorities (mirror replays); unset = wall clock
+NOW_UTC_ENV = os.environ.get("SCHEDULER_NOW_UTC", "")
+
+
+def _now_utc() -> datetime.datetime:
+    if NOW_UTC_ENV:
+        return datetime.datetime.strptime(NOW_UTC_ENV, "%Y%m%d%H").replace(tzinfo=datetime.timezone.utc)
+    return datetime.datetime.now(datetime.timezone.utc)
+
 STATUS_FILE = os.path.join(repomap["CACHE_DIR"], "scheduler_status.json")
 
 
@@ -123,132 +169,285 @@ def write_scheduler_status(state="idle", last_run=None, next_run=None, targets=N
         logger.error(f"Failed to write status file: {e}")
 
 
-def check_run_available(model_id: str, date_str: str, init_hour: str) -> bool:
-    """Check if a model run is available via Herbie inventory."""
-    logger.info(f"Checking availability for {model_id} {date_str} {init_hour}")
-    first_hour = get_valid_forecast_hours(model_id, 24)[0]
-    return check_availability(model_id, date_str, init_hour, first_hour)
-
+def due_runs(conn, runs: list[tuple[str, str, int]], now: datetime.datetime) -> list[tuple[str, str, int]]:
+    """Runs that may be published by now.
 
-def tiles_exist(region_id: str, model_id: str, run_id: str, expected_max_hours: int = 24) -> bool:
+    A run is due unless its first forecast hour has a learned publish time
+    (run_publish) more than PUBLISH_LEAD_MINUTES away.
+    """
+    lead = datetime.timedelta(minutes=PUBLISH_LEAD_MINUTES)
+    naive_now = now.replace(tzinfo=None)
+    due = []
+    for run in runs:
+        model_id, run_id, _ = run
+        expected = run_publish.expected_publish(conn, model_id, run_id).get("first")
+        if expected is None or naive_now >= expected - lead:
+            due.append(run)
+    if len(due) < len(runs):
+        logger.info(f"Not probing {len(runs) - len(due)} runs that are not expected yet")
+    return due
+
+
+def next_poll_delay(conn, now: datetime.datetime) -> float:
+    """Seconds until the next cycle.
+
+    PUBLISH_POLL_SECONDS while a run is part way through publishing (first
+    hour seen within PUBLISH_PROGRESS_MINUTES, last not yet) or some run's
+    first or last forecast hour is within its publish window (expected time
+    - PUBLISH_LEAD_MINUTES to + PUBLISH_LAG_MINUTES) and not yet seen;
+    otherwise until the next window opens, at most BUILD_INTERVAL_MINUTES.
+    """
+    lead = datetime.timedelta(minutes=PUBLISH_LEAD_MINUTES)
+    lag = datetime.timedelta(minutes=PUBLISH_LAG_MINUTES)
+    naive_now = now.replace(tzinfo=None)
+    models = {model_cfg["id"] for model_cfg in MODELS_CONFIG}
+    seen_since = naive_now - datetime.timedelta(minutes=PUBLISH_PROGRESS_MINUTES)
+    if any(model_id in models for model_id, _ in run_publish.publishing_runs(conn, seen_since)):
+        return float(PUBLISH_POLL_SECONDS)
+    wake = naive_now + datetime.timedelta(minutes=BUILD_INTERVAL_MINUTES)
+    latest_init = wake.replace(minute=0, second=0, microsecond=0)
+    for model_cfg in MODELS_CONFIG:
+        model_id = model_cfg["id"]
+        freq = repomap["MODELS"][model_id].get("update_frequency_hours", 1)
+        delays_by_hour = {}
+        for hours_ago in range(48):
+            init = latest_init - datetime.timedelta(hours=hours_ago)
+            if init.hour % freq != 0:
+                continue
+            if init.hour not in delays_by_hour:
+                delays_by_hour[init.hour] = run_publish.predicted_delays(conn, model_id, init.hour)
+            if not delays_by_hour[init.hour]:
+                continue
+            run_id = f"run_{init:%Y%m%d}_{init:%H}"
+            for expected in run_publish.expected_publish(conn, model_id, run_id, delays_by_hour[init.hour]).values():
+                if expected - lead <= naive_now <= expected + lag:
+                    return float(PUBLISH_POLL_SECONDS)
+                if naive_now < expected - lead:
+                    wake = min(wake, expected - lead)
+    return max(1.0, (wake - naive_now).total_seconds())
+
+
+def probe_runs(runs: list[tuple[str, str, int]]) -> list[tuple[str, str, int]]:
+    """The (model_id, run_id, run_max) runs whose first forecast hour is published.
+
+    Every run is probed concurrently (grib_fetcher.probe_availability), so
+    this takes about as long as the slowest single probe. Cached misses are
+    probed again: a run is seen within one PUBLISH_POLL_SECONDS cycle of
+    appearing, and run_publish learns from real misses only.
+    """
+    probes = {}
+    for model_id, run_id, run_max in runs:
+        _, date_str, init_hour = run_id.split("_")
+        first_hour = get_valid_forecast_hours(model_id, 24)[0]
+        probes[(model_id, run_id, run_max)] = (model_id, date_str, init_hour, first_hour)
+    logger.info(f"Probing availability of {len(probes)} runs")
+    available = probe_availability(list(probes.values()), use_negative_cache=False)
+    return [run for run, probe in probes.items() if available[probe]]
+
+
+def tiles_exist(    region_id: str,
+    model_id: str,
+    run_id: str,
+    expected_max_hours: int = 24,
+    conn=None,
+) -> bool:
     """Check if tiles already exist and match the exact expected forecast steps.
 
-    Deterministic policy: require the hours array in a proxy variable (t2m)
-    to exactly match the model's schedule up to expected_max_hours.
+    Answered from the tile catalog alone: the run must be recorded at the
+    region's current resolution and bounds (backfill trigger after a region
+    change), and every build variable's hour bitmap must exactly match the
+    model's schedule up to expected_max_hours, less the hours whose idx had
+    no message for it (run_publish.idx_gaps; never enqueued).
     """
     res = get_tile_resolution(region_id, model_id)
-    res_dir = f"{res:.3f}deg".rstrip("0").rstrip(".")
-
-    # Check for t2m tiles as a proxy for the run
-    base_run_dir = os.path.join(repomap["TILES_DIR"], region_id, res_dir, model_id, run_id)
-    npz_path = os.path.join(base_run_dir, "t2m.npz")
-    if not os.path.exists(npz_path):
-        return False
-    # Verify region bounds match current config (backfill trigger after region expansion)
-    try:
-        meta_path = os.path.join(base_run_dir, "t2m.meta.json")
-        if os.path.exists(meta_path):
-            import json
-            with open(meta_path, "r") as f:
-                meta = json.load(f)
-            reg = repomap["TILING_REGIONS"][region_id]
-            tol = 1e-6
-            if (
-                abs(float(meta.get("lat_min")) - float(reg["lat_min"])) > tol or
-                abs(float(meta.get("lat_max")) - float(reg["lat_max"])) > tol or
-                abs(float(meta.get("lon_min")) - float(reg["lon_min"])) > tol or
-                abs(float(meta.get("lon_max")) - float(reg["lon_max"])) > tol or
-                abs(float(meta.get("resolution_deg")) - float(res)) > tol
-            ):
-                return False
-    except Exception:
-        # If meta can't be read, force rebuild
+    conn = conn or get_connection(repomap["DB_PATH"])
+    found = run_hour_masks(conn, region_id, res, model_id, run_id)
+    if found is None:
         return False
+    run_row, masks = found
+
+    reg = repomap["TILING_REGIONS"][region_id]
+    tol = 1e-6
+    for key in ("lat_min", "lat_max", "lon_min", "lon_max"):
+        # Rows written without bounds (older or Rust workers) are not checked
+        if run_row.get(key) is not None and abs(float(run_row[key]) - float(reg[key])) > tol:
+            return False
+
+    parts = run_id.split('_')
+    expected = hours_mask(get_run_forecast_hours(model_id, parts[1], parts[2], expected_max_hours))
+    expected = int.from_bytes(expected, "little")
+    gaps = run_publish.idx_gaps(conn, model_id, run_id)
+    for variable_id in _build_variable_ids(model_id):
+        offered = ~gaps.get(variable_id, 0)
+        if masks.get(variable_id, 0) & offered != expected & offered:
+            return False
+    return True
+
+
+def _build_variable_ids(model_id: str) -> list[str]:
+    """TILE_BUILD_VARIABLES known to config and not excluded for the model."""
+    var_ids = []
+    for variable_id in (v.strip() for v in BUILD_VARIABLES_ENV.split(",")):
+        variable_config = repomap["WEATHER_VARIABLES"].get(variable_id)
+        if variable_config and model_id not in variable_config.get("model_exclusions", []):
+            var_ids.append(variable_id)
+    return var_ids
 
-    # Strict completeness check against model schedule
-    try:
-        import numpy as np
-        with np.load(npz_path) as d:
-            have = d.get('hours', np.array([], dtype=np.int32)).tolist()
-        parts = run_id.split('_')
-        expected = get_run_forecast_hours(model_id, parts[1], parts[2], expected_max_hours)
-        return have == expected
-    except Exception:
-        return False
 
+def plan_run(model_id: str, run_id: str, max_hours: int, published_through: int | None = None) -> dict:
+    """Per-forecast-hour message plans for a run (grib_fetcher.plan_run_messages).
 
-def enqueue_run_jobs(conn, region_id: str, model_id: str, run_id: str, max_hours: int) -> int:
-    """Enqueue build_tile_hour jobs for every variable * forecast_hour.
+    Hours up to published_through (the run's watermark) are known to be out
+    and planned from the remote_meta cache. Later hours are probed in
+    parallel batches of PROBE_AHEAD_HOURS, bypassing cached misses, and
+    stopping after the first batch with an unpublished hour, so a run being
+    published costs one batch of idx lookups per cycle and the watermark
+    follows it every cycle. Shared by all regions; unprobed hours are absent.
+    """
+    parts = run_id.split("_")
+    date_str, init_hour = parts[1], parts[2]
+    forecast_hours = get_run_forecast_hours(model_id, date_str, init_hour, max_hours)
+    var_ids = _build_variable_ids(model_id)
+    known = [h for h in forecast_hours if published_through is not None and h <= published_through]
+    ahead = forecast_hours[len(known):]
+
+    plan = plan_run_messages(model_id, var_ids, date_str, init_hour, known) if known else {}
+    for i in range(0, len(ahead), PROBE_AHEAD_HOURS):
+        batch = plan_run_messages(
+            model_id, var_ids, date_str, init_hour, ahead[i:i + PROBE_AHEAD_HOURS], use_negative_cache=False
+        )
+        plan.update(batch)
+        if any(hour_plan is None for hour_plan in batch.values()):
+            break
+    return plan
 
-    Idempotent: duplicate jobs are ignored via UNIQUE(type, args_hash) in jobs table.
+
+def _published_through(plan: dict, forecast_hours: list[int]) -> int | None:
+    """Last forecast hour up to which every scheduled hour is in the plan."""
+    through = None
+    for hour in forecast_hours:
+        if plan.get(hour) is None:
+            break
+        through = hour
+    return through
+
+
+def enqueue_run_jobs(    conn,
+    region_id: str,
+    model_id: str,
+    run_id: str,
+    max_hours: int,
+    plan: dict | None = None,
+) -> int:
+    """Enqueue build_tile_hour jobs for every variable * forecast_hour
+    (or one build_run_hour job per forecast_hour with TILE_JOB_GRANULARITY=hour).
+
+    Only (variable, hour) pairs whose messages are in the hour's idx are
+    enqueued (plan from plan_run(), computed here if not given); the jobs
+    carry the GRIB URL and message byte ranges so workers skip the idx.
+    Unpublished hours are left for a later cycle.
+
+    Idempotent: duplicate jobs are ignored via UNIQUE(type, args_hash) in jobs table;
+    the hash leaves out the plan, so a changed source only refreshes pending jobs.
     Newer runs get higher priority so workers process fresh data first.
     Returns the number of newly enqueued jobs.
     """
     parts = run_id.split("_")
     date_str, init_hour = parts[1], parts[2]
     forecast_hours = get_run_forecast_hours(model_id, date_str, init_hour, max_hours)
-
-    # Determine variables to build
-    var_ids = [v.strip() for v in BUILD_VARIABLES_ENV.split(",") if v.strip()]
+    if plan is None:
+        plan = plan_run(model_id, run_id, max_hours)
 
     resolution_deg = get_tile_resolution(region_id, model_id)
 
     # Compute priority: newer runs get strictly higher priority.
     # Use minutes (not hours) so runs 6h apart never collide.
-    now = datetime.datetime.now(datetime.timezone.utc)
+    now = _now_utc()
     run_dt = datetime.datetime.strptime(f"{date_str}{init_hour}", "%Y%m%d%H").replace(tzinfo=datetime.timezone.utc)
     minutes_old = max(0, int((now - run_dt).total_seconds() / 60))
     priority = max(0, 100000 - minutes_old)
 
-    enqueued = 0
-
-    for variable_id in var_ids:
-        variable_config = repomap["WEATHER_VARIABLES"].get(variable_id)
-        if not variable_config:
-            continue
-        # Check for model-specific exclusions
-        if model_id in variable_config.get("model_exclusions", []):
-            continue
-
+    variable_resolutions = {}
+    for variable_id in _build_variable_ids(model_id):
+        variable_config = repomap["WEATHER_VARIABLES"][variable_id]
         # Use per-variable resolution override if set
-        var_resolution = variable_config.get("variable_resolution_override", resolution_deg)
-
-        for hour in forecast_hours:
-            job_args = {
-                "region_id": region_id,
-                "model_id": model_id,
-                "run_id": run_id,
-                "variable_id": variable_id,
-                "forecast_hour": hour,
-                "resolution_deg": var_resolution,
-            }
-            job_id = enqueue(conn, "build_tile_hour", job_args, priority=priority)
-            if job_id is not None:
-                enqueued += 1
+        variable_resolutions[variable_id] = variable_config.get("variable_resolution_override", resolution_deg)
+
+    def planned_args(hour_plan: dict, variable_ids) -> dict:
+        if not hour_plan["grib_url"]:
+            return {}
+        return {
+            "grib_url": hour_plan["grib_url"],
+            "messages": {v: hour_plan["messages"][v] for v in variable_ids},
+        }
+
+    job_specs = []
+    missing = []
+    for hour in forecast_hours:
+        hour_plan = plan.get(hour)
+        if hour_plan is None:
+            continue
+        available = {v: r for v, r in variable_resolutions.items() if v in hour_plan["messages"]}
+        missing += [(v, hour) for v in variable_resolutions if v not in available]
+        if JOB_GRANULARITY == "hour":
+            if available:
+                job_args = {
+                    "region_id": region_id,
+                    "model_id": model_id,
+                    "run_id": run_id,
+                    "forecast_hour": hour,
+                    "variables": available,
+                    **planned_args(hour_plan, available),
+                }
+                job_specs.append((job_args, priority))
+        else:
+            for variable_id, var_resolution in available.items():
+                job_args = {
+                    "region_id": region_id,
+                    "model_id": model_id,
+                    "run_id": run_id,
+                    "variable_id": variable_id,
+                    "forecast_hour": hour,
+                    "resolution_deg": var_resolution,
+                    **planned_args(hour_plan, [variable_id]),
+                }
+                job_specs.append((job_args, priority))
+    if missing:
+        logger.info(f"{model_id}/{run_id}: not in idx, skipped: {', '.join(f'{v}@f{h}' for v, h in missing)}")
+        gaps: dict[str, list[int]] = {}
+        for variable_id, hour in missing:
+            gaps.setdefault(variable_id, []).append(hour)
+        run_publish.record_idx_gaps(conn, model_id, run_id, gaps)
+
+    job_type = "build_run_hour" if JOB_GRANULARITY == "hour" else "build_tile_hour"
+    inserted, reset = enqueue_many(conn, job_type, job_specs)
+    enqueued = inserted + reset
+    if job_type == "build_run_hour":
+        # Failed follow-ups for part of an hour's variables (job_worker.process_build_run_hour)
+        enqueued += reset_failed_hours(
+            conn, job_type, region_id, model_id, run_id, [args["forecast_hour"] for args, _ in job_specs]
+        )
 
     return enqueued
 
 
-def process_model(model_cfg: dict, conn, pending_counts: dict) -> tuple[int, list]:
-    """Process a single model — find incomplete runs and enqueue them.
+def candidate_runs(model_cfg: dict, pending_counts: dict) -> list[tuple[str, str, int]]:
+    """Runs of a model that still need tiles, newest first, as (model_id, run_id, run_max).
 
-    Only enqueues up to the retention limit (synoptic + hourly) so we don't
-    build tiles that cleanup will immediately delete.
-
-    Returns (jobs_enqueued, targets).
+    Only considers runs up to the retention limit (synoptic + hourly) so we
+    don't build tiles that cleanup will immediately delete.
     """
     model_id = model_cfg["id"]
     max_hours = model_cfg["max_hours"]
     freq = repomap["MODELS"][model_id].get("update_frequency_hours", 1)
-    now = datetime.datetime.now(datetime.timezone.utc)
-    jobs_enqueued = 0
-    targets = []
+    now = _now_utc()
+    runs = []
 
     # Safety cap: skip if already too many pending jobs for this model
     current_pending = pending_counts.get(model_id, 0)
     if current_pending >= MAX_PENDING_PER_MODEL:
         logger.warning(f"SKIP {model_id}: {current_pending} pending jobs already (cap={MAX_PENDING_PER_MODEL})")
-        return 0, []
+        return []
 
     # Retention limits: only enqueue this many runs (newest first)
     max_syn, max_hr = _get_retention(model_id)
@@ -280,19 +479,50 @@ def process_model(model_cfg: dict, conn, pending_counts: dict) -> tuple[int, lis
             hourly_found += 1
 
         if all(tiles_exist(r, model_id, run_id, run_max) for r in REGIONS):
-            continue
-        if not check_run_available(model_id, date_str, init_hour):
-            continue
-
-        for region_id in REGIONS:
-            n = enqueue_run_jobs(conn, region_id, model_id, run_id, run_max)
-            jobs_enqueued += n
-        targets.append(f"{model_id}/{run_id}")
+            # Fully built: drop its cached source/idx metadata (no-op after the first time)
+            invalidate_remote_meta(model_id, run_id)
+        else:
+            runs.append((model_id, run_id, run_max))
 
         # Early exit if both budgets exhausted
         if synoptic_found >= max_syn and hourly_found >= max_hr:
             break
 
+    return runs
+
+
+def enqueue_runs(conn, runs: list[tuple[str, str, int]]) -> tuple[int, list]:
+    """Plan and enqueue the published hours of available runs. Returns (jobs_enqueued, targets).
+
+    Runs are planned concurrently from their watermarks (each plan reads
+    idx files on the shared probe pool); jobs are then written serially on
+    conn and each run's watermark is advanced.
+    """
+    if not runs:
+        return 0, []
+    watermarks = [run_publish.published_through(conn, model_id, run_id) for model_id, run_id, _ in runs]
+    # Plans mostly wait on the shared probe pool; more threads than it has would only queue there
+    with ThreadPoolExecutor(min(len(runs), repomap["PROBE_POOL_SIZE"]), thread_name_prefix="plan-run") as executor:
+        plans = list(executor.map(lambda args: plan_run(*args[0], args[1]), zip(runs, watermarks)))
+
+    jobs_enqueued = 0
+    targets = []
+    last_hours = []
+    for (model_id, run_id, run_max), plan, watermark in zip(runs, plans, watermarks):
+        _, date_str, init_hour = run_id.split("_")
+        forecast_hours = get_run_forecast_hours(model_id, date_str, init_hour, run_max)
+        through = _published_through(plan, forecast_hours)
+        if through is not None and through != watermark:
+            run_publish.set_published_through(conn, model_id, run_id, through)
+            logger.info(f"{model_id}/{run_id}: published through f{through:02d}")
+        last_hours.append((model_id, run_id, bool(forecast_hours) and through == forecast_hours[-1]))
+        try:
+            for region_id in REGIONS:
+                jobs_enqueued += enqueue_run_jobs(conn, region_id, model_id, run_id, run_max, plan)
+            targets.append(f"{model_id}/{run_id}")
+        except Exception as e:
+            logger.error(f"Error enqueueing {model_id}/{run_id}: {e}", exc_info=True)
+    run_publish.record_probes(conn, "last", last_hours, _now_utc())
     return jobs_enqueued, targets
 
 
@@ -311,21 +541,26 @@ def build_cycle():
         if recovered:
             logger.info(f"Recovered {recovered} stale jobs from previous crash")
 
-        total_enqueued = 0
-        all_targets = []
-
         # Snapshot pending counts before enqueue phase (for safety cap)
         pending_counts = count_pending_by_model(conn)
 
-        # Enqueue phase: sequential per model (fast, no I/O besides HEAD requests)
+        # Enqueue phase: candidate runs of every model, probed and planned concurrently
         logger.info(f"--- Enqueue phase ({len(MODELS_CONFIG)} models) ---")
+        candidates = []
         for model_cfg in MODELS_CONFIG:
             try:
-                enqueued, targets = process_model(model_cfg, conn, pending_counts)
-                total_enqueued += enqueued
-                all_targets.extend(targets)
+                candidates.extend(candidate_runs(model_cfg, pending_counts))
             except Exception as e:
                 logger.error(f"Error processing {model_cfg['id']}: {e}", exc_info=True)
+        due = due_runs(conn, candidates, _now_utc())
+        # Runs with a watermark are known to be out; only the rest need the first-hour probe
+        started = [run for run in due if run_publish.published_through(conn, run[0], run[1]) is not None]
+        unknown = [run for run in due if run not in started]
+        published = set(probe_runs(unknown))
+        run_publish.record_probes(
+            conn, "first", [(run[0], run[1], run in published) for run in unknown], _now_utc()
+        )
+        total_enqueued, all_targets = enqueue_runs(conn, started + [run for run in unknown if run in published])
 
         write_scheduler_status(state="running", targets=all_targets)
 
@@ -336,6 +571,10 @@ def build_cycle():
         pruned_failed = prune_failed(conn)
         if pruned_failed:
             logger.info(f"Pruned {pruned_failed} old failed jobs from DB")
+        pruned_meta = prune_remote_meta()
+        if pruned_meta:
+            logger.info(f"Pruned {pruned_meta} expired remote metadata entries")
+        run_publish.prune(conn)
 
         elapsed = time.monotonic() - cycle_start
         logger.info(f"Enqueue cycle complete in {elapsed:.0f}s: {total_enqueued} new jobs queued for workers")
@@ -345,158 +584,72 @@ def build_cycle():
         conn.close()
 
 
-def cleanup_herbie_cache(max_age_days: int = 2):
-    """Clean up old Herbie GRIB cache directories.
+def cleanup_herbie_cache():
+    """Enforce the GRIB cache budget (see grib_cache.sweep).
 
-    Herbie stores downloads at HERBIE_SAVE_DIR/<model>/YYYYMMDD/.
-    Delete date directories older than max_age_days.
+    Workers log every cached message they store or read; the sweep folds that
+    log into the grib_cache index and evicts least recently used files over
+    each model's grib_cache_quota_mb and then over GRIB_CACHE_MAX_MB.
     """
-    import shutil
-
-    herbie_dir = repomap.get("HERBIE_SAVE_DIR", "cache/herbie")
-    if not os.path.isdir(herbie_dir):
+    try:
+        stats = grib_cache.sweep()
+    except Exception as e:
+        logger.error(f"GRIB cache sweep failed: {e}")
         return
-
-    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=max_age_days)
-    cutoff_str = cutoff.strftime("%Y%m%d")
-
-    for model_name in os.listdir(herbie_dir):
-        model_dir = os.path.join(herbie_dir, model_name)
-        if not os.path.isdir(model_dir):
-            continue
-
-        for date_dir in os.listdir(model_dir):
-            date_path = os.path.join(model_dir, date_dir)
-            if not os.path.isdir(date_path):
-                continue
-            # Herbie date dirs are YYYYMMDD
-            if len(date_dir) == 8 and date_dir.isdigit() and date_dir < cutoff_str:
-                logger.info(f"Herbie cache cleanup: removing {model_name}/{date_dir}")
-                try:
-                    shutil.rmtree(date_path)
-                except Exception as e:
-                    logger.error(f"Failed to remove {date_path}: {e}")
+    if stats["evicted"]:
+        logger.info(
+            f"GRIB cache: evicted {stats['evicted']} files ({stats['freed_bytes'] / 1e6:.1f} MB), "
+            f"{stats['ingested']} accesses logged"
+        )
 
 
 def cleanup_old_runs():
-    """Clean up old tile runs using tiered retention:
+    """Expire tile runs using tiered retention, from the tile catalog:
     - Keep up to MAX_SYNOPTIC_RUNS synoptic runs (00, 06, 12, 18z)
     - Keep up to MAX_HOURLY_RUNS recent hourly runs (for HRRR etc)
 
-    Handles both v1 (run_* directories under model/) and v2 (run_*.rctile
-    files under model/variable/ subdirectories).
+    One transaction per model drops the expired runs' catalog rows and queues
+    their files (v1 run directories, v2 rctiles) for the background deleter.
+    No tile directory is listed, so the cost follows the number of expired runs.
     """
-    # Open DB connection once
     conn = init_db(repomap.get("DB_PATH"))
     try:
-        for region_id in REGIONS:
-            base_region_dir = os.path.join(repomap["TILES_DIR"], region_id)
-            if not os.path.isdir(base_region_dir):
-                continue
-
-            # Scan all resolution directories under the region
-            for res_entry in os.listdir(base_region_dir):
-                region_dir = os.path.join(base_region_dir, res_entry)
-                if not os.path.isdir(region_dir) or not res_entry.endswith("deg"):
-                    continue
-                # Parse resolution from dir name (e.g. "0.03deg" -> 0.03)
-                try:
-                    res = float(res_entry.replace("deg", ""))
-                except ValueError:
-                    continue
-
-                for model_id in os.listdir(region_dir):
-                    model_dir = os.path.join(region_dir, model_id)
-                    if not os.path.isdir(model_dir):
-                        continue
-
-                    max_syn, max_hr = _get_retention(model_id)
-
-                    # v1: run_* directories directly under model_dir
-                    runs = sorted(
-                        [r for r in os.listdir(model_dir) if r.startswith("run_") and os.path.isdir(os.path.join(model_dir, r))],
-                        reverse=True
-                    )
-
-                    if runs:
-                        _apply_tiered_retention_dirs(conn, model_dir, runs, model_id, region_id, res, max_syn, max_hr)
-
-                    # v2: variable subdirectories containing run_*.rctile files
-                    for var_entry in os.listdir(model_dir):
-                        var_dir = os.path.join(model_dir, var_entry)
-                        if not os.path.isdir(var_dir) or var_entry.startswith("run_"):
-                            continue  # skip v1 run dirs
-                        run_files = sorted(
-                            [f for f in os.listdir(var_dir) if f.startswith("run_") and f.endswith(".rctile")],
-                            reverse=True
-                        )
-                        if run_files:
-                            _apply_tiered_retention_files(conn, var_dir, run_files, model_id, region_id, res, max_syn, max_hr)
+        model_ids = [row[0] for row in conn.execute("SELECT DISTINCT model_id FROM tile_runs")]
+        for model_id in model_ids:
+            max_syn, max_hr = _get_retention(model_id)
+            expired = expire_tile_runs(conn, model_id, max_syn, max_hr, repomap["TILES_DIR"])
+            if expired:
+                logger.info(f"Tile cleanup {model_id}: expired {len(expired)} runs")
     finally:
         conn.close()
+    _tile_deletions_queued.set()
 
 
-def _apply_tiered_retention_dirs(conn, model_dir, runs, model_id, region_id, res, max_syn, max_hr):
-    """Apply tiered retention to v1 run_* directories."""
-    import shutil
-    synoptic_runs = []
-    hourly_runs = []
-    for run_id in runs:
-        try:
-            init_hour = int(run_id.split('_')[2])
-            if init_hour % 6 == 0:
-                synoptic_runs.append(run_id)
-            else:
-                hourly_runs.append(run_id)
-        except (IndexError, ValueError):
-            hourly_runs.append(run_id)
-
-    keep_all = set(synoptic_runs[:max_syn]) | set(hourly_runs[:max_hr])
-    runs_to_remove = [r for r in runs if r not in keep_all]
-
-    if runs_to_remove:
-        logger.info(f"Tile cleanup {model_id} (v1 dirs): removing {len(runs_to_remove)}")
-
-    for old_run in runs_to_remove:
-        old_run_dir = os.path.join(model_dir, old_run)
-        logger.info(f"Removing old tile run dir: {model_id}/{old_run}")
-        try:
-            shutil.rmtree(old_run_dir)
-            delete_tile_run(conn, region_id, res, model_id, old_run)
-        except Exception as e:
-            logger.error(f"Failed to remove {old_run_dir}: {e}")
+# Set whenever cleanup_old_runs() may have queued files; wakes _tile_deleter
+_tile_deletions_queued = threading.Event()
 
 
-def _apply_tiered_retention_files(conn, var_dir, run_files, model_id, region_id, res, max_syn, max_hr):
-    """Apply tiered retention to v2 run_*.rctile files in a variable directory."""
-    synoptic_files = []
-    hourly_files = []
-    for fname in run_files:
-        run_id = fname.replace(".rctile", "")
-        try:
-            init_hour = int(run_id.split('_')[2])
-            if init_hour % 6 == 0:
-                synoptic_files.append(fname)
-            else:
-                hourly_files.append(fname)
-        except (IndexError, ValueError):
-            hourly_files.append(fname)
-
-    keep_all = set(synoptic_files[:max_syn]) | set(hourly_files[:max_hr])
-    files_to_remove = [f for f in run_files if f not in keep_all]
-
-    if files_to_remove:
-        logger.info(f"Tile cleanup {model_id} (v2 files): removing {len(files_to_remove)} from {os.path.basename(var_dir)}")
-
-    for fname in files_to_remove:
-        fpath = os.path.join(var_dir, fname)
-        run_id = fname.replace(".rctile", "")
-        logger.info(f"Removing old rctile: {model_id}/{os.path.basename(var_dir)}/{fname}")
+def delete_queued_tiles() -> int:
+    """Remove the files queued by cleanup_old_runs(). Returns the number removed."""
+    conn = init_db(repomap.get("DB_PATH"))
+    try:
+        removed = drain_tile_deletions(conn)
+    finally:
+        conn.close()
+    if removed:
+        logger.info(f"Tile cleanup: removed {removed} queued files")
+    return removed
+
+
+def _tile_deleter():
+    """Background thread: delete queued tile files off the build cycle's path."""
+    while True:
+        _tile_deletions_queued.wait()
+        _tile_deletions_queued.clear()
         try:
-            os.remove(fpath)
-            delete_tile_run(conn, region_id, res, model_id, run_id)
+            delete_queued_tiles()
         except Exception as e:
-            logger.error(f"Failed to remove {fpath}: {e}")
+            logger.exception(f"Error deleting queued tiles: {e}")
 
 
 def main():
@@ -561,28 +714,46 @@ def main():
             shutil.rmtree(herbie_dir)
             logger.info(f"Startup: nuked GRIB cache {herbie_dir}")
         os.makedirs(herbie_dir, exist_ok=True)
+        grib_cache.reset()
     else:
         logger.info("Preserving existing caches (set CLEAN_SLATE_ON_START=1 to nuke)")
+        adopted = grib_cache.adopt_untracked()
+        if adopted:
+            logger.info(f"Startup: indexed {adopted} untracked GRIB cache files")
 
     logger.info("Startup: clean slate complete")
 
+    # Also picks up deletions queued before a restart
+    threading.Thread(target=_tile_deleter, name="tile-deleter", daemon=True).start()
+    _tile_deletions_queued.set()
+
     logger.info(f"Build interval: {BUILD_INTERVAL_MINUTES} minutes")
     logger.info(f"Models: {[m['id'] for m in MODELS_CONFIG]}")
     logger.info(f"Regions: {REGIONS}")
     logger.info("=" * 60)
 
+    last_cleanup = None
     while True:
+        sleep_s = BUILD_INTERVAL_MINUTES * 60
         try:
             # Run build cycle
             _, targets = build_cycle()
 
-            # Cleanup old runs and GRIBs periodically
-            cleanup_old_runs()
-            cleanup_herbie_cache()
+            # Cleanup old runs and GRIBs periodically (not on every publish-window poll)
+            if last_cleanup is None or time.monotonic() - last_cleanup >= BUILD_INTERVAL_MINUTES * 60:
+                cleanup_old_runs()
+                cleanup_herbie_cache()
+                last_cleanup = time.monotonic()
+
+            conn = init_jobs_db(repomap["DB_PATH"])
+            try:
+                sleep_s = next_poll_delay(conn, _now_utc())
+            finally:
+                conn.close()
 
             # Record success and sleep state
             now_utc = datetime.datetime.now(datetime.timezone.utc)
-            next_run = (now_utc + datetime.timedelta(minutes=BUILD_INTERVAL_MINUTES)).isoformat()
+            next_run = (now_utc + datetime.timedelta(seconds=sleep_s)).isoformat()
             write_scheduler_status(
                 state="sleeping",
                 last_run=now_utc.isoformat(),
@@ -595,9 +766,9 @@ def main():
             write_scheduler_status(state="error", error=e)
 
         # Sleep until next cycle
-        wake_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=BUILD_INTERVAL_MINUTES)
-        logger.info(f"Sleeping {BUILD_INTERVAL_MINUTES}m — next cycle at {wake_at.strftime('%H:%M:%S UTC')}")
-        time.sleep(BUILD_INTERVAL_MINUTES * 60)
+        wake_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=sleep_s)
+        logger.info(f"Sleeping {sleep_s:.0f}s — next cycle at {wake_at.strftime('%H:%M:%S UTC')}")
+        time.sleep(sleep_s)
 
 
 if __name__ == "__main__":
@@ -606,6 +777,7 @@ if __name__ == "__main__":
         logger.info("Running single enqueue cycle (--once mode)")
         build_cycle()
         cleanup_old_runs()
+        delete_queued_tiles()
         cleanup_herbie_cache()
     else:
         main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Stage a local GRIB mirror (GRIB_MIRROR_URL) from the parity fixtures.
+
+Each mirrored hour is a .grib2 holding the model's fixture messages (one per
+fixture variable) plus an idx in the upstream style listing them, written at
+the model's mirror_layout paths. Hours come from the fixtures themselves and,
+with --idx-root, from every upstream idx under a Herbie save dir such as
+cache_backup/herbie: the idx picks which message each variable stands in for,
+so searches resolve exactly as upstream while the data repeats the fixture.
+
+Usage:
+    python scripts/seed_mirror.py /tmp/grib-mirror [--idx-root cache_backup/herbie] [--models hrrr,gfs]
+    GRIB_MIRROR_URL=file:///tmp/grib-mirror SCHEDULER_NOW_UTC=2026022806 python scripts/scheduler.py --once
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import repomap
+from grib_fetcher import _parse_idx
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "grib_parity")
+
+
+def _load_fixtures(model_id: str, fixtures_dir: str) -> list[dict]:
+    fixtures = []
+    for meta_path in sorted(glob.glob(os.path.join(fixtures_dir, f"{model_id}_*_f*.json"))):
+        if meta_path.endswith("_tiles.json"):
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["model_id"] != model_id:
+            continue  # another model whose id shares this prefix
+        with open(meta_path[: -len(".json")] + ".grib2", "rb") as f:
+            meta["message"] = f.read()
+        fixtures.append(meta)
+    return fixtures
+
+
+def _idx_hour(text: str, style: str) -> tuple[datetime, int]:
+    """(run init, forecast hour) of an upstream idx, read from its content."""
+    if style == "eccodes":
+        first = json.loads(text.splitlines()[0])
+        return datetime.strptime(first["date"] + first["time"][:2], "%Y%m%d%H"), int(first["step"])
+    reference = text.split(":", 3)[2]
+    hours = Counter(re.findall(r":(\d+) hour fcst", text))
+    fxx = int(hours.most_common(1)[0][0]) if hours else 0  # "anl" only: f00
+    return datetime.strptime(reference, "d=%Y%m%d%H"), fxx
+
+
+def write_hour(dest: str, model_id: str, idx_text: str, run_dt: datetime, fxx: int, fixtures: list[dict]) -> int:
+    """Write one mirrored hour. Returns the number of messages staged."""
+    layout = repomap["MODELS"][model_id]["mirror_layout"]
+    style = layout.get("idx_style", "wgrib2")
+    inventory = _parse_idx(idx_text, style)
+    lines = [line for line in idx_text.splitlines() if line]
+
+    chosen = {}
+    for fixture in fixtures:
+        rows = inventory[inventory.search_this.str.contains(fixture["search_string"])]
+        if not rows.empty:
+            chosen[int(rows.grib_message.iloc[0])] = fixture["message"]
+    if not chosen:
+        return 0
+
+    grib_path = os.path.join(dest, layout["grib"].format(date=run_dt, fxx=fxx))
+    idx_path = os.path.join(dest, layout["idx"].format(date=run_dt, fxx=fxx))
+    os.makedirs(os.path.dirname(grib_path), exist_ok=True)
+    idx_lines = []
+    offset = 0
+    with open(grib_path, "wb") as out:
+        for number, (grib_message, message) in enumerate(sorted(chosen.items()), start=1):
+            line = lines[grib_message - 1]
+            if style == "eccodes":
+                entry = json.loads(line)
+                entry.update(_offset=offset, _length=len(message))
+                idx_lines.append(json.dumps(entry))
+            else:
+                idx_lines.append(f"{number}:{offset}:{line.split(':', 2)[2]}")
+            out.write(message)
+            offset += len(message)
+    with open(idx_path, "w") as f:
+        f.write("\n".join(idx_lines) + "\n")
+    return len(chosen)
+
+
+def seed_model(    dest: str,
+    model_id: str,
+    fixtures_dir: str = FIXTURES_DIR,
+    idx_root: str | None = None,
+    max_hours: int | None = None,
+) -> int:
+    """Stage up to max_hours hours for a model (every hour carries a full copy of
+    the fixture messages). Returns the number of hours written."""
+    fixtures = _load_fixtures(model_id, fixtures_dir)
+    if not fixtures:
+        return 0
+    layout = repomap["MODELS"][model_id]["mirror_layout"]
+    style = layout.get("idx_style", "wgrib2")
+
+    idx_files = glob.glob(os.path.join(fixtures_dir, f"{model_id}_f*.idx"))
+    if idx_root:
+        herbie_model = repomap["MODELS"][model_id]["herbie_model"]
+        suffix = ".index" if style == "eccodes" else ".idx"
+        idx_files += glob.glob(os.path.join(idx_root, herbie_model, "*", f"*{suffix}"))
+
+    hours = 0
+    for idx_file in sorted(idx_files):
+        with open(idx_file) as f:
+            text = f.read()
+        try:
+            run_dt, fxx = _idx_hour(text, style)
+        except (ValueError, IndexError, KeyError):
+            continue
+        if write_hour(dest, model_id, text, run_dt, fxx, fixtures):
+            hours += 1
+            if max_hours and hours >= max_hours:
+                break
+    return hours
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dest", help="mirror root directory")
+    parser.add_argument("--idx-root", help="Herbie save dir with upstream idx files (e.g. cache_backup/herbie)")
+    parser.add_argument("--models", default=",".join(repomap["MODELS"]), help="comma-separated model ids")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--max-hours", type=int, default=100, help="hours per model (0 = all; ~2-4 MB each)")
+    args = parser.parse_args()
+
+    for model_id in args.models.split(","):
+        hours = seed_model(args.dest, model_id, args.fixtures, args.idx_root, args.max_hours)
+        print(f"{model_id}: {hours} hours staged")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
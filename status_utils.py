@@ -4,8 +4,9 @@ from collections import deque
 from datetime import datetime, timedelta, timezone
 
 from config import repomap
-from jobs import init_db as init_jobs_db, count_by_status
-from tile_db import init_db
+from db import get_connection
+from grib_cache import cache_usage
+from jobs import count_by_status, count_live_workers
 
 STATUS_FILE = os.path.join(repomap["CACHE_DIR"], "scheduler_status.json")
 
@@ -71,7 +72,7 @@ def _get_expected_runs(model_id: str, lookback_hours: int = 72) -> list[str]:
 
 
 def get_run_grid():
-    """Get per-model/run/variable job status summary from the jobs table.
+    """Get per-model/run/variable job status summary from the run_progress table.
 
     Returns a dict keyed by model_id with per-run, per-variable counts.
     Designed for a table view: rows=runs, columns=variables, cells=done/total.
@@ -97,36 +98,24 @@ def get_run_grid():
         }
     }
     """
-    conn = init_db(repomap.get("DB_PATH"))
-    try:
-        rows = conn.execute(
-            """
-            SELECT
-                json_extract(args_json, '$.model_id') as model_id,
-                json_extract(args_json, '$.run_id') as run_id,
-                json_extract(args_json, '$.variable_id') as variable_id,
-                status,
-                COUNT(*) as cnt
-            FROM jobs
-            WHERE type = 'build_tile_hour'
-            GROUP BY 1, 2, 3, 4
-            ORDER BY model_id, run_id DESC, variable_id, status
-            """,
-        ).fetchall()
-    finally:
-        conn.close()
+    conn = get_connection(repomap.get("DB_PATH"))
+    rows = conn.execute(
+        """
+        SELECT model_id, run_id, variable_id,
+               SUM(pending) AS pending, SUM(processing) AS processing,
+               SUM(completed) AS completed, SUM(failed) AS failed
+        FROM run_progress
+        GROUP BY 1, 2, 3
+        """,
+    ).fetchall()
 
     # Build nested structure: model -> run -> variable -> {status: count}
+    # build_run_hour jobs cover every variable of an hour (variable_id '')
     raw = {}
     for row in rows:
-        model_id = row["model_id"]
-        run_id = row["run_id"]
-        var_id = row["variable_id"]
-        status = row["status"]
-        cnt = row["cnt"]
-
-        raw.setdefault(model_id, {}).setdefault(run_id, {}).setdefault(var_id, {})
-        raw[model_id][run_id][var_id][status] = cnt
+        raw.setdefault(row["model_id"], {}).setdefault(row["run_id"], {})[row["variable_id"] or "all"] = {
+            status: row[status] for status in ("completed", "pending", "failed", "processing")
+        }
 
     # Format into the output structure
     grid = {}
@@ -211,7 +200,6 @@ def get_disk_usage():
             "tiles": { "total": int, "models": { "model_id": int } }
         }
     """
-    grib_dir = repomap.get("HERBIE_SAVE_DIR", "cache/herbie")
     tiles_dir = repomap["TILES_DIR"]
     
     usage = {
@@ -220,14 +208,8 @@ def get_disk_usage():
         "tiles": {"total": 0, "models": {}}
     }
     
-    # GRIBS
-    if os.path.exists(grib_dir):
-        usage["gribs"]["total"] = _get_dir_size(grib_dir)
-        for model_id in os.listdir(grib_dir):
-            model_path = os.path.join(grib_dir, model_id)
-            if os.path.isdir(model_path):
-                size = _get_dir_size(model_path)
-                usage["gribs"][model_id] = size
+    # GRIBS: from the LRU index (grib_cache), no directory walk
+    usage["gribs"] = cache_usage(get_connection(repomap["DB_PATH"]))
     
     # TILES
     # Tiles structure is complex: tiles/{region}/{res}/{model}
@@ -288,11 +270,8 @@ def get_job_queue_status():
         dict: {"pending": int, "processing": int, "completed": int, "failed": int}
     """
     try:
-        conn = init_jobs_db(repomap.get("DB_PATH", "cache/jobs.db"))
-        try:
-            return count_by_status(conn)
-        finally:
-            conn.close()
+        conn = get_connection(repomap.get("DB_PATH", "cache/jobs.db"))
+        return count_by_status(conn)
     except Exception:
         return {}
 
@@ -300,9 +279,10 @@ def get_job_queue_status():
 def get_rebuild_eta():
     """Estimate time to drain the job queue.
 
-    Derives active worker count from DB: distinct worker_ids that completed
-    a job in the last 5 minutes (proven alive). Falls back to workers that
-    started a job in the last 2 minutes, then to env var default.
+    Derives active worker count from the workers registry (fresh heartbeat).
+    Falls back to distinct worker_ids that completed a job in the last 5
+    minutes, then workers that started a job in the last 2 minutes, then to
+    env var default.
 
     Returns:
         dict with pending_total, avg_job_seconds, workers, eta_seconds
@@ -310,49 +290,50 @@ def get_rebuild_eta():
     default_workers = int(os.environ.get("TILE_BUILD_WORKERS", "2"))
 
     try:
-        conn = init_jobs_db(repomap.get("DB_PATH", "cache/jobs.db"))
-        try:
-            pending = conn.execute(
-                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending','processing')"
-            ).fetchone()[0]
-
-            row = conn.execute(
-                """SELECT AVG((julianday(completed_at) - julianday(started_at)) * 86400)
-                   FROM jobs WHERE status='completed'
-                   AND started_at IS NOT NULL AND completed_at IS NOT NULL"""
-            ).fetchone()
-            avg_duration = row[0] if row[0] else None
-
-            # Best signal: workers that completed a job in the last 5 min
+        conn = get_connection(repomap.get("DB_PATH", "cache/jobs.db"))
+        pending = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN ('pending','processing')"
+        ).fetchone()[0]
+
+        row = conn.execute(
+            """SELECT AVG((julianday(completed_at) - julianday(started_at)) * 86400)
+               FROM jobs WHERE status='completed'
+               AND started_at IS NOT NULL AND completed_at IS NOT NULL"""
+        ).fetchone()
+        avg_duration = row[0] if row[0] else None
+
+        # Best signal: workers with a fresh heartbeat in the registry
+        workers = count_live_workers(conn)
+
+        # Unregistered workers (Rust): those that completed a job in the last 5 min
+        if not workers:
             workers = conn.execute(
                 """SELECT COUNT(DISTINCT worker_id) FROM jobs
                    WHERE status='completed'
                    AND completed_at > strftime('%Y-%m-%dT%H:%M:%SZ','now','-5 minutes')"""
             ).fetchone()[0]
 
-            # Fallback: workers that claimed a job in the last 2 min (fresh start)
-            if not workers:
-                workers = conn.execute(
-                    """SELECT COUNT(DISTINCT worker_id) FROM jobs
-                       WHERE status='processing'
-                       AND started_at > strftime('%Y-%m-%dT%H:%M:%SZ','now','-2 minutes')"""
-                ).fetchone()[0]
-
-            # Final fallback: configured default
-            if not workers:
-                workers = default_workers
-
-            eta_seconds = None
-            if avg_duration and pending > 0:
-                eta_seconds = int((pending * avg_duration) / max(workers, 1))
-
-            return {
-                "pending_total": pending,
-                "avg_job_seconds": round(avg_duration, 1) if avg_duration else None,
-                "workers": workers,
-                "eta_seconds": eta_seconds,
-            }
-        finally:
-            conn.close()
+        # Fallback: workers that claimed a job in the last 2 min (fresh start)
+        if not workers:
+            workers = conn.execute(
+                """SELECT COUNT(DISTINCT worker_id) FROM jobs
+                   WHERE status='processing'
+                   AND started_at > strftime('%Y-%m-%dT%H:%M:%SZ','now','-2 minutes')"""
+            ).fetchone()[0]
+
+        # Final fallback: configured default
+        if not workers:
+            workers = default_workers
+
+        eta_seconds = None
+        if avg_duration and pending > 0:
+            eta_seconds = int((pending * avg_duration) / max(workers, 1))
+
+        return {
+            "pending_total": pending,
+            "avg_job_seconds": round(avg_duration, 1) if avg_duration else None,
+            "workers": workers,
+            "eta_seconds": eta_seconds,
+        }
     except Exception:
         return None
@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+
+import db
+
+
+def test_connect_migrates_once_and_skips_ddl(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "jobs.db")
+    conn = db.connect(db_path)
+    assert db.schema_version(conn) == len(db.MIGRATIONS)
+    conn.close()
+
+    applied = []
+    monkeypatch.setattr(db, "MIGRATIONS", db.MIGRATIONS + [lambda c: applied.append(c)])
+    for _ in range(2):
+        db.connect(db_path).close()
+    assert len(applied) == 1
+
+    statements = []
+    conn = db.connect(db_path)
+    conn.set_trace_callback(statements.append)
+    db.migrate(conn)
+    assert statements == ["PRAGMA user_version"]
+    conn.close()
+
+
+def test_legacy_unversioned_db_is_upgraded(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(db_path)
+    legacy.execute(
+        "CREATE TABLE tile_variables (region_id TEXT, resolution_deg REAL, model_id TEXT, "
+        "run_id TEXT, variable_id TEXT, npz_path TEXT, meta_path TEXT, hours_json TEXT, size_bytes INTEGER)"
+    )
+    legacy.commit()
+    legacy.close()
+
+    conn = db.connect(db_path)
+    cols = {row["name"] for row in conn.execute("PRAGMA table_info(tile_variables)")}
+    assert "job_id" in cols
+    assert db.schema_version(conn) == len(db.MIGRATIONS)
+    conn.close()
+
+
+def test_get_connection_is_per_thread(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    main = db.get_connection(db_path)
+    assert db.get_connection(db_path) is main
+
+    main.execute("INSERT INTO jobs (type, args_json, args_hash) VALUES ('t', '{}', 'h')")
+    assert main.in_transaction
+    # A transaction left open by a previous caller does not leak into the next one
+    assert db.get_connection(db_path).in_transaction is False
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db.get_connection(db_path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not main
+    db.close_thread_connections()
+
+
+def test_busy_timeout_is_restored_on_shared_connection(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    conn = db.get_connection(db_path)
+    with db.busy_timeout(conn, 2000):
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 2000
+    # Later users of this thread's connection keep the default
+    assert db.get_connection(db_path).execute("PRAGMA busy_timeout").fetchone()[0] == 30000
+    db.close_thread_connections()
@@ -0,0 +1,87 @@
+import os
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+import grib_cache
+from config import repomap
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setitem(repomap, "HERBIE_SAVE_DIR", str(tmp_path / "herbie"))
+    monkeypatch.setitem(repomap, "GRIB_CACHE_MAX_MB", 1)
+    monkeypatch.setitem(repomap["MODELS"]["hrrr"], "grib_cache_quota_mb", 0.5)
+    clock = iter(f"2026-03-01T00:00:{s:02d}Z" for s in range(60))
+    monkeypatch.setattr(grib_cache, "_now", lambda: next(clock))
+    return tmp_path / "herbie"
+
+
+def test_sweep_evicts_least_recently_used_per_model_then_total(cache):
+    kb = 1024
+    grib_cache.store_message("hrrr", "hrrr/20260301/a.0.grib2", b"a" * 200 * kb)
+    grib_cache.store_message("hrrr", "hrrr/20260301/b.0.grib2", b"b" * 200 * kb)
+    grib_cache.store_message("gfs", "gfs/20260301/c.0.grib2", b"c" * 300 * kb)
+    grib_cache.store_message("hrrr", "hrrr/20260301/d.0.grib2", b"d" * 200 * kb)
+    assert grib_cache.read_message("hrrr", "hrrr/20260301/a.0.grib2") == b"a" * 200 * kb
+    assert grib_cache.cache_usage()["total"] == 0  # nothing indexed until the log is ingested
+
+    # hrrr holds 600 KiB against a 512 KiB quota: b (oldest access) goes
+    stats = grib_cache.sweep()
+    assert stats == {"ingested": 5, "evicted": 1, "freed_bytes": 200 * kb}
+    assert not (cache / "hrrr/20260301/b.0.grib2").exists()
+    assert grib_cache.cache_usage() == {"total": 700 * kb, "hrrr": 400 * kb, "gfs": 300 * kb}
+
+    # Over the 1 MiB total: c is now the least recently used anywhere
+    grib_cache.store_message("gfs", "gfs/20260301/e.0.grib2", b"e" * 400 * kb)
+    assert grib_cache.sweep()["evicted"] == 1
+    assert grib_cache.read_message("gfs", "gfs/20260301/c.0.grib2") is None
+    assert grib_cache.cache_usage() == {"total": 800 * kb, "hrrr": 400 * kb, "gfs": 400 * kb}
+
+    # A logged file that is gone by ingest time (evicted meanwhile) is not indexed
+    grib_cache.store_message("gfs", "gfs/20260301/f.0.grib2", b"f")
+    os.remove(cache / "gfs/20260301/f.0.grib2")
+    assert grib_cache.sweep()["ingested"] == 0
+
+    # Files from before the index existed are adopted once, under their top-level directory
+    (cache / "ifs").mkdir()
+    (cache / "ifs" / "legacy.grib2").write_bytes(b"x" * kb)
+    assert grib_cache.adopt_untracked() == 1
+    assert grib_cache.cache_usage()["ifs"] == kb
+
+
+def test_fetch_grib_messages_serves_repeat_fetches_from_cache(cache, monkeypatch):
+    import grib_fetcher
+
+    inventory = pd.DataFrame(
+        [(1, 0, 9, ":TMP:2 m above ground:"), (2, 10, 29, ":APCP:surface:")],
+        columns=["grib_message", "start_byte", "end_byte", "search_this"],
+    )
+    remote = MagicMock(grib="https://example.com/hrrr.20260301/conus/hrrr.t00z.wrfsfcf01.grib2",
+                       idx="x.idx", model="hrrr", fxx=1, date=datetime(2026, 3, 1))
+    remote.inventory.return_value = inventory
+    payload = bytes(range(30))
+    reads = []
+    monkeypatch.setattr(
+        grib_fetcher, "_read_range", lambda source, start, end: reads.append((start, end)) or payload[start:end + 1]
+    )
+
+    first = grib_fetcher.fetch_grib_messages(remote, [":TMP:", ":APCP:"], 0, model_id="hrrr")
+    assert reads == [(0, 29)]  # contiguous messages, one request
+    assert (cache / "hrrr/20260301/hrrr.t00z.wrfsfcf01.grib2.10.grib2").read_bytes() == payload[10:30]
+
+    # A rebuild of the hour only fetches what is no longer cached
+    os.remove(cache / "hrrr/20260301/hrrr.t00z.wrfsfcf01.grib2.10.grib2")
+    reads.clear()
+    second = grib_fetcher.fetch_grib_messages(remote, [":TMP:", ":APCP:"], 0, model_id="hrrr")
+    assert second == first
+    assert reads == [(10, 29)]
+
+    # With caching disabled every message goes to the network
+    monkeypatch.setitem(repomap, "GRIB_CACHE_MAX_MB", 0)
+    reads.clear()
+    grib_fetcher.fetch_grib_messages(remote, [":TMP:"], 0, model_id="hrrr")
+    assert reads == [(0, 9)]
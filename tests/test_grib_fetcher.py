@@ -1,5 +1,10 @@
+import glob
+import os
 from unittest.mock import MagicMock, patch
 
+import pandas as pd
+import pytest
+
 from grib_fetcher import (
     _get_search_string,
     get_valid_forecast_hours,
@@ -7,6 +12,23 @@ from grib_fetcher import (
 )
 
 
+@pytest.fixture(autouse=True)
+def _isolated_db(tmp_path, monkeypatch):
+    # resolve_remote caches in the jobs DB
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
+
+
+def _inventory(*search_this):
+    return pd.DataFrame({
+        "grib_message": range(1, len(search_this) + 1),
+        "start_byte": [i * 100 for i in range(len(search_this))],
+        "end_byte": [i * 100 + 99 for i in range(len(search_this))],
+        "search_this": list(search_this),
+    })
+
+
 def test_get_search_string_default():
     search = _get_search_string("t2m", "hrrr")
     assert "TMP" in search and "2 m" in search
@@ -24,8 +46,8 @@ def test_get_search_string_missing_variable():
 
 @patch("grib_fetcher._build_herbie")
 def test_check_availability_true(mock_build):
-    mock_herbie = MagicMock()
-    mock_herbie.inventory.return_value = MagicMock(empty=False)
+    mock_herbie = MagicMock(grib="https://example.test/hrrr.grib2", idx="https://example.test/hrrr.grib2.idx")
+    mock_herbie.inventory.return_value = _inventory(":TMP:2 m above ground:1 hour fcst:")
     mock_build.return_value = mock_herbie
 
     assert check_availability("hrrr", "20260215", "12", 1) is True
@@ -35,3 +57,369 @@ def test_check_availability_true(mock_build):
 def test_check_availability_false_on_exception(mock_build):
     mock_build.side_effect = Exception("network error")
     assert check_availability("hrrr", "20260215", "12", 1) is False
+
+
+def test_resolve_remote_caches_hits_and_misses(monkeypatch):
+    import grib_fetcher
+    from db import get_connection
+    from config import repomap
+
+    published = MagicMock(grib="https://example.test/f01.grib2", idx="https://example.test/f01.grib2.idx")
+    published.inventory.return_value = _inventory(":TMP:2 m above ground:1 hour fcst:", ":APCP:surface:0-1 hour acc fcst:")
+    missing = MagicMock(grib=None, idx=None)
+    builds = []
+
+    def build(model_id, date_str, init_hour, forecast_hour):
+        builds.append(forecast_hour)
+        return published if forecast_hour == 1 else missing
+
+    monkeypatch.setattr(grib_fetcher, "_build_herbie", build)
+    for _ in range(3):
+        assert check_availability("hrrr", "20260215", "12", 1) is True
+        assert check_availability("hrrr", "20260215", "12", 2) is False
+    assert builds == [1, 2]
+
+    remote = grib_fetcher.resolve_remote("hrrr", "20260215", "12", 1)
+    assert remote.grib == published.grib
+    pd.testing.assert_frame_equal(
+        remote.inventory().astype({"end_byte": float}),
+        published.inventory.return_value.astype({"end_byte": float}),
+    )
+
+    # Negative results expire; the run is re-probed afterwards
+    conn = get_connection(repomap["DB_PATH"])
+    conn.execute("UPDATE remote_meta SET expires_at = '2000-01-01T00:00:00Z' WHERE grib_url IS NULL")
+    conn.commit()
+    assert check_availability("hrrr", "20260215", "12", 2) is False
+    assert builds == [1, 2, 2]
+    # Publish detection re-probes a cached miss but still uses cached hits
+    assert check_availability("hrrr", "20260215", "12", 2, use_negative_cache=False) is False
+    assert check_availability("hrrr", "20260215", "12", 1, use_negative_cache=False) is True
+    assert builds == [1, 2, 2, 2]
+    assert grib_fetcher.invalidate_remote_meta("hrrr", "run_20260215_12") == 2
+
+
+def test_coalesce_ranges_merges_within_gap():
+    from grib_fetcher import coalesce_ranges
+
+    ranges = [(200, 299), (0, 99), (100, 149), (1000, None), (1200, 1300)]
+    assert coalesce_ranges(ranges, 0) == [(0, 149), (200, 299), (1000, None)]
+    assert coalesce_ranges(ranges, 50) == [(0, 299), (1000, None)]
+    assert coalesce_ranges(ranges, 10_000) == [(0, None)]
+
+
+def _fixture_grib_file(tmp_path, variable_ids, gap):
+    """Write HRRR parity messages into one local 'remote' file with gap bytes between them."""
+    import json
+    import os
+
+    import numpy as np
+    import pandas as pd
+
+    fixtures = os.path.join(os.path.dirname(__file__), "fixtures", "grib_parity")
+    path = tmp_path / "hrrr.t00z.wrfsfcf01.grib2"
+    rows = []
+    with open(path, "wb") as out:
+        for i, variable_id in enumerate(variable_ids, start=1):
+            if i > 1:
+                out.write(b"\0" * gap)
+            meta = json.load(open(os.path.join(fixtures, f"hrrr_{variable_id}_f1.json")))
+            data = open(os.path.join(fixtures, f"hrrr_{variable_id}_f1.grib2"), "rb").read()
+            start = out.tell()
+            out.write(data)
+            rows.append((i, start, start + len(data) - 1, meta["idx_search_this"]))
+    inventory = pd.DataFrame(rows, columns=["grib_message", "start_byte", "end_byte", "search_this"])
+    inventory.loc[inventory.index[-1], "end_byte"] = np.nan  # last message runs to EOF
+    herbie = MagicMock(grib=str(path), idx="hrrr.idx", model="hrrr", fxx=1)
+    herbie.inventory.return_value = inventory
+    return fixtures, herbie
+
+
+def test_open_hour_as_xarray_fetches_coalesced_ranges(tmp_path, monkeypatch):
+    """Adjacent messages share one ranged read and decode like the per-variable files."""
+    import os
+
+    import numpy as np
+    import xarray as xr
+
+    import grib_fetcher
+    from grib_fetcher import open_hour_as_xarray
+
+    fixtures, herbie = _fixture_grib_file(tmp_path, ["asnow", "t2m", "apcp"], gap=100)
+    reads = []
+    real_read = grib_fetcher._read_range
+    monkeypatch.setattr(grib_fetcher, "_read_range", lambda *a: reads.append(a[1:]) or real_read(*a))
+
+    with patch("grib_fetcher._build_herbie", return_value=herbie):
+        datasets, errors = open_hour_as_xarray("hrrr", ["t2m", "apcp", "asnow", "nope"], "20260228", "00", 1)
+    assert len(reads) == 1
+    assert set(datasets) == {"t2m", "apcp", "asnow"} and set(errors) == {"nope"}
+    for variable_id, ds in datasets.items():
+        expected = xr.open_dataset(
+            os.path.join(fixtures, f"hrrr_{variable_id}_f1.grib2"), engine="cfgrib", backend_kwargs={"indexpath": ""}
+        )
+        (name,) = expected.data_vars
+        np.testing.assert_array_equal(ds[name].values, expected[name].values)
+
+    # Below the gap threshold every message is its own request
+    reads.clear()
+    messages = grib_fetcher.fetch_grib_messages(herbie, [":TMP:2 m", ":APCP:", ":ASNOW:"], max_gap_bytes=10)
+    assert len(reads) == 3
+    assert [len(m[0]) for m in messages.values()] == [
+        os.path.getsize(os.path.join(fixtures, f"hrrr_{v}_f1.grib2")) for v in ("t2m", "apcp", "asnow")
+    ]
+
+
+_PARITY_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "grib_parity")
+_PARITY_FIXTURES = sorted(
+    os.path.basename(p)[: -len("_tiles.json")] for p in glob.glob(os.path.join(_PARITY_DIR, "*_tiles.json"))
+)
+
+
+def _parity_message(name):
+    with open(os.path.join(_PARITY_DIR, f"{name}.grib2"), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name", _PARITY_FIXTURES)
+def test_direct_decode_matches_cfgrib_and_reference_tiles(name, tmp_path, monkeypatch):
+    import json
+
+    import numpy as np
+
+    import grib_fetcher
+    import tiles
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "CELL_MAP_DIR", str(tmp_path / "cell_maps"))
+    monkeypatch.setattr(tiles, "_cell_maps", {})
+    meta = json.load(open(os.path.join(_PARITY_DIR, f"{name}.json")))
+    tile_meta = json.load(open(os.path.join(_PARITY_DIR, f"{name}_tiles.json")))
+    message = _parity_message(name)
+
+    values, attrs = grib_fetcher._decode_field(message)
+    ds = grib_fetcher._decode_messages([message])
+    da = ds[list(ds.data_vars)[0]]
+    assert values.dtype == np.float32
+    np.testing.assert_array_equal(values, da.values)
+    assert attrs["units"] == meta["units"]
+
+    field = grib_fetcher.GribField(values, attrs, message)
+    # Both decoders key the same persisted cell mapping
+    assert tiles._grid_fingerprint(field) == tiles._grid_fingerprint(da)
+
+    bounds = (tile_meta["lat_min"], tile_meta["lat_max"], tile_meta["lon_min"], tile_meta["lon_max"])
+    mins, maxs, means, _, index_meta = tiles.build_tiles_for_variable(
+        {meta["forecast_hour"]: field}, {"conversion": tile_meta["conversion"]}, *bounds, tile_meta["resolution_deg"]
+    )
+    reference = np.load(os.path.join(_PARITY_DIR, f"{name}_tiles.npz"))
+    np.testing.assert_allclose(mins, reference["mins"], rtol=1e-6)
+    np.testing.assert_allclose(maxs, reference["maxs"], rtol=1e-6)
+    np.testing.assert_allclose(means, reference["means"], rtol=1e-5)
+    assert index_meta["index_lon_min"] == tile_meta["index_lon_min"]
+
+
+def test_direct_decode_composites_match_xarray_path():
+    import eccodes
+    import numpy as np
+
+    import grib_fetcher
+
+    # 10 m wind: U/V messages derived from the HRRR t2m fixture
+    components = []
+    for number, scale in ((2, 0.05), (3, -0.03)):
+        gid = eccodes.codes_new_from_message(_parity_message("hrrr_t2m_f1"))
+        for key, value in (("parameterCategory", 2), ("parameterNumber", number), ("typeOfFirstFixedSurface", 103),
+                           ("scaleFactorOfFirstFixedSurface", 0), ("scaledValueOfFirstFixedSurface", 10)):
+            eccodes.codes_set(gid, key, value)
+        eccodes.codes_set_values(gid, (eccodes.codes_get_values(gid) - 280.0) * scale)
+        components.append(eccodes.codes_get_message(gid))
+        eccodes.codes_release(gid)
+    wind = grib_fetcher._decode_variable_direct("wind_10m", "hrrr", [components])
+    expected = grib_fetcher._decode_messages(components).herbie.with_wind(which="speed")["si10"]
+    np.testing.assert_array_equal(wind.values, expected.values)
+
+    # ECMWF snod: sd / density (t2m stands in for a density field above and below the cutoff)
+    sd, rsn = _parity_message("ecmwf_hres_snod_f3"), _parity_message("ecmwf_hres_t2m_f3")
+    snod = grib_fetcher._decode_variable_direct("snod", "ifs", [[sd], [rsn]])
+    expected = grib_fetcher._ecmwf_snod_dataset(
+        grib_fetcher._decode_messages([sd]), grib_fetcher._decode_messages([rsn])
+    )["snod"]
+    np.testing.assert_array_equal(snod.values, expected.values)
+    assert "units" not in snod.attrs
+
+    with pytest.raises(ValueError):
+        grib_fetcher._decode_variable_direct("t2m", "hrrr", [[sd, rsn]])
+
+
+def test_open_hour_direct_decoder_skips_coordinates_once_mapped(tmp_path, monkeypatch):
+    import numpy as np
+
+    import grib_fetcher
+    import tiles
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "GRIB_DECODER", "eccodes")
+    monkeypatch.setitem(repomap, "CELL_MAP_DIR", str(tmp_path / "cell_maps"))
+    monkeypatch.setattr(tiles, "_cell_maps", {})
+    _, herbie = _fixture_grib_file(tmp_path, ["t2m", "apcp"], gap=0)
+    bounds = (33.0, 47.0, -88.0, -66.0)
+
+    with patch("grib_fetcher._build_herbie", return_value=herbie):
+        fields, errors = grib_fetcher.open_hour_as_xarray("hrrr", ["t2m", "apcp"], "20260228", "00", 1)
+    assert not errors
+    assert all(isinstance(f, grib_fetcher.GribField) for f in fields.values())
+    first = tiles.build_tiles_for_variable({1: fields["t2m"]}, {}, *bounds, 0.03)
+
+    # Same grid, other variable: the cached mapping is used and no coordinates are decoded
+    def no_coords(self):
+        raise AssertionError("coordinates decoded despite a cached mapping")
+
+    monkeypatch.setattr(grib_fetcher.GribField, "_decode_coords", no_coords)
+    second = tiles.build_tiles_for_variable({1: fields["apcp"]}, {}, *bounds, 0.03)
+    assert np.isfinite(first[2]).sum() == np.isfinite(second[2]).sum() > 0
+
+
+def test_host_rate_limiter_is_shared_through_state_file(tmp_path):
+    import time
+
+    from grib_fetcher import HostRateLimiter
+
+    state = str(tmp_path / "rate-example")
+    a = HostRateLimiter(state, rate_per_s=20.0, burst=2)
+    b = HostRateLimiter(state, rate_per_s=20.0, burst=2)  # e.g. another worker process
+    start = time.monotonic()
+    a.acquire()
+    b.acquire()
+    assert time.monotonic() - start < 0.04  # burst
+    a.acquire()
+    b.acquire()
+    assert time.monotonic() - start >= 0.09  # then 20/s
+    b.block_for(0.1)
+    blocked = time.monotonic()
+    a.acquire()
+    assert time.monotonic() - blocked >= 0.09
+
+
+def test_read_range_backs_off_on_rate_limit(monkeypatch):
+    import grib_fetcher
+
+    responses = [
+        MagicMock(status_code=302, headers={}),
+        MagicMock(status_code=429, headers={"Retry-After": "7"}),
+        MagicMock(status_code=206, headers={}, content=b"GRIB"),
+    ]
+    session = MagicMock()
+    session.get.side_effect = responses
+    limiter = MagicMock()
+    monkeypatch.setattr(grib_fetcher, "_session_for", lambda host: session)
+    monkeypatch.setattr(grib_fetcher, "_limiter_for", lambda host: limiter)
+
+    url = "https://nomads.ncep.noaa.gov/pub/nam.t00z.conusnest.hiresf01.tm00.grib2"
+    assert grib_fetcher._read_range(url, 0, 3) == b"GRIB"
+    assert limiter.acquire.call_count == 3
+    # NOMADS backoff_s=5 doubles per attempt; Retry-After wins when given
+    assert [c.args[0] for c in limiter.block_for.call_args_list] == [5.0, 7.0]
+    assert session.get.call_args.kwargs["headers"] == {"Range": "bytes=0-3"}
+
+
+@pytest.mark.parametrize("model_id", ["hrrr", "gfs", "nbm", "nam_nest", "ecmwf_hres"])
+def test_parse_idx_matches_herbie_inventory(model_id):
+    import json
+
+    from config import repomap
+    from grib_fetcher import _parse_idx
+
+    style = repomap["MODELS"][model_id]["mirror_layout"].get("idx_style", "wgrib2")
+    (idx_path,) = glob.glob(os.path.join(_PARITY_DIR, f"{model_id}_f*.idx"))
+    inventory = _parse_idx(open(idx_path).read(), style)
+    for meta_path in glob.glob(os.path.join(_PARITY_DIR, f"{model_id}_*_f*.json")):
+        meta = json.load(open(meta_path))
+        if meta_path.endswith("_tiles.json") or meta["model_id"] != model_id:
+            continue
+        # Keyed by the recorded message: some fixtures were captured with a looser match
+        row = inventory[inventory.search_this == meta["idx_search_this"]].iloc[0]
+        assert (row.start_byte, row.end_byte) == (meta["byte_start"], meta["byte_end"])
+
+
+def test_mirror_serves_availability_and_decode_offline(tmp_path, monkeypatch):
+    import numpy as np
+
+    import grib_fetcher
+    from config import repomap
+    from scripts.seed_mirror import seed_model
+
+    assert seed_model(str(tmp_path / "mirror"), "hrrr") == 1
+    monkeypatch.setitem(repomap, "GRIB_MIRRORS", {"hrrr": f"file://{tmp_path / 'mirror'}"})
+
+    with patch("grib_fetcher._build_herbie", side_effect=AssertionError("upstream contacted")):
+        assert check_availability("hrrr", "20260228", "00", 1)
+        assert not check_availability("hrrr", "20260228", "00", 2)
+        datasets, errors = grib_fetcher.open_hour_as_xarray("hrrr", ["t2m", "apcp"], "20260228", "00", 1)
+    assert not errors
+    for variable_id, ds in datasets.items():
+        expected = grib_fetcher._decode_messages([_parity_message(f"hrrr_{variable_id}_f1")])
+        (name,) = expected.data_vars
+        np.testing.assert_array_equal(ds[name].values, expected[name].values)
+    # Mirrors are read in place, never copied into the GRIB cache
+    assert not glob.glob(os.path.join(repomap["HERBIE_SAVE_DIR"], "hrrr", "20260228", "*.grib2"))
+
+
+def test_planned_byte_ranges_fetch_without_idx(tmp_path, monkeypatch):
+    import json
+
+    import numpy as np
+
+    import grib_fetcher
+    from config import repomap
+    from scripts.seed_mirror import seed_model
+
+    seed_model(str(tmp_path / "mirror"), "hrrr")
+    monkeypatch.setitem(repomap, "GRIB_MIRRORS", {"hrrr": f"file://{tmp_path / 'mirror'}"})
+
+    plans = grib_fetcher.plan_run_messages("hrrr", ["t2m", "apcp", "refc"], "20260228", "00", [1, 2])
+    assert plans[2] is None  # not published
+    plan = json.loads(json.dumps(plans[1]))  # as stored in job args
+    assert set(plan["messages"]) == {"t2m", "apcp"}  # no REFC message in the hour
+    assert plan["grib_url"].endswith("hrrr.20260228/conus/hrrr.t00z.wrfsfcf01.grib2")
+
+    monkeypatch.setattr(grib_fetcher, "resolve_remote", MagicMock(side_effect=AssertionError("idx read")))
+    datasets, errors = grib_fetcher.open_hour_as_xarray("hrrr", ["t2m", "apcp"], "20260228", "00", 1, plan)
+    assert not errors
+    for variable_id, ds in datasets.items():
+        expected = grib_fetcher._decode_messages([_parity_message(f"hrrr_{variable_id}_f1")])
+        (name,) = expected.data_vars
+        np.testing.assert_array_equal(ds[name].values, expected[name].values)
+
+
+def test_probe_availability_runs_concurrently_within_host_limits(monkeypatch):
+    import threading
+    import time
+
+    import grib_fetcher
+
+    active, peak, calls = {}, {}, []
+    lock = threading.Lock()
+
+    def check(model_id, date_str, init_hour, forecast_hour, use_negative_cache=True):
+        host = grib_fetcher._source_host(model_id)
+        with lock:
+            calls.append((model_id, init_hour))
+            active[host] = active.get(host, 0) + 1
+            peak[host] = max(peak.get(host, 0), active[host])
+        time.sleep(0.05)
+        with lock:
+            active[host] -= 1
+        return init_hour != "03"
+
+    monkeypatch.setattr(grib_fetcher, "check_availability", check)
+    probes = [(m, "20260228", f"{h:02d}", 1) for m in ("hrrr", "nam_nest", "nbm") for h in range(6)]
+    start = time.monotonic()
+    results = grib_fetcher.probe_availability(probes + probes[:3])
+    elapsed = time.monotonic() - start
+
+    assert len(calls) == len(results) == 18  # duplicates probed once
+    assert results[("hrrr", "20260228", "02", 1)] and not results[("nbm", "20260228", "03", 1)]
+    assert peak["nomads.ncep.noaa.gov"] == 2  # nam_nest + nbm share NOMADS' probe_concurrency
+    assert peak["noaa-hrrr-bdp-pds.s3.amazonaws.com"] == 4
+    assert elapsed < 0.05 * 18 / 2
@@ -89,3 +89,80 @@ def test_process_build_tile_hour_does_not_auto_complete(tmp_path, monkeypatch):
     status_row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
     assert status_row["status"] == "completed"
     conn.close()
+
+
+def test_accumulated_hours_are_written_once_on_flush(tmp_path, monkeypatch):
+    """With accumulators, hours stay in memory until flush and land in one NPZ write."""
+    from job_worker import flush_accumulators
+
+    conn = _setup_worker_test(tmp_path, monkeypatch)
+
+    def fake_build_tiles_for_variable(datasets_by_hour, *args, **kwargs):
+        (hour,) = datasets_by_hour.keys()
+        grid = np.full((1, 1, 1), float(hour), dtype=np.float32)
+        return grid, grid, grid, [hour], {}
+
+    monkeypatch.setattr("job_worker.build_tiles_for_variable", fake_build_tiles_for_variable)
+
+    import job_worker
+    writes = []
+    real_upsert = job_worker.upsert_tiles_npz
+
+    def counting_upsert(*args, **kwargs):
+        writes.append(args[9])
+        return real_upsert(*args, **kwargs)
+
+    monkeypatch.setattr("job_worker.upsert_tiles_npz", counting_upsert)
+
+    accumulators = {}
+    for hour in (1, 2):
+        _enqueue_tile_job(conn, forecast_hour=hour)
+        job = claim(conn, "worker-test")
+        process_build_tile_hour(conn, job, accumulators)
+
+    assert writes == []
+    assert conn.execute("SELECT COUNT(*) FROM tile_hours").fetchone()[0] == 0
+    # Held hours keep their jobs claimed until they are written
+    statuses = conn.execute("SELECT DISTINCT status FROM jobs").fetchall()
+    assert [row["status"] for row in statuses] == ["processing"]
+
+    assert flush_accumulators(conn, accumulators) == 2
+    statuses = conn.execute("SELECT DISTINCT status FROM jobs").fetchall()
+    assert [row["status"] for row in statuses] == ["completed"]
+    assert writes == [[1, 2]]
+    assert accumulators == {}
+
+    npz_path = tmp_path / "tiles" / "ne" / "1.000deg" / "hrrr" / "run_20240101_00" / "t2m.npz"
+    with np.load(npz_path) as d:
+        assert d["hours"].tolist() == [1, 2]
+        assert d["means"][:, 0, 0].tolist() == [1.0, 2.0]
+    hours = conn.execute("SELECT forecast_hour FROM tile_hours ORDER BY forecast_hour").fetchall()
+    assert [row["forecast_hour"] for row in hours] == [1, 2]
+    conn.close()
+
+
+def test_failed_flush_fails_held_jobs_for_retry(tmp_path, monkeypatch):
+    """A write that fails must not complete the jobs whose hours it lost."""
+    from job_worker import flush_accumulators
+
+    conn = _setup_worker_test(tmp_path, monkeypatch)
+
+    def failing_upsert(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("job_worker.upsert_tiles_npz", failing_upsert)
+
+    accumulators = {}
+    job_id = _enqueue_tile_job(conn)
+    process_build_tile_hour(conn, claim(conn, "worker-test"), accumulators)
+
+    assert flush_accumulators(conn, accumulators) == 0
+    assert accumulators == {}
+    row = conn.execute("SELECT status, error_message FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    assert row["status"] == "failed"
+    assert "disk full" in row["error_message"]
+    assert conn.execute("SELECT COUNT(*) FROM tile_hours").fetchone()[0] == 0
+
+    # The scheduler's next enqueue resets it so the hour is rebuilt
+    assert _enqueue_tile_job(conn) == job_id
+    conn.close()
@@ -1,3 +1,4 @@
+import json
 import sqlite3
 import threading
 from datetime import datetime, timedelta, timezone
@@ -322,3 +323,222 @@ def test_get_jobs_filters_by_type_and_status(tmp_path):
     assert len(jobs) == 1
     assert jobs[0]["status"] == "completed"
     assert jobs[0]["type"] == "build_tile"
+
+
+def test_claim_prefers_runs_being_accumulated(tmp_path):
+    conn = init_db(str(tmp_path / "jobs.db"))
+    enqueue(conn, "build_tile_hour", {"model_id": "hrrr", "run_id": "run_20260101_01"}, priority=10)
+    enqueue(conn, "build_tile_hour", {"model_id": "hrrr", "run_id": "run_20260101_00"}, priority=1)
+    job = claim(conn, "worker-1", prefer_runs=[("hrrr", "run_20260101_00")])
+    assert '"run_id":"run_20260101_00"' in job["args_json"]
+    # Without a preference, priority order applies again
+    job = claim(conn, "worker-1")
+    assert '"run_id":"run_20260101_01"' in job["args_json"]
+
+
+def test_job_arg_columns_cover_raw_inserts_and_index_claims(tmp_path):
+    conn = init_db(str(tmp_path / "jobs.db"))
+    # Writers that only know (type, args_json, args_hash, priority), e.g. the Rust server
+    conn.execute(
+        "INSERT INTO jobs (type, args_json, args_hash, priority) VALUES (?, ?, ?, ?)",
+        ("build_tile_hour", '{"forecast_hour":6,"model_id":"gfs","region_id":"ne","run_id":"run_20240101_00","variable_id":"t2m"}', "h", 0),
+    )
+    conn.commit()
+    row = conn.execute("SELECT model_id, run_id, variable_id, forecast_hour, region_id FROM jobs").fetchone()
+    assert tuple(row) == ("gfs", "run_20240101_00", "t2m", 6, "ne")
+
+    plan = " ".join(
+        r[3] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM jobs WHERE status = 'pending' AND model_id = ? "
+            "ORDER BY priority DESC, created_at ASC, id ASC LIMIT 1",
+            ("gfs",),
+        )
+    )
+    assert "idx_jobs_claim_model" in plan and "TEMP B-TREE" not in plan
+    assert claim(conn, "w1", model_id="gfs")["forecast_hour"] == 6
+
+
+def test_enqueue_many_inserts_and_resets_in_one_transaction(tmp_path):
+    from jobs import enqueue_many
+
+    conn = init_db(str(tmp_path / "jobs.db"))
+    done_id = enqueue(conn, "build_tile_hour", {"forecast_hour": 1})
+    failed_id = enqueue(conn, "build_tile_hour", {"forecast_hour": 2})
+    complete(conn, done_id)
+    claim(conn, "w1")
+    fail(conn, failed_id, "boom", max_retries=0)
+
+    commits = []
+    conn.set_trace_callback(lambda sql: commits.append(sql) if sql.strip().upper() == "COMMIT" else None)
+    specs = [({"forecast_hour": h}, 10) for h in (1, 2, 3, 4)]
+    assert enqueue_many(conn, "build_tile_hour", specs) == (2, 1)
+    assert len(commits) == 1
+
+    counts = count_by_status(conn)
+    assert counts == {"completed": 1, "pending": 3}
+    # Re-running the same batch is a no-op
+    assert enqueue_many(conn, "build_tile_hour", specs) == (0, 0)
+
+
+def test_enqueue_dedups_on_identity_and_refreshes_pending_plan(tmp_path):
+    from jobs import enqueue_many
+
+    conn = init_db(str(tmp_path / "jobs.db"))
+    identity = {"model_id": "hrrr", "run_id": "run_20240101_00", "forecast_hour": 1, "variable_id": "t2m"}
+    done_id = enqueue(conn, "build_tile_hour", {**identity, "grib_url": "a", "messages": {"t2m": [[[0, 9]]]}})
+    claim(conn, "w1")
+    complete(conn, done_id)
+    pending_id = enqueue(conn, "build_tile_hour", {**identity, "forecast_hour": 2, "grib_url": "a"})
+
+    # A new source or new byte ranges must not add a second job for the same hour
+    specs = [({**identity, "forecast_hour": h, "grib_url": "b", "messages": {"t2m": [[[5, 20]]]}}, 0) for h in (1, 2)]
+    assert enqueue_many(conn, "build_tile_hour", specs) == (0, 0)
+    assert conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] == 2
+
+    rows = {row["id"]: json.loads(row["args_json"]) for row in conn.execute("SELECT id, args_json FROM jobs")}
+    assert rows[done_id]["grib_url"] == "a"  # completed jobs keep the plan they ran with
+    assert rows[pending_id]["grib_url"] == "b" and rows[pending_id]["messages"] == {"t2m": [[[5, 20]]]}
+
+
+def test_run_progress_tracks_every_status_change(tmp_path):
+    from jobs import cancel_siblings, enqueue_many, get_run_progress, remaining_jobs_for_run
+
+    conn = init_db(str(tmp_path / "jobs.db"))
+    specs = [
+        ({"model_id": "gfs", "run_id": "run_20240101_00", "region_id": "ne", "variable_id": v, "forecast_hour": h}, 0)
+        for v in ("t2m", "apcp") for h in (3, 6)
+    ]
+    enqueue_many(conn, "build_tile_hour", specs)
+    enqueue(conn, "other", {"note": "no model/run"})
+    assert get_run_progress(conn, "gfs", "run_20240101_00") == {
+        "total": 4, "pending": 4, "processing": 0, "completed": 0, "failed": 0,
+    }
+
+    first = claim(conn, "w1", model_id="gfs")
+    complete(conn, first["id"])
+    second = claim(conn, "w1", model_id="gfs")
+    assert get_run_progress(conn, "gfs", "run_20240101_00")["processing"] == 1
+    fail(conn, second["id"], "404")
+    cancel_siblings(conn, second)
+    progress = get_run_progress(conn, "gfs", "run_20240101_00")
+    assert progress == {"total": 4, "pending": 0, "processing": 0, "completed": 1, "failed": 3}
+    assert remaining_jobs_for_run(conn, "gfs", "run_20240101_00") == 0
+
+    # Counters always equal a recount of the jobs table, including after deletes
+    conn.execute("DELETE FROM jobs WHERE status = 'failed'")
+    conn.commit()
+    rows = conn.execute("SELECT variable_id, total, completed FROM run_progress ORDER BY variable_id").fetchall()
+    recount = conn.execute(
+        "SELECT variable_id, COUNT(*), SUM(status = 'completed') FROM jobs "
+        "WHERE model_id IS NOT NULL GROUP BY variable_id ORDER BY variable_id"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [tuple(r) for r in recount]
+
+
+def test_claim_blocking_wakes_on_enqueue(tmp_path):
+    import time
+
+    import jobs
+
+    db_path = str(tmp_path / "jobs.db")
+    init_db(db_path).close()
+    result = {}
+
+    def wait():
+        conn = init_db(db_path)
+        start = time.monotonic()
+        result["job"] = jobs.claim_blocking(conn, "w1", timeout=30, poll_interval_s=30)
+        result["elapsed"] = time.monotonic() - start
+        conn.close()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.2)
+    producer = init_db(db_path)
+    enqueue(producer, "build_tile_hour", {"forecast_hour": 1})
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert result["job"]["worker_id"] == "w1"
+    assert result["elapsed"] < 2
+
+
+def test_claim_blocking_polls_without_channel(tmp_path, monkeypatch):
+    import jobs
+
+    conn = init_db(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(jobs, "_wakeup_socket", lambda conn: None)
+    sleeps = []
+    monkeypatch.setattr(jobs.time, "sleep", lambda s: sleeps.append(s) or enqueue(conn, "t", {"a": 1}))
+    job = jobs.claim_blocking(conn, "w1", timeout=30, poll_interval_s=0.5)
+    assert job is not None and sleeps == [0.5]
+
+
+def test_expired_lease_is_reclaimed_immediately(tmp_path):
+    import jobs
+
+    conn = init_db(str(tmp_path / "jobs.db"))
+    job_id = enqueue(conn, "build_tile_hour", {"forecast_hour": 1})
+    assert claim(conn, "dead")["lease_expires_at"] is not None
+    assert claim(conn, "w2") is None  # live lease
+
+    conn.execute(
+        "UPDATE jobs SET lease_expires_at = strftime('%Y-%m-%dT%H:%M:%SZ','now','-1 seconds') WHERE id = ?",
+        (job_id,),
+    )
+    conn.commit()
+    job = claim(conn, "w2")
+    assert job["id"] == job_id and job["worker_id"] == "w2"
+    assert jobs.renew_lease(conn, job_id, "w2")
+    assert not jobs.renew_lease(conn, job_id, "dead")
+
+
+def test_lease_heartbeat_renews_and_registers_worker(tmp_path):
+    import jobs
+
+    db_path = str(tmp_path / "jobs.db")
+    conn = init_db(db_path)
+    job_id = enqueue(conn, "build_tile_hour", {"forecast_hour": 1})
+    jobs.register_worker(conn, "w1", "hrrr")
+    claim(conn, "w1")
+    conn.execute("UPDATE jobs SET lease_expires_at = '2000-01-01T00:00:00Z' WHERE id = ?", (job_id,))
+    conn.execute("UPDATE workers SET heartbeat_at = '2000-01-01T00:00:00Z'")
+    conn.commit()
+    assert jobs.count_live_workers(conn) == 0
+
+    heartbeat = jobs.LeaseHeartbeat(db_path, "w1")
+    heartbeat.job_ids = (job_id,)
+    beat_conn = init_db(db_path)
+    heartbeat.beat(beat_conn)
+    assert claim(conn, "w2") is None
+    assert jobs.count_live_workers(conn) == 1
+    row = conn.execute("SELECT current_job_id FROM workers WHERE worker_id = 'w1'").fetchone()
+    assert row[0] == job_id
+
+    jobs.unregister_worker(conn, "w1")
+    assert jobs.count_live_workers(conn) == 0
+
+
+def test_claim_batch_groups_by_model_run_and_hour(tmp_path):
+    import pytest
+
+    import jobs
+
+    conn = init_db(str(tmp_path / "jobs.db"))
+    base = {"model_id": "hrrr", "run_id": "run_20240101_00"}
+    h1 = [enqueue(conn, "build_tile_hour", {**base, "forecast_hour": 1, "variable_id": v}) for v in ("t2m", "apcp", "snod")]
+    h2 = enqueue(conn, "build_tile_hour", {**base, "forecast_hour": 2, "variable_id": "t2m"})
+    other = enqueue(conn, "build_tile_hour", {**base, "model_id": "gfs", "forecast_hour": 1, "variable_id": "t2m"})
+
+    batch = jobs.claim_batch(conn, "w1", 2)
+    assert [job["id"] for job in batch] == h1[:2]
+    assert all(job["status"] == "processing" and job["lease_expires_at"] for job in batch)
+    assert [job["id"] for job in jobs.claim_batch(conn, "w1", 10)] == [h1[2]]
+    assert [job["id"] for job in jobs.claim_batch(conn, "w1", 10, model_id="gfs")] == [other]
+    assert [job["id"] for job in jobs.claim_batch(conn, "w1", 10)] == [h2]
+    assert jobs.claim_batch(conn, "w1", 10) == []
+
+    assert jobs.complete_many(conn, h1[:2]) == 2
+    jobs.fail_many(conn, [h1[2], h2], "boom")
+    assert count_by_status(conn) == {"completed": 2, "failed": 2, "processing": 1}
+    with pytest.raises(ValueError):
+        jobs.claim_batch(conn, "w1", 10, group_by=("args_json",))
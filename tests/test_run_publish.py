@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import run_publish
+from jobs import init_db
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = init_db(str(tmp_path / "jobs.db"))
+    yield conn
+    conn.close()
+
+
+def _observe(conn, model_id, run_dt, stage, missing_after, available_after):
+    run_id = f"run_{run_dt:%Y%m%d}_{run_dt:%H}"
+    run_publish.record_probes(conn, stage, [(model_id, run_id, False)], run_dt + missing_after)
+    run_publish.record_probes(conn, stage, [(model_id, run_id, True)], run_dt + available_after)
+
+
+def test_predicted_delays_use_the_median_of_observed_publishes(conn):
+    start = datetime(2026, 3, 1, 12)
+    for day, minutes in enumerate((48, 50, 52, 90)):
+        run_dt = start + timedelta(days=day)
+        _observe(conn, "hrrr", run_dt, "first", timedelta(minutes=minutes - 1), timedelta(minutes=minutes + 1))
+    # Found without a prior miss (e.g. at startup): not an observation
+    run_publish.record_probes(conn, "first", [("hrrr", "run_20260306_12", True)], datetime(2026, 3, 6, 20))
+    # A miss after the run was seen does not move its publish time
+    run_publish.record_probes(conn, "first", [("hrrr", "run_20260301_12", False)], datetime(2026, 3, 9))
+
+    assert run_publish.predicted_delays(conn, "hrrr", 12) == {"first": pytest.approx(51 * 60)}
+    # Other synoptic hours fall back to the synoptic runs; hourly ones have no history
+    assert run_publish.predicted_delays(conn, "hrrr", 18) == {"first": pytest.approx(51 * 60)}
+    assert run_publish.predicted_delays(conn, "hrrr", 13) == {}
+
+    expected = run_publish.expected_publish(conn, "hrrr", "run_20260310_12")
+    assert expected == {"first": datetime(2026, 3, 10, 12, 51)}
+    assert run_publish.expected_publish(conn, "hrrr", "run_20260306_12") == {}  # already seen
+
+
+def test_scheduler_skips_runs_not_due_and_polls_densely_in_the_window(conn, monkeypatch):
+    import scripts.scheduler as sched_mod
+
+    monkeypatch.setattr(sched_mod, "MODELS_CONFIG", [{"id": "hrrr", "max_hours": 18}])
+    monkeypatch.setattr(sched_mod, "BUILD_INTERVAL_MINUTES", 15)
+    for day in range(3):
+        for hour in range(24):
+            run_dt = datetime(2026, 3, 1) + timedelta(days=day, hours=hour)
+            _observe(conn, "hrrr", run_dt, "first", timedelta(minutes=49), timedelta(minutes=51))
+
+    now = datetime(2026, 3, 5, 14, 30, tzinfo=timezone.utc)
+    runs = [("hrrr", "run_20260305_14", 18), ("hrrr", "run_20260305_13", 18), ("hrrr", "run_20260305_12", 18)]
+    # 14z is expected at 14:50, more than the 10 minute lead away
+    assert sched_mod.due_runs(conn, runs, now) == runs[1:]
+
+    # 13z is 40 minutes late: past its window, so sleep until 14z's opens at 14:40
+    run_publish.record_probes(conn, "first", [("hrrr", "run_20260305_12", True)], now)
+    run_publish.record_probes(conn, "last", [("hrrr", "run_20260305_12", True)], now)
+    assert sched_mod.next_poll_delay(conn, now) == pytest.approx(10 * 60)
+    # A run whose hours are still appearing keeps the polling dense
+    run_publish.record_probes(conn, "first", [("hrrr", "run_20260305_11", True)], now)
+    assert sched_mod.next_poll_delay(conn, now) == sched_mod.PUBLISH_POLL_SECONDS
+    run_publish.record_probes(conn, "last", [("hrrr", "run_20260305_11", True)], now)
+    assert sched_mod.next_poll_delay(conn, now + timedelta(minutes=12)) == sched_mod.PUBLISH_POLL_SECONDS
+    # Without history the scheduler keeps its fixed interval
+    monkeypatch.setattr(sched_mod, "MODELS_CONFIG", [{"id": "gfs", "max_hours": 18}])
+    assert sched_mod.next_poll_delay(conn, now) == 15 * 60
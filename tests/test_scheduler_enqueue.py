@@ -1,5 +1,7 @@
 """Tests for the scheduler's job enqueueing logic."""
 
+import datetime
+import json
 import sqlite3
 import sys
 import os
@@ -9,9 +11,13 @@ import pytest
 # Ensure project root is on path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import grib_fetcher
 from config import repomap
 from jobs import init_db, count_by_status, get_jobs
 
+# The hrrr_inventory fixture replaces resolve_remote; tests of the remote_meta cache need it back
+REAL_RESOLVE_REMOTE = grib_fetcher.resolve_remote
+
 
 @pytest.fixture
 def jobs_conn(tmp_path):
@@ -22,6 +28,24 @@ def jobs_conn(tmp_path):
     conn.close()
 
 
+@pytest.fixture(autouse=True)
+def hrrr_inventory(monkeypatch):
+    """Every hour resolves to the HRRR f01 parity idx (no network)."""
+    import grib_fetcher
+
+    fixtures = os.path.join(os.path.dirname(__file__), "fixtures", "grib_parity")
+    with open(os.path.join(fixtures, "hrrr_f01.idx")) as f:
+        inventory = grib_fetcher._parse_idx(f.read(), "wgrib2")
+
+    def resolve_remote(model_id, date_str, init_hour, forecast_hour, use_negative_cache=True):
+        run_dt = datetime.datetime.strptime(f"{date_str}{init_hour}", "%Y%m%d%H")
+        url = f"https://example.com/{model_id}.{date_str}/f{forecast_hour:02d}.grib2"
+        return grib_fetcher.RemoteGrib(model_id, run_dt, forecast_hour, url, url + ".idx", inventory)
+
+    monkeypatch.setattr(grib_fetcher, "resolve_remote", resolve_remote)
+    return inventory
+
+
 class TestEnqueueRunJobs:
     """Test enqueue_run_jobs from the scheduler."""
 
@@ -101,6 +125,226 @@ class TestEnqueueRunJobs:
         monkeypatch.delenv("TILE_BUILD_VARIABLES", raising=False)
         importlib.reload(sched_mod)
 
+    def test_enqueue_hour_granularity_emits_one_job_per_hour(self, jobs_conn, monkeypatch):
+        """With TILE_JOB_GRANULARITY=hour, each forecast hour carries all its variables."""
+        import json
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m,apcp")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "hour")
+        region_id = list(repomap["TILING_REGIONS"].keys())[0]
+        n = sched_mod.enqueue_run_jobs(jobs_conn, region_id, "hrrr", "run_20260215_12", max_hours=2)
+
+        jobs = get_jobs(jobs_conn, job_type="build_run_hour", limit=1000)
+        assert n == len(jobs) == 2
+        args = json.loads(jobs[0]["args_json"])
+        assert set(args["variables"]) == {"t2m", "apcp"}
+        assert "variable_id" not in args
+        assert set(args["messages"]) == {"t2m", "apcp"}
+        assert get_jobs(jobs_conn, job_type="build_tile_hour") == []
+
+    def test_enqueue_runs_resets_failed_follow_up_of_a_completed_hour(self, jobs_conn, monkeypatch, tmp_path):
+        """A worker's follow-up for an hour's failed variables comes back like any failed job."""
+        from jobs import claim, complete, enqueue, fail
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "meta.db"))
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m,apcp")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "hour")
+        monkeypatch.setattr(sched_mod, "REGIONS", ["ne"])
+        run = ("hrrr", "run_20260215_12", 1)
+        sched_mod.enqueue_runs(jobs_conn, [run])
+
+        full = claim(jobs_conn, "w1")
+        follow_up_args = {**json.loads(full["args_json"]), "variables": {"apcp": 3.0}}
+        follow_up_id = enqueue(jobs_conn, "build_run_hour", follow_up_args)
+        complete(jobs_conn, full["id"])
+        assert claim(jobs_conn, "w1")["id"] == follow_up_id
+        fail(jobs_conn, follow_up_id, "decode failed")  # no retries left
+
+        n, _ = sched_mod.enqueue_runs(jobs_conn, [run])
+        assert n == 1
+        statuses = {job["id"]: job["status"] for job in get_jobs(jobs_conn, job_type="build_run_hour")}
+        assert statuses == {full["id"]: "completed", follow_up_id: "pending"}
+
+
+    def test_enqueue_runs_bounds_planning_threads_and_handles_empty_schedules(self, jobs_conn, monkeypatch, tmp_path):
+        """Planning threads are capped by PROBE_POOL_SIZE; a run with no scheduled hours is a no-op."""
+        import threading
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "meta.db"))
+        monkeypatch.setitem(repomap, "PROBE_POOL_SIZE", 2)
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "variable")
+        planners = set()
+        real_plan_run = sched_mod.plan_run
+
+        def plan_run(*args):
+            planners.add(threading.current_thread().name)
+            return real_plan_run(*args)
+
+        monkeypatch.setattr(sched_mod, "plan_run", plan_run)
+        runs = [("hrrr", f"run_20260215_{hour:02d}", 1) for hour in range(6)]
+        n, targets = sched_mod.enqueue_runs(jobs_conn, runs + [("hrrr", "run_20260215_06", 0)])
+        assert len(planners) <= 2
+        assert n == 6 * len(sched_mod.REGIONS) and len(targets) == 7
+
+
+    def test_enqueue_only_messages_in_the_idx(self, jobs_conn, monkeypatch, hrrr_inventory):
+        """Variables missing from an hour's idx and unpublished hours get no jobs."""
+        import json
+        import grib_fetcher
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m,asnow")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "variable")
+        resolve = grib_fetcher.resolve_remote
+        no_asnow = hrrr_inventory[~hrrr_inventory.search_this.str.contains(":ASNOW:")]
+
+        def resolve_remote(model_id, date_str, init_hour, forecast_hour, use_negative_cache=True):
+            if forecast_hour == 2:
+                return None
+            remote = resolve(model_id, date_str, init_hour, forecast_hour)
+            if forecast_hour == 3:
+                remote._inventory = no_asnow
+            return remote
+
+        monkeypatch.setattr(grib_fetcher, "resolve_remote", resolve_remote)
+        region_id = list(repomap["TILING_REGIONS"].keys())[0]
+        sched_mod.enqueue_run_jobs(jobs_conn, region_id, "hrrr", "run_20260215_12", max_hours=4)
+
+        jobs = [json.loads(j["args_json"]) for j in get_jobs(jobs_conn, job_type="build_tile_hour", limit=1000)]
+        assert sorted((a["variable_id"], a["forecast_hour"]) for a in jobs) == [
+            ("asnow", 1), ("asnow", 4), ("t2m", 1), ("t2m", 3), ("t2m", 4),
+        ]
+        t2m = next(a for a in jobs if a["variable_id"] == "t2m" and a["forecast_hour"] == 3)
+        row = hrrr_inventory[hrrr_inventory.search_this.str.contains(":TMP:2 m above ground")].iloc[0]
+        assert t2m["grib_url"] == "https://example.com/hrrr.20260215/f03.grib2"
+        assert t2m["messages"] == {"t2m": [[[int(row.start_byte), int(row.end_byte)]]]}
+        # The skipped pair is remembered so the run can still count as built
+        import run_publish
+        assert run_publish.idx_gaps(jobs_conn, "hrrr", "run_20260215_12") == {"asnow": 1 << 3}
+
+
+
+    def test_probe_and_enqueue_runs(self, jobs_conn, monkeypatch, tmp_path):
+        """Only runs whose first hour is published are planned and enqueued."""
+        import grib_fetcher
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "meta.db"))
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "variable")
+        resolve = grib_fetcher.resolve_remote
+        monkeypatch.setattr(
+            grib_fetcher, "resolve_remote",
+            lambda m, d, h, f, use_negative_cache=True: None if h == "13" else resolve(m, d, h, f),
+        )
+
+        runs = [("hrrr", "run_20260215_12", 2), ("hrrr", "run_20260215_13", 2), ("gfs", "run_20260215_12", 6)]
+        available = sched_mod.probe_runs(runs)
+        assert available == [runs[0], runs[2]]
+
+        n, targets = sched_mod.enqueue_runs(jobs_conn, available)
+        assert targets == ["hrrr/run_20260215_12", "gfs/run_20260215_12"]
+        assert n == len(get_jobs(jobs_conn, job_type="build_tile_hour", limit=1000)) > 0
+
+
+    def test_probe_runs_sees_a_run_published_after_a_cached_miss(self, jobs_conn, monkeypatch, tmp_path, hrrr_inventory):
+        """A miss cached in remote_meta does not hide a run from the next probe."""
+        from unittest.mock import MagicMock
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "meta.db"))
+        monkeypatch.setattr(grib_fetcher, "resolve_remote", REAL_RESOLVE_REMOTE)
+        herbie = MagicMock(grib=None, idx=None)
+        herbie.inventory.return_value = hrrr_inventory
+        monkeypatch.setattr(grib_fetcher, "_build_herbie", lambda *args: herbie)
+
+        run = ("hrrr", "run_20260215_12", 2)
+        assert sched_mod.probe_runs([run]) == []
+        # Workers still get the cached miss
+        assert grib_fetcher.check_availability("hrrr", "20260215", "12", 1) is False
+
+        herbie.grib, herbie.idx = "https://example.com/f01.grib2", "https://example.com/f01.grib2.idx"
+        assert sched_mod.probe_runs([run]) == [run]
+
+
+    def test_enqueue_advances_published_through_watermark(self, jobs_conn, monkeypatch, tmp_path):
+        """Hours are enqueued as they appear and the run's watermark follows them."""
+        import json
+        import grib_fetcher
+        import run_publish
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "meta.db"))
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "variable")
+        monkeypatch.setattr(sched_mod, "PROBE_AHEAD_HOURS", 2)
+        resolve = grib_fetcher.resolve_remote
+        published = {"through": 3}
+        probed = []
+
+        def resolve_remote(model_id, date_str, init_hour, forecast_hour, use_negative_cache=True):
+            probed.append(forecast_hour)
+            if forecast_hour > published["through"]:
+                return None
+            return resolve(model_id, date_str, init_hour, forecast_hour)
+
+        monkeypatch.setattr(grib_fetcher, "resolve_remote", resolve_remote)
+        run = ("hrrr", "run_20260215_12", 8)
+
+        def enqueued_hours():
+            jobs = get_jobs(jobs_conn, job_type="build_tile_hour", limit=1000)
+            return sorted(json.loads(j["args_json"])["forecast_hour"] for j in jobs)
+
+        sched_mod.enqueue_runs(jobs_conn, [run])
+        assert enqueued_hours() == [1, 2, 3]
+        assert sorted(probed) == [1, 2, 3, 4]  # stopped after the batch holding f04
+        assert run_publish.published_through(jobs_conn, "hrrr", "run_20260215_12") == 3
+
+        published["through"] = 8
+        probed.clear()
+        sched_mod.enqueue_runs(jobs_conn, [run])
+        assert enqueued_hours() == list(range(1, 9))
+        assert sorted(probed) == list(range(1, 9))  # f01-f03 come from remote_meta outside this test
+        assert run_publish.published_through(jobs_conn, "hrrr", "run_20260215_12") == 8
+        assert run_publish.published_stages(jobs_conn, "hrrr", "run_20260215_12") == {"last"}
+
+
+    def test_watermark_follows_an_hour_published_after_a_cached_miss(self, jobs_conn, monkeypatch, tmp_path, hrrr_inventory):
+        """Hours beyond the watermark are re-probed each cycle despite the negative cache."""
+        from unittest.mock import MagicMock
+        import run_publish
+        import scripts.scheduler as sched_mod
+
+        monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "meta.db"))
+        monkeypatch.setattr(sched_mod, "BUILD_VARIABLES_ENV", "t2m")
+        monkeypatch.setattr(sched_mod, "JOB_GRANULARITY", "variable")
+        monkeypatch.setattr(sched_mod, "PROBE_AHEAD_HOURS", 2)
+        monkeypatch.setattr(grib_fetcher, "resolve_remote", REAL_RESOLVE_REMOTE)
+        published = {"through": 2}
+
+        def build_herbie(model_id, date_str, init_hour, forecast_hour):
+            if forecast_hour > published["through"]:
+                return MagicMock(grib=None, idx=None)
+            url = f"https://example.com/f{forecast_hour:02d}.grib2"
+            herbie = MagicMock(grib=url, idx=url + ".idx")
+            herbie.inventory.return_value = hrrr_inventory
+            return herbie
+
+        monkeypatch.setattr(grib_fetcher, "_build_herbie", build_herbie)
+        run = ("hrrr", "run_20260215_12", 4)
+        sched_mod.enqueue_runs(jobs_conn, [run])
+        assert run_publish.published_through(jobs_conn, "hrrr", "run_20260215_12") == 2
+
+        # f03 appears before REMOTE_META_NEGATIVE_TTL_S has expired its cached miss
+        published["through"] = 3
+        sched_mod.enqueue_runs(jobs_conn, [run])
+        assert run_publish.published_through(jobs_conn, "hrrr", "run_20260215_12") == 3
+        hours = [json.loads(j["args_json"])["forecast_hour"] for j in get_jobs(jobs_conn, job_type="build_tile_hour")]
+        assert sorted(hours) == [1, 2, 3]
 
 
 class TestGetJobQueueStatus:
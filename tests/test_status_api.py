@@ -4,7 +4,10 @@ from app import app as flask_app
 
 
 @pytest.fixture
-def client():
+def client(tmp_path, monkeypatch):
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
     flask_app.config['TESTING'] = True
     with flask_app.test_client() as client:
         yield client
@@ -69,16 +69,24 @@ def mock_fs(tmp_path):
     return tmp_path
 
 @patch("status_utils.repomap")
-def test_get_disk_usage(mock_repomap, mock_fs):
+def test_get_disk_usage(mock_repomap, mock_fs, monkeypatch):
+    import grib_cache
+    from config import repomap
+
     data = {
         "TILES_DIR": str(mock_fs / "tiles"),
         "HERBIE_SAVE_DIR": str(mock_fs / "gribs"),
+        "DB_PATH": str(mock_fs / "jobs.db"),
         "MODELS": {
             "hrrr": {}, "gfs": {}
         }
     }
     mock_repomap.get.side_effect = lambda k, *args: data.get(k, args[0] if args else None)
     mock_repomap.__getitem__.side_effect = lambda k: data[k]
+    # GRIB usage comes from the cache index, not a directory walk
+    monkeypatch.setitem(repomap, "HERBIE_SAVE_DIR", data["HERBIE_SAVE_DIR"])
+    monkeypatch.setitem(repomap, "DB_PATH", data["DB_PATH"])
+    assert grib_cache.adopt_untracked() == 1
 
     usage = get_disk_usage()
 
@@ -109,3 +109,82 @@ def test_delete_region_tiles(tmp_path):
 
     finally:
         conn.close()
+
+
+def test_catalog_tracks_commits_from_other_connections(tmp_path):
+    from tile_db import TileCatalog
+
+    db_path = str(tmp_path / "catalog.db")
+    conn = init_db(db_path)
+    catalog = TileCatalog(db_path)
+    try:
+        assert catalog.runs("ne", 0.1, "hrrr") == []
+        reloads = catalog.reloads
+
+        record_tile_run(conn, "ne", 0.1, "hrrr", "run_20240101_00", None, {"lat_min": 33.0})
+        record_tile_run(conn, "ne", 0.1, "hrrr", "run_20240101_01", None)
+        record_tile_variable(
+            conn, "ne", 0.1, "hrrr", "run_20240101_01", "t2m", "p.npz", "p.meta.json", [1, 2, 3], 10
+        )
+        conn.commit()
+
+        assert catalog.runs("ne", 0.1, "hrrr") == ["run_20240101_01", "run_20240101_00"]
+        assert catalog.latest_run("ne", 0.1, "hrrr") == "run_20240101_01"
+        assert catalog.models("ne", 0.1) == {"hrrr": ["run_20240101_01", "run_20240101_00"]}
+        assert catalog.hours("ne", 0.1, "hrrr", "run_20240101_01", "t2m") == [1, 2, 3]
+        assert catalog.run("ne", 0.1, "hrrr", "run_20240101_00")["lat_min"] == 33.0
+        assert catalog.reloads == reloads + 1
+
+        # Job-queue writes change data_version but not the catalog generation
+        enqueue(conn, "build_tile_hour", {"model_id": "hrrr"})
+        assert catalog.latest_run("ne", 0.1, "hrrr") == "run_20240101_01"
+        assert catalog.reloads == reloads + 1
+
+        delete_tile_run(conn, "ne", 0.1, "hrrr", "run_20240101_01")
+        conn.commit()
+        assert catalog.runs("ne", 0.1, "hrrr") == ["run_20240101_00"]
+        assert catalog.hours("ne", 0.1, "hrrr", "run_20240101_01", "t2m") == []
+    finally:
+        catalog.close()
+        conn.close()
+
+
+def test_expire_tile_runs_queues_files_for_deletion(tmp_path):
+    from tile_db import drain_tile_deletions, expire_tile_runs
+
+    conn = init_db(str(tmp_path / "retention.db"))
+    tiles_dir = tmp_path / "tiles"
+    try:
+        # 00z/06z/12z synoptic and 01z/02z hourly, v1 dirs plus a v2 rctile each
+        runs = ["run_20240101_00", "run_20240101_01", "run_20240101_02", "run_20240101_06", "run_20240101_12"]
+        for run_id in runs:
+            run_dir = tiles_dir / "ne" / "0.030deg" / "hrrr" / run_id
+            run_dir.mkdir(parents=True)
+            (run_dir / "t2m.npz").write_bytes(b"x")
+            rctile = tiles_dir / "ne" / "0.030deg" / "hrrr" / "t2m" / f"{run_id}.rctile"
+            rctile.parent.mkdir(parents=True, exist_ok=True)
+            rctile.write_bytes(b"x")
+            # Written without init time or synoptic flag, as the Rust worker does
+            conn.execute(
+                "INSERT INTO tile_runs (region_id, resolution_deg, model_id, run_id) VALUES ('ne', 0.03, 'hrrr', ?)",
+                (run_id,),
+            )
+            record_tile_variable(conn, "ne", 0.03, "hrrr", run_id, "t2m", str(rctile), "", [1], 1)
+        record_tile_run(conn, "ne", 0.03, "gfs", "run_20240101_00", "2024-01-01T00:00:00Z")
+        conn.commit()
+
+        expired = expire_tile_runs(conn, "hrrr", 2, 1, str(tiles_dir))
+        assert sorted(run_id for _, _, run_id in expired) == ["run_20240101_00", "run_20240101_01"]
+        assert list_tile_runs_db(conn, "ne", 0.03, "hrrr") == ["run_20240101_12", "run_20240101_06", "run_20240101_02"]
+        assert list_tile_runs_db(conn, "ne", 0.03, "gfs") == ["run_20240101_00"]
+        # Catalog rows are gone at once; files wait for the drain
+        assert (tiles_dir / "ne/0.030deg/hrrr/run_20240101_00").is_dir()
+
+        assert drain_tile_deletions(conn, batch_size=1) == 4
+        assert not (tiles_dir / "ne/0.030deg/hrrr/run_20240101_00").exists()
+        assert not (tiles_dir / "ne/0.030deg/hrrr/t2m/run_20240101_01.rctile").exists()
+        assert (tiles_dir / "ne/0.030deg/hrrr/t2m/run_20240101_02.rctile").exists()
+        assert conn.execute("SELECT COUNT(*) FROM tile_deletions").fetchone()[0] == 0
+        assert expire_tile_runs(conn, "hrrr", 2, 1, str(tiles_dir)) == []
+    finally:
+        conn.close()
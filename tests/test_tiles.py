@@ -0,0 +1,207 @@
+import os
+
+import numpy as np
+import xarray as xr
+
+import tiles
+from tiles import _prep_cell_index, _reduce_stats, build_tiles_for_variable
+
+
+def _make_dataset(values, lats, lons):
+    return xr.Dataset(
+        {"t2m": (["latitude", "longitude"], values)},
+        coords={"latitude": lats, "longitude": lons},
+    )
+
+
+def _reference_stats(ds, lat_min, lat_max, lon_min, lon_max, res):
+    da = ds["t2m"]
+    lat2d, lon2d = np.meshgrid(np.array(da.latitude), np.array(da.longitude), indexing="ij")
+    order, starts, unique_ids, valid, n_cells, ny, nx = _prep_cell_index(
+        lat2d, lon2d, lat_min, lat_max, lon_min, lon_max, res
+    )
+    return _reduce_stats(np.array(da.values), valid, order, starts, unique_ids, n_cells, ny, nx)
+
+
+def test_cell_mapping_matches_reference_and_persists(tmp_path, monkeypatch):
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "CELL_MAP_DIR", str(tmp_path / "cell_maps"))
+    monkeypatch.setattr(tiles, "_cell_maps", {})
+
+    rng = np.random.default_rng(0)
+    lats = np.linspace(-1.0, 3.0, 41)
+    lons = np.linspace(-2.0, 2.0, 33)
+    ds = _make_dataset(rng.random((lats.size, lons.size)), lats, lons)
+    bounds = (0.0, 1.0, -1.0, 1.0)
+
+    mins, maxs, means, hours, _ = build_tiles_for_variable({1: ds}, {}, *bounds, 0.25)
+    ref_min, ref_max, ref_mean = _reference_stats(ds, *bounds, 0.25)
+
+    assert hours == [1]
+    np.testing.assert_array_equal(mins[0], ref_min)
+    np.testing.assert_array_equal(maxs[0], ref_max)
+    np.testing.assert_array_equal(means[0], ref_mean)
+
+    # Mapping is written once to disk and restricted to the in-region subarray
+    (map_dir,) = list((tmp_path / "cell_maps").iterdir())
+    mapping = next(iter(tiles._cell_maps.values()))
+    assert (mapping["y1"] - mapping["y0"]) < lats.size
+    assert (mapping["x1"] - mapping["x0"]) < lons.size
+    assert mapping["gather"].dtype == np.int32
+
+    # A fresh process reloads the memory-mapped arrays instead of rebuilding
+    def fail_rebuild(*args, **kwargs):
+        raise AssertionError("mapping was rebuilt instead of loaded from disk")
+
+    monkeypatch.setattr(tiles, "_cell_maps", {})
+    monkeypatch.setattr(tiles, "_build_cell_mapping", fail_rebuild)
+    ds2 = _make_dataset(rng.random((lats.size, lons.size)), lats, lons)
+    _, _, means2, _, _ = build_tiles_for_variable({2: ds2}, {}, *bounds, 0.25)
+    np.testing.assert_array_equal(means2[0], _reference_stats(ds2, *bounds, 0.25)[2])
+    assert isinstance(next(iter(tiles._cell_maps.values()))["gather"], np.memmap)
+    assert map_dir.name in tiles._cell_maps
+
+
+def test_rctile_v2_roundtrip_point_query(tmp_path):
+    rng = np.random.default_rng(1)
+    run_a = rng.random((3, 4, 5)).astype(np.float32)
+    run_b = rng.random((2, 4, 5)).astype(np.float32)
+    # One cell that is zero everywhere gets elided from the data region
+    run_a[:, 0, 0] = 0.0
+    run_b[:, 0, 0] = 0.0
+    runs = [
+        {"run_id": "run_20240101_00", "init_unix": 1704067200, "hours": [1, 2, 3], "values": run_a},
+        {"run_id": "run_20240101_06", "init_unix": 1704088800, "hours": [1, 2], "values": run_b},
+    ]
+    path = tmp_path / "t2m" / "runs.rctile"
+    tiles.write_rctile_v2(str(path), runs, 40.0, 41.0, -75.0, -73.75, 0.25)
+
+    data = path.read_bytes()
+    assert data[:4] == b"RCT2"
+    header = tiles._read_rctile_header(data)
+    assert (header["ny"], header["nx"], header["total_values"]) == (4, 5, 5)
+    offsets = np.frombuffer(data, dtype="<u8", count=21, offset=header["index_offset"])
+    assert offsets[0] == offsets[1]
+
+    result = tiles.query_point_rctile_v2(str(path), 40.6, -74.4)  # iy=2, ix=2
+    assert [r["run_id"] for r in result] == ["run_20240101_00", "run_20240101_06"]
+    assert result[1]["init_unix"] == 1704088800
+    np.testing.assert_array_equal(result[0]["hours"], [1, 2, 3])
+    np.testing.assert_array_equal(result[0]["values"], run_a[:, 2, 2])
+    np.testing.assert_array_equal(result[1]["values"], run_b[:, 2, 2])
+
+    elided = tiles.query_point_rctile_v2(str(path), 40.0, -75.0)
+    np.testing.assert_array_equal(elided[0]["values"], np.zeros(3, dtype=np.float32))
+
+
+def test_load_timeseries_prefers_rctile(tmp_path):
+    means = np.arange(2 * 3 * 4, dtype=np.float32).reshape(2, 3, 4) * 0.001
+    meta = {"lat_min": 40.0, "lat_max": 40.3, "lon_min": -75.0, "lon_max": -74.6,
+            "init_time_utc": "2024-01-01T12:00:00Z"}
+    path = tiles.save_tiles_rctile(str(tmp_path), "ne", 0.1, "hrrr", "run_20240101_12", "apcp", means, [1, 2], meta)
+    assert path.endswith("ne/0.100deg/hrrr/apcp/run_20240101_12.rctile")
+
+    hours, values = tiles.load_timeseries_for_point(
+        str(tmp_path), "ne", 0.1, "hrrr", "run_20240101_12", "apcp", 40.05, -74.75
+    )
+    np.testing.assert_array_equal(hours, [1, 2])
+    # Sub-threshold precip is snapped to zero, larger values pass through
+    np.testing.assert_allclose(values, [0.0, means[1, 0, 2]])
+
+
+def test_load_timeseries_reads_min_max_from_npz_beside_rctile(tmp_path, monkeypatch):
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
+    means = np.full((2, 3, 4), 5.0, dtype=np.float32)
+    meta = {"lat_min": 40.0, "lat_max": 40.3, "lon_min": -75.0, "lon_max": -74.6, "resolution_deg": 0.1}
+    # An unconfigured region stores all three stats
+    args = (str(tmp_path), "test", 0.1, "hrrr", "run_20240101_12", "t2m")
+    tiles.upsert_tiles_npz(*args, means - 1, means + 1, means, [1, 2], meta)
+    tiles.save_tiles_rctile(*args, means, [1, 2], {**meta, "init_time_utc": "2024-01-01T12:00:00Z"})
+
+    for stat, expected in (("mean", 5.0), ("min", 4.0), ("max", 6.0)):
+        _, values = tiles.load_timeseries_for_point(*args, 40.05, -74.95, stat=stat)
+        np.testing.assert_array_equal(values, [expected, expected])
+
+
+def test_point_reads_hit_decoded_tile_cache(tmp_path, monkeypatch):
+    from config import repomap
+
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(tiles, "_tile_cache", tiles.TileArrayCache(1024 * 1024))
+    means = np.arange(2 * 3 * 4, dtype=np.float32).reshape(2, 3, 4)
+    meta = {"lat_min": 40.0, "lat_max": 40.3, "lon_min": -75.0, "lon_max": -74.6, "resolution_deg": 0.1}
+    args = (str(tmp_path), "ne", 0.1, "hrrr", "run_20240101_00", "t2m")
+    tiles.upsert_tiles_npz(*args, means, means, means, [1, 2], meta)
+
+    real_load = np.load
+    loads = []
+    monkeypatch.setattr(tiles.np, "load", lambda *a, **k: loads.append(a[0]) or real_load(*a, **k))
+
+    _, first = tiles.load_timeseries_for_point(*args, 40.05, -74.95)
+    _, second = tiles.load_timeseries_for_point(*args, 40.25, -74.65)
+    np.testing.assert_array_equal(first, means[:, 0, 0])
+    np.testing.assert_array_equal(second, means[:, 2, 3])
+    assert len(loads) == 1
+    stats = tiles.tile_cache_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 2
+
+    # Rewriting the tile invalidates by (mtime, size) and replaces the stale entry
+    tiles.upsert_tiles_npz(*args, means[:1] + 100, means[:1] + 100, means[:1] + 100, [3], meta)
+    hours, third = tiles.load_timeseries_for_point(*args, 40.05, -74.95)
+    np.testing.assert_array_equal(hours, [1, 2, 3])
+    assert third[-1] == 100.0
+    assert tiles.tile_cache_stats()["entries"] == 2
+
+
+def test_tile_cache_keeps_other_stats_of_the_same_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiles, "_tile_cache", tiles.TileArrayCache(1024 * 1024))
+    means = np.zeros((1, 2, 2), dtype=np.float32)
+    args = (str(tmp_path), "test", 0.1, "hrrr", "run_20240101_00", "t2m")
+    npz_path, _ = tiles.upsert_tiles_npz(*args, means - 1, means + 1, means, [1], {"resolution_deg": 0.1})
+
+    for stat in ("mean", "min", "max"):
+        tiles._cached_stat_array(npz_path, stat)
+    for stat in ("mean", "min", "max"):
+        tiles._cached_stat_array(npz_path, stat)
+    stats = tiles.tile_cache_stats()
+    assert stats["entries"] == 3
+    assert stats["misses"] == 3 and stats["hits"] == 3
+
+
+def test_tile_cache_evicts_least_recently_used_by_bytes():
+    cache = tiles.TileArrayCache(100)
+    cache.put(("npz", "a", 1, 1), "a", 60)
+    cache.put(("npz", "b", 1, 1), "b", 30)
+    assert cache.get(("npz", "a", 1, 1)) == "a"
+    cache.put(("npz", "c", 1, 1), "c", 30)
+    assert cache.get(("npz", "b", 1, 1)) is None
+    assert cache.get(("npz", "a", 1, 1)) == "a"
+    assert cache.stats()["evictions"] == 1
+    cache.put(("npz", "d", 1, 1), "d", 500)
+    assert cache.get(("npz", "d", 1, 1)) is None
+
+
+def test_load_timeseries_uses_catalog_geometry_without_meta_json(tmp_path, monkeypatch):
+    from config import repomap
+    from tile_db import init_db, record_tile_run
+
+    db_path = str(tmp_path / "jobs.db")
+    monkeypatch.setitem(repomap, "DB_PATH", db_path)
+    means = np.arange(2 * 3 * 4, dtype=np.float32).reshape(2, 3, 4)
+    # ECMWF-style 0-360 indexing: the catalog must carry index_lon_min
+    meta = {"lat_min": 40.0, "lat_max": 40.3, "lon_min": -75.0, "lon_max": -74.6,
+            "resolution_deg": 0.1, "index_lon_min": 285.0, "lon_0_360": True}
+    args = (str(tmp_path), "ne", 0.1, "ecmwf_hres", "run_20240101_00", "t2m")
+    npz_path, _ = tiles.upsert_tiles_npz(*args, means, means, means, [3, 6], meta)
+    conn = init_db(db_path)
+    record_tile_run(conn, "ne", 0.1, "ecmwf_hres", "run_20240101_00", None, meta)
+    conn.commit()
+    conn.close()
+    os.remove(npz_path.replace(".npz", ".meta.json"))
+
+    hours, values = tiles.load_timeseries_for_point(*args, 40.15, -74.65)
+    np.testing.assert_array_equal(hours, [3, 6])
+    np.testing.assert_array_equal(values, means[:, 1, 3])
@@ -1,59 +1,66 @@
-import json
-import os
-import numpy as np
-
-from grib_fetcher import get_valid_forecast_hours
-
-
-def write_npz(path, hours):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    # minimal payload with hours only
-    np.savez_compressed(path, hours=np.array(hours, dtype=np.int32), means=np.zeros((len(hours), 1, 1), dtype=np.float32))
-    meta_path = path.with_suffix(".meta.json")
-    meta_path.write_text(
-        json.dumps(
-            {
-                "lat_min": 0.0,
-                "lat_max": 1.0,
-                "lon_min": 0.0,
-                "lon_max": 1.0,
-                "resolution_deg": 0.1,
-            }
+from config import get_tile_resolution, repomap
+from db import connect
+from tile_db import record_tile_run, record_tile_variable
+
+BOUNDS = {"lat_min": 0.0, "lat_max": 1.0, "lon_min": 0.0, "lon_max": 1.0}
+
+
+def record_run(conn, hours, variables, bounds=BOUNDS):
+    # Catalog rows only: tiles_exist must not need the NPZ files themselves
+    res = get_tile_resolution("ne", "hrrr")  # HRRR overrides the region default
+    record_tile_run(conn, "ne", res, "hrrr", "run_20260101_12", "2026-01-01T12:00:00Z", bounds)
+    for variable_id in variables:
+        record_tile_variable(
+            conn, "ne", res, "hrrr", "run_20260101_12", variable_id,
+            f"/missing/{variable_id}.npz", f"/missing/{variable_id}.meta.json", hours, None,
         )
-    )
+    conn.commit()
 
 
 def test_strict_tiles_exist_check(tmp_path, monkeypatch):
-    # Build a fake tiles directory with t2m.npz
-    npz_path = tmp_path / "ne/0.100deg/hrrr/run_20260101_12/t2m.npz"
-
-    # HRRR hourly schedule: first 4 hours
-    expected_hours = list(range(1, 5))
-    write_npz(npz_path, expected_hours)
-
-    # Verify exact match considered complete
-    from scripts.scheduler import tiles_exist
-    # monkeypatch the config to look at our tmp path
-    from config import repomap
-    monkeypatch.setitem(
-        repomap,
-        "TILING_REGIONS",
-        {
-            "ne": {
-                "default_resolution_deg": 0.1,
-                "lat_min": 0.0,
-                "lat_max": 1.0,
-                "lon_min": 0.0,
-                "lon_max": 1.0,
-            }
-        },
-    )
-    monkeypatch.setitem(repomap, "TILES_DIR", str(tmp_path))
-
-    ok = tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4)
-    assert ok is True
-
-    # Now write an incomplete hour set and expect failure
-    write_npz(npz_path, [1, 2, 4])
-    ok2 = tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4)
-    assert ok2 is False
+    from scripts.scheduler import _build_variable_ids, tiles_exist
+
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setitem(repomap, "TILES_DIR", str(tmp_path / "tiles"))
+    monkeypatch.setitem(repomap, "TILING_REGIONS", {"ne": {"default_resolution_deg": 0.1, **BOUNDS}})
+    conn = connect(repomap["DB_PATH"])
+    variables = _build_variable_ids("hrrr")
+
+    # HRRR hourly schedule: first 4 hours, for every variable
+    assert not tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4)
+    record_run(conn, [1, 2, 3, 4], variables)
+    assert tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4) is True
+
+    # One variable short of an hour: the whole run is incomplete
+    record_run(conn, [1, 2, 4], variables[:1])
+    assert tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4) is False
+
+    # Complete again, but built for other region bounds
+    record_run(conn, [1, 2, 3, 4], variables, {**BOUNDS, "lat_max": 2.0})
+    assert tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4) is False
+    conn.close()
+
+
+def test_tiles_exist_ignores_hours_missing_from_the_idx(tmp_path, monkeypatch):
+    import run_publish
+    from scripts.scheduler import _build_variable_ids, tiles_exist
+
+    monkeypatch.setitem(repomap, "DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setitem(repomap, "TILING_REGIONS", {"ne": {"default_resolution_deg": 0.1, **BOUNDS}})
+    conn = connect(repomap["DB_PATH"])
+    variables = _build_variable_ids("hrrr")
+    partial, never = variables[0], variables[1]
+
+    # partial is absent from f03's idx and never from every hour: neither gets jobs there
+    record_run(conn, [1, 2, 3, 4], variables[2:])
+    record_run(conn, [1, 2, 4], [partial])
+    assert tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4) is False
+
+    run_publish.record_idx_gaps(conn, "hrrr", "run_20260101_12", {partial: [3], never: [1, 2]})
+    run_publish.record_idx_gaps(conn, "hrrr", "run_20260101_12", {never: [3, 4]})
+    assert tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4) is True
+
+    # Gaps do not excuse hours that were offered and not built
+    record_run(conn, [1, 4], [partial])
+    assert tiles_exist("ne", "hrrr", "run_20260101_12", expected_max_hours=4) is False
+    conn.close()
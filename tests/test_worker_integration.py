@@ -13,6 +13,7 @@ def _setup(tmp_path, monkeypatch):
     db_path = str(tmp_path / "jobs.db")
     monkeypatch.setitem(repomap, "DB_PATH", db_path)
     monkeypatch.setitem(repomap, "TILES_DIR", str(tmp_path / "tiles"))
+    monkeypatch.setitem(repomap, "CELL_MAP_DIR", str(tmp_path / "cell_maps"))
     monkeypatch.setitem(
         repomap,
         "TILING_REGIONS",
@@ -143,3 +144,111 @@ def test_run_worker_exits_on_empty_queue(tmp_path, monkeypatch):
     # Empty queue — just ensure it returns
     run_worker(once=True)
     conn.close()
+
+
+def test_run_worker_claims_one_forecast_hour_per_batch(tmp_path, monkeypatch):
+    """Variables of one forecast hour are claimed together and completed in one transaction."""
+    import job_worker
+
+    conn, db_path = _setup(tmp_path, monkeypatch)
+    base_args = {"region_id": "ne", "model_id": "hrrr", "run_id": "run_20240101_00", "resolution_deg": 1.0}
+    hour1 = [enqueue(conn, "build_tile_hour", {**base_args, "variable_id": v, "forecast_hour": 1}) for v in ("t2m", "apcp")]
+    hour2 = enqueue(conn, "build_tile_hour", {**base_args, "variable_id": "t2m", "forecast_hour": 2})
+
+    claims = []
+    real_claim_batch = job_worker.claim_batch
+    monkeypatch.setattr(job_worker, "claim_batch", lambda *a, **k: claims.append(a) or real_claim_batch(*a, **k))
+    with patch("job_worker.process_build_tile_hour") as mock_process:
+        run_worker(max_jobs=2)
+
+    assert mock_process.call_count == 2 and len(claims) == 1
+    statuses = [conn.execute("SELECT status FROM jobs WHERE id = ?", (jid,)).fetchone()[0] for jid in hour1 + [hour2]]
+    assert statuses == ["completed", "completed", "pending"]
+    conn.close()
+
+
+def test_run_worker_builds_all_variables_of_a_run_hour(tmp_path, monkeypatch):
+    """A build_run_hour job fetches the hour once and accumulates every variable."""
+    import numpy as np
+    import xarray as xr
+
+    conn, db_path = _setup(tmp_path, monkeypatch)
+    job_id = enqueue(
+        conn,
+        "build_run_hour",
+        {
+            "region_id": "ne",
+            "model_id": "hrrr",
+            "run_id": "run_20240101_00",
+            "forecast_hour": 1,
+            "variables": {"t2m": 1.0, "apcp": 1.0},
+        },
+    )
+    lats = np.linspace(0.0, 1.0, 5)
+    lons = np.linspace(0.0, 1.0, 5)
+
+    def fake_hour(model_id, variable_ids, date_str, init_hour, forecast_hour, planned=None):
+        datasets = {
+            v: xr.Dataset({v: (["latitude", "longitude"], np.full((5, 5), 280.0))},
+                          coords={"latitude": lats, "longitude": lons})
+            for v in variable_ids
+        }
+        return datasets, {}
+
+    with patch("job_worker.open_hour_as_xarray", side_effect=fake_hour) as mock_fetch:
+        run_worker(once=True)
+
+    mock_fetch.assert_called_once()
+    row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    assert row["status"] == "completed"
+    tile_conn = init_tile_db(db_path)
+    variables = {r[0] for r in tile_conn.execute("SELECT variable_id FROM tile_variables")}
+    assert variables == {"t2m", "apcp"}
+    tile_conn.close()
+    conn.close()
+
+
+def test_run_worker_retries_only_failed_variables_of_a_run_hour(tmp_path, monkeypatch):
+    """One failing variable completes the hour for the rest and re-enqueues just itself."""
+    import json
+
+    import numpy as np
+    import xarray as xr
+
+    conn, db_path = _setup(tmp_path, monkeypatch)
+    job_id = enqueue(
+        conn,
+        "build_run_hour",
+        {
+            "region_id": "ne",
+            "model_id": "hrrr",
+            "run_id": "run_20240101_00",
+            "forecast_hour": 1,
+            "variables": {"t2m": 1.0, "apcp": 1.0},
+        },
+        priority=7,
+    )
+    lats = np.linspace(0.0, 1.0, 5)
+    lons = np.linspace(0.0, 1.0, 5)
+
+    def fake_hour(model_id, variable_ids, date_str, init_hour, forecast_hour, planned=None):
+        datasets = {
+            v: xr.Dataset({v: (["latitude", "longitude"], np.full((5, 5), 280.0))},
+                          coords={"latitude": lats, "longitude": lons})
+            for v in variable_ids if v != "apcp"
+        }
+        return datasets, {"apcp": "message missing"}
+
+    with patch("job_worker.open_hour_as_xarray", side_effect=fake_hour):
+        run_worker(once=True)
+
+    row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    assert row["status"] == "completed"
+    retry = conn.execute("SELECT args_json, status, priority FROM jobs WHERE id != ?", (job_id,)).fetchone()
+    assert retry["status"] == "pending" and retry["priority"] == 7
+    assert json.loads(retry["args_json"])["variables"] == {"apcp": 1.0}
+    tile_conn = init_tile_db(db_path)
+    variables = {r[0] for r in tile_conn.execute("SELECT variable_id FROM tile_variables")}
+    assert variables == {"t2m"}
+    tile_conn.close()
+    conn.close()
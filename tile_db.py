@@ -1,93 +1,30 @@
 from __future__ import annotations
 
 import json
+import logging
+import os
+import shutil
 import sqlite3
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
 from config import repomap
-from jobs import init_db as init_jobs_db
+from db import connect
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_DB_PATH = repomap.get("DB_PATH", "cache/jobs.db")
 
 
 def init_db(db_path: Optional[str] = None) -> sqlite3.Connection:
-    path = db_path or DEFAULT_DB_PATH
-    conn = init_jobs_db(path)
-    conn.execute("PRAGMA synchronous=NORMAL;")
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS tile_runs (
-            region_id TEXT NOT NULL,
-            resolution_deg REAL NOT NULL,
-            model_id TEXT NOT NULL,
-            run_id TEXT NOT NULL,
-            init_time_utc TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (region_id, resolution_deg, model_id, run_id)
-        )
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS tile_variables (
-            region_id TEXT NOT NULL,
-            resolution_deg REAL NOT NULL,
-            model_id TEXT NOT NULL,
-            run_id TEXT NOT NULL,
-            variable_id TEXT NOT NULL,
-            job_id INTEGER,
-            npz_path TEXT NOT NULL,
-            meta_path TEXT NOT NULL,
-            hours_json TEXT,
-            size_bytes INTEGER,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (region_id, resolution_deg, model_id, run_id, variable_id)
-        )
-        """
-    )
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS tile_hours (
-            region_id TEXT NOT NULL,
-            resolution_deg REAL NOT NULL,
-            model_id TEXT NOT NULL,
-            run_id TEXT NOT NULL,
-            variable_id TEXT NOT NULL,
-            forecast_hour INTEGER NOT NULL,
-            job_id INTEGER,
-            npz_path TEXT NOT NULL,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (
-                region_id, resolution_deg, model_id, run_id, variable_id, forecast_hour
-            )
-        )
-        """
-    )
-    _ensure_column(conn, "tile_variables", "job_id", "INTEGER")
-    conn.execute(
-        """
-        CREATE INDEX IF NOT EXISTS idx_tile_runs_model
-        ON tile_runs (region_id, resolution_deg, model_id, run_id)
-        """
-    )
-    conn.execute(
-        """
-        CREATE INDEX IF NOT EXISTS idx_tile_vars_run
-        ON tile_variables (region_id, resolution_deg, model_id, run_id, variable_id)
-        """
-    )
-    # Drop legacy unique indexes that conflict with v2 worker (job_id=0 for finalize)
-    conn.execute("DROP INDEX IF EXISTS idx_tile_vars_job_id")
-    conn.execute("DROP INDEX IF EXISTS idx_tile_hours_job_id")
-    return conn
+    """Open a new connection (caller closes it). Schema is managed by db.migrate()."""
+    return connect(db_path or DEFAULT_DB_PATH)
 
 
-def _ensure_column(conn: sqlite3.Connection, table: str, column: str, col_def: str) -> None:
-    try:
-        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_def}")
-    except sqlite3.OperationalError as exc:
-        if "duplicate column name" not in str(exc):
-            raise
+def hours_mask(hours: List[int]) -> bytes:
+    """Bitmap of forecast hours (bit h set for hour h) as little-endian bytes."""
+    mask = sum(1 << int(h) for h in set(hours))
+    return mask.to_bytes((mask.bit_length() + 7) // 8, "little")
 
 
 def record_tile_run(    conn: sqlite3.Connection,
@@ -96,15 +33,42 @@ def record_tile_run(    conn: sqlite3.Connection,
     model_id: str,
     run_id: str,
     init_time_utc: Optional[str],
+    bounds: Optional[Dict[str, Any]] = None,
 ) -> None:
+    """Upsert a tile run. ``bounds`` takes the tile meta keys (lat_min, lat_max,
+    lon_min, lon_max, index_lon_min, lon_0_360); missing keys keep stored values."""
+    bounds = bounds or {}
+    lon_0_360 = bounds.get("lon_0_360")
     conn.execute(
         """
-        INSERT INTO tile_runs (region_id, resolution_deg, model_id, run_id, init_time_utc)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO tile_runs (
+            region_id, resolution_deg, model_id, run_id, init_time_utc,
+            lat_min, lat_max, lon_min, lon_max, index_lon_min, lon_0_360
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ON CONFLICT(region_id, resolution_deg, model_id, run_id)
-        DO UPDATE SET init_time_utc=excluded.init_time_utc
+        DO UPDATE SET
+            init_time_utc=excluded.init_time_utc,
+            lat_min=COALESCE(excluded.lat_min, tile_runs.lat_min),
+            lat_max=COALESCE(excluded.lat_max, tile_runs.lat_max),
+            lon_min=COALESCE(excluded.lon_min, tile_runs.lon_min),
+            lon_max=COALESCE(excluded.lon_max, tile_runs.lon_max),
+            index_lon_min=COALESCE(excluded.index_lon_min, tile_runs.index_lon_min),
+            lon_0_360=COALESCE(excluded.lon_0_360, tile_runs.lon_0_360)
         """,
-        (region_id, resolution_deg, model_id, run_id, init_time_utc),
+        (
+            region_id,
+            resolution_deg,
+            model_id,
+            run_id,
+            init_time_utc,
+            bounds.get("lat_min"),
+            bounds.get("lat_max"),
+            bounds.get("lon_min"),
+            bounds.get("lon_max"),
+            bounds.get("index_lon_min"),
+            None if lon_0_360 is None else int(bool(lon_0_360)),
+        ),
     )
 
 
@@ -124,15 +88,16 @@ def record_tile_variable(    conn: sqlite3.Connection,
         """
         INSERT INTO tile_variables (
             region_id, resolution_deg, model_id, run_id, variable_id,
-            job_id, npz_path, meta_path, hours_json, size_bytes, updated_at
+            job_id, npz_path, meta_path, hours_json, hours_mask, size_bytes, updated_at
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
         ON CONFLICT(region_id, resolution_deg, model_id, run_id, variable_id)
         DO UPDATE SET
             job_id=excluded.job_id,
             npz_path=excluded.npz_path,
             meta_path=excluded.meta_path,
             hours_json=excluded.hours_json,
+            hours_mask=excluded.hours_mask,
             size_bytes=excluded.size_bytes,
             updated_at=CURRENT_TIMESTAMP
         """,
@@ -146,6 +111,7 @@ def record_tile_variable(    conn: sqlite3.Connection,
             npz_path,
             meta_path,
             json.dumps(hours),
+            hours_mask(hours),
             size_bytes,
         ),
     )
@@ -187,6 +153,37 @@ def record_tile_hour(    conn: sqlite3.Connection,
     )
 
 
+def run_hour_masks(    conn: sqlite3.Connection,
+    region_id: str,
+    resolution_deg: float,
+    model_id: str,
+    run_id: str,
+) -> Optional[Tuple[Dict[str, Any], Dict[str, int]]]:
+    """(tile_runs row, {variable_id: hours bitmap as int}) for a run, or None if
+    the run is not in the catalog. Reads only the catalog tables."""
+    run_row = conn.execute(
+        """
+        SELECT * FROM tile_runs
+        WHERE region_id=? AND resolution_deg=? AND model_id=? AND run_id=?
+        """,
+        (region_id, resolution_deg, model_id, run_id),
+    ).fetchone()
+    if run_row is None:
+        return None
+    masks: Dict[str, int] = {}
+    for variable_id, mask, hours_json in conn.execute(
+        """
+        SELECT variable_id, hours_mask, hours_json FROM tile_variables
+        WHERE region_id=? AND resolution_deg=? AND model_id=? AND run_id=?
+        """,
+        (region_id, resolution_deg, model_id, run_id),
+    ):
+        if mask is None:  # written by a worker that predates the column
+            mask = hours_mask(json.loads(hours_json or "[]"))
+        masks[variable_id] = int.from_bytes(mask, "little")
+    return {key: run_row[key] for key in run_row.keys()}, masks
+
+
 def delete_tile_run(    conn: sqlite3.Connection,
     region_id: str,
     resolution_deg: float,
@@ -244,6 +241,106 @@ def delete_region_tiles(    conn: sqlite3.Connection,
     )
 
 
+def expire_tile_runs(    conn: sqlite3.Connection,
+    model_id: str,
+    max_synoptic: int,
+    max_hourly: int,
+    tiles_dir: str,
+) -> List[Tuple[str, float, str]]:
+    """Expire a model's runs beyond the newest max_synoptic synoptic and max_hourly
+    hourly runs of each region and resolution.
+
+    Catalog rows are deleted and the runs' files (v1 run directory, every
+    recorded variable file) queued in tile_deletions, in one transaction;
+    drain_tile_deletions() removes the files. Returns the expired
+    (region_id, resolution_deg, run_id).
+    """
+    expired = [
+        (row[0], row[1], row[2])
+        for row in conn.execute(
+            """
+            SELECT region_id, resolution_deg, run_id FROM (
+                SELECT region_id, resolution_deg, run_id, is_synoptic,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY region_id, resolution_deg, is_synoptic
+                           ORDER BY init_time_utc DESC, run_id DESC
+                       ) AS newer
+                FROM tile_runs
+                WHERE model_id = ?
+            )
+            WHERE newer > CASE is_synoptic WHEN 1 THEN ? ELSE ? END
+            """,
+            (model_id, max_synoptic, max_hourly),
+        )
+    ]
+    if not expired:
+        return []
+
+    queued_at = conn.execute("SELECT strftime('%Y-%m-%dT%H:%M:%SZ', 'now')").fetchone()[0]
+    paths = []
+    keys = [(region_id, res, model_id, run_id) for region_id, res, run_id in expired]
+    for region_id, res, _, run_id in keys:
+        res_dir = f"{res:.3f}deg".rstrip("0").rstrip(".")
+        paths.append(os.path.join(tiles_dir, region_id, res_dir, model_id, run_id))
+        for npz_path, meta_path in conn.execute(
+            """
+            SELECT npz_path, meta_path FROM tile_variables
+            WHERE region_id=? AND resolution_deg=? AND model_id=? AND run_id=?
+            """,
+            (region_id, res, model_id, run_id),
+        ):
+            paths.extend(p for p in (npz_path, meta_path) if p)
+
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO tile_deletions (path, queued_at) VALUES (?, ?)",
+            [(path, queued_at) for path in paths],
+        )
+        for table in ("tile_hours", "tile_variables", "tile_runs"):
+            conn.executemany(
+                f"DELETE FROM {table} WHERE region_id=? AND resolution_deg=? AND model_id=? AND run_id=?",
+                keys,
+            )
+    return expired
+
+
+def drain_tile_deletions(conn: sqlite3.Connection, batch_size: int = 500) -> int:
+    """Remove the files and directories queued by expire_tile_runs().
+
+    Paths already gone count as done; ones that fail stay queued for the next
+    drain. Returns the number of queue entries completed.
+    """
+    done_total = 0
+    after = ""
+    while True:
+        paths = [
+            row[0]
+            for row in conn.execute(
+                "SELECT path FROM tile_deletions WHERE path > ? ORDER BY path LIMIT ?",
+                (after, batch_size),
+            )
+        ]
+        if not paths:
+            return done_total
+        after = paths[-1]
+        done = []
+        for path in paths:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.error(f"Failed to remove {path}: {exc}")
+                continue
+            done.append((path,))
+        with conn:
+            conn.executemany("DELETE FROM tile_deletions WHERE path = ?", done)
+        done_total += len(done)
+
+
 def list_tile_runs_db(    conn: sqlite3.Connection,
     region_id: str,
     resolution_deg: float,
@@ -278,3 +375,138 @@ def list_tile_models_db(    conn: sqlite3.Connection,
     for row in rows:
         result.setdefault(row["model_id"], []).append(row["run_id"])
     return result
+
+
+# ---------------------------------------------------------------------------
+# In-memory catalog (web read path)
+# ---------------------------------------------------------------------------
+
+def _res_key(resolution_deg: float) -> float:
+    return round(float(resolution_deg), 6)
+
+
+class TileCatalog:
+    """In-memory snapshot of tile_runs / tile_variables for O(1) lookups.
+
+    Uses a dedicated connection so ``PRAGMA data_version`` reflects commits from
+    every other connection. A data_version change only costs one read of
+    ``catalog_state.generation``; the tables are reloaded when that moves, which
+    job-queue churn never does.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.generation: Optional[int] = None
+        self.reloads = 0
+        self._data_version: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # (region, res) -> model -> [run_id, ...] newest first
+        self._runs: Dict[Tuple[str, float], Dict[str, List[str]]] = {}
+        # (region, res, model, run) -> tile_runs row dict
+        self._run_rows: Dict[Tuple[str, float, str, str], Dict[str, Any]] = {}
+        # (region, res, model, run, variable) -> tile_variables row dict (hours decoded)
+        self._variables: Dict[Tuple[str, float, str, str, str], Dict[str, Any]] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Shared across request threads; every use is under self._lock
+            self._conn = connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload if the catalog tables changed. Returns True when reloaded."""
+        with self._lock:
+            conn = self._connection()
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if not force and data_version == self._data_version:
+                return False
+            self._data_version = data_version
+            generation = conn.execute(
+                "SELECT generation FROM catalog_state WHERE id = 1"
+            ).fetchone()[0]
+            if not force and generation == self.generation:
+                return False
+            self._load(conn)
+            self.generation = generation
+            self.reloads += 1
+            return True
+
+    def _load(self, conn: sqlite3.Connection) -> None:
+        runs: Dict[Tuple[str, float], Dict[str, List[str]]] = {}
+        run_rows: Dict[Tuple[str, float, str, str], Dict[str, Any]] = {}
+        for row in conn.execute(
+            "SELECT * FROM tile_runs ORDER BY region_id, resolution_deg, model_id, run_id DESC"
+        ):
+            rec = {key: row[key] for key in row.keys()}
+            res = _res_key(rec["resolution_deg"])
+            runs.setdefault((rec["region_id"], res), {}).setdefault(rec["model_id"], []).append(rec["run_id"])
+            run_rows[(rec["region_id"], res, rec["model_id"], rec["run_id"])] = rec
+
+        variables: Dict[Tuple[str, float, str, str, str], Dict[str, Any]] = {}
+        for row in conn.execute("SELECT * FROM tile_variables"):
+            rec = {key: row[key] for key in row.keys()}
+            rec["hours"] = json.loads(rec.pop("hours_json") or "[]")
+            rec.pop("hours_mask", None)
+            key = (rec["region_id"], _res_key(rec["resolution_deg"]), rec["model_id"], rec["run_id"], rec["variable_id"])
+            variables[key] = rec
+
+        self._runs, self._run_rows, self._variables = runs, run_rows, variables
+
+    def runs(self, region_id: str, resolution_deg: float, model_id: str) -> List[str]:
+        self.refresh()
+        return list(self._runs.get((region_id, _res_key(resolution_deg)), {}).get(model_id, []))
+
+    def models(self, region_id: str, resolution_deg: float) -> Dict[str, List[str]]:
+        self.refresh()
+        by_model = self._runs.get((region_id, _res_key(resolution_deg)), {})
+        return {model_id: list(run_ids) for model_id, run_ids in sorted(by_model.items())}
+
+    def latest_run(self, region_id: str, resolution_deg: float, model_id: str) -> Optional[str]:
+        self.refresh()
+        run_ids = self._runs.get((region_id, _res_key(resolution_deg)), {}).get(model_id)
+        return run_ids[0] if run_ids else None
+
+    def run(self, region_id: str, resolution_deg: float, model_id: str, run_id: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._run_rows.get((region_id, _res_key(resolution_deg), model_id, run_id))
+
+    def variable(    self,
+        region_id: str,
+        resolution_deg: float,
+        model_id: str,
+        run_id: str,
+        variable_id: str,
+    ) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self._variables.get((region_id, _res_key(resolution_deg), model_id, run_id, variable_id))
+
+    def hours(    self,
+        region_id: str,
+        resolution_deg: float,
+        model_id: str,
+        run_id: str,
+        variable_id: str,
+    ) -> List[int]:
+        rec = self.variable(region_id, resolution_deg, model_id, run_id, variable_id)
+        return list(rec["hours"]) if rec else []
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_catalogs: Dict[Tuple[int, str], TileCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db_path: Optional[str] = None) -> TileCatalog:
+    """Process-wide catalog for ``db_path`` (not shared across a fork)."""
+    key = (os.getpid(), db_path or DEFAULT_DB_PATH)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = TileCatalog(key[1])
+        return catalog
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import gzip
 import json
 import logging
+import mmap
 import os
+import struct
+import threading
+from collections import OrderedDict
 from typing import Any, Dict, List, Tuple
 
 import numpy as np
 from filelock import FileLock
 
 from config import repomap
-from tile_db import init_db, list_tile_models_db, list_tile_runs_db
+from tile_db import get_catalog
 from utils import convert_units, time_function
 
 logger = logging.getLogger(__name__)
@@ -21,7 +26,10 @@ def _extract_data_var(ds: xr.Dataset) -> xr.DataArray:
     Handles:
     - Wind speed: prefers si10 (computed by Herbie with_wind) over raw components
     - Unknown var names: NBM ASNOW/SNOWLR decode as 'unknown', just take first var
+    - grib_fetcher.GribField (direct eccodes decode) is already the field
     """
+    if not hasattr(ds, "data_vars"):
+        return ds
     if "si10" in ds.data_vars:
         return ds["si10"]
     if "ws" in ds.data_vars:
@@ -132,6 +140,221 @@ def _reduce_stats(values2d: np.ndarray, valid_mask: np.ndarray, order: np.ndarra
     return min_grid.reshape(ny, nx), max_grid.reshape(ny, nx), mean_grid.reshape(ny, nx)
 
 
+# ---------------------------------------------------------------------------
+# Persistent cell mapping cache
+# ---------------------------------------------------------------------------
+
+# GRIB grid-definition attributes (as exposed by cfgrib) that identify a native grid
+_GRID_KEY_ATTRS = (
+    "GRIB_gridType",
+    "GRIB_Nx",
+    "GRIB_Ny",
+    "GRIB_latitudeOfFirstGridPointInDegrees",
+    "GRIB_longitudeOfFirstGridPointInDegrees",
+    "GRIB_latitudeOfLastGridPointInDegrees",
+    "GRIB_longitudeOfLastGridPointInDegrees",
+    "GRIB_iDirectionIncrementInDegrees",
+    "GRIB_jDirectionIncrementInDegrees",
+    "GRIB_DxInMetres",
+    "GRIB_DyInMetres",
+    "GRIB_LaDInDegrees",
+    "GRIB_LoVInDegrees",
+    "GRIB_Latin1InDegrees",
+    "GRIB_Latin2InDegrees",
+    "GRIB_iScansNegatively",
+    "GRIB_jScansPositively",
+    "GRIB_jPointsAreConsecutive",
+)
+
+_CELL_MAP_ARRAYS = ("gather", "offsets", "cells")
+
+# Process-wide cache: mapping key -> mapping dict (arrays are memory-mapped)
+_cell_maps: Dict[str, Dict[str, Any]] = {}
+
+
+def _grid_fingerprint(da: xr.DataArray) -> str:
+    """Identify the native grid of a DataArray without decoding its coordinates.
+
+    Uses the GRIB grid-definition attributes when present; falls back to hashing
+    the coordinate arrays (derived datasets such as wind speed lose GRIB attrs).
+    """
+    attrs = getattr(da, "attrs", {}) or {}
+    if "GRIB_gridType" in attrs:
+        parts = [f"{k}={attrs[k]}" for k in _GRID_KEY_ATTRS if k in attrs]
+        return "grib:" + "|".join(parts)
+
+    import hashlib
+
+    digest = hashlib.sha1()
+    for coord in (da.latitude, da.longitude):
+        arr = np.ascontiguousarray(np.asarray(coord), dtype=np.float64)
+        digest.update(str(arr.shape).encode("utf-8"))
+        digest.update(arr.tobytes())
+    return "coords:" + digest.hexdigest()
+
+
+def _cell_map_key(grid_id: str, lat_min: float, lat_max: float, lon_min: float, lon_max: float, res_deg: float) -> str:
+    import hashlib
+
+    raw = f"{grid_id}|{lat_min:.6f}|{lat_max:.6f}|{lon_min:.6f}|{lon_max:.6f}|{res_deg:.6f}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def _build_cell_mapping(    lat2d: np.ndarray,
+    lon2d: np.ndarray,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    res_deg: float,
+) -> Dict[str, Any]:
+    """Build a CSR cell mapping restricted to the native-grid bounding box of the region.
+
+    - y0/y1/x0/x1: native-grid slice containing every in-region point
+    - gather: int32 flat indices into values2d[y0:y1, x0:x1], grouped by cell
+    - offsets: int32 CSR segment boundaries into gather (len = n_segments + 1)
+    - cells: int32 tile cell id (iy * nx + ix) of each segment
+    """
+    order, starts, unique_ids, valid, _n_cells, ny, nx = _prep_cell_index(
+        lat2d, lon2d, lat_min, lat_max, lon_min, lon_max, res_deg
+    )
+    lon_0_360 = bool(np.nanmin(lon2d) >= 0)
+    index_lon_min = lon_min if not lon_0_360 else (360.0 + lon_min if lon_min < 0 else lon_min)
+
+    rows, cols = lat2d.shape
+    valid2d = valid.reshape(rows, cols)
+    if starts.size == 0:
+        y0 = y1 = x0 = x1 = 0
+        gather = np.array([], dtype=np.int32)
+    else:
+        row_hits = np.flatnonzero(valid2d.any(axis=1))
+        col_hits = np.flatnonzero(valid2d.any(axis=0))
+        y0, y1 = int(row_hits[0]), int(row_hits[-1]) + 1
+        x0, x1 = int(col_hits[0]), int(col_hits[-1]) + 1
+        flat = np.flatnonzero(valid)[order]
+        r, c = np.divmod(flat, cols)
+        gather = ((r - y0) * (x1 - x0) + (c - x0)).astype(np.int32)
+
+    offsets = np.append(starts, gather.size).astype(np.int32)
+    return {
+        "ny": ny,
+        "nx": nx,
+        "y0": y0,
+        "y1": y1,
+        "x0": x0,
+        "x1": x1,
+        "lon_0_360": lon_0_360,
+        "index_lon_min": float(index_lon_min),
+        "gather": gather,
+        "offsets": offsets,
+        "cells": unique_ids.astype(np.int32),
+    }
+
+
+def _save_cell_mapping(path: str, mapping: Dict[str, Any]) -> None:
+    """Write a mapping directory atomically (temp dir + rename)."""
+    import shutil
+
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name in _CELL_MAP_ARRAYS:
+        np.save(os.path.join(tmp_path, f"{name}.npy"), mapping[name])
+    meta = {k: v for k, v in mapping.items() if k not in _CELL_MAP_ARRAYS}
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another worker published the same mapping first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _load_cell_mapping(path: str) -> Dict[str, Any] | None:
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r") as f:
+            mapping: Dict[str, Any] = json.load(f)
+        for name in _CELL_MAP_ARRAYS:
+            mapping[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    except Exception as exc:
+        logger.warning(f"Unreadable cell mapping at {path}, rebuilding: {exc}")
+        return None
+    return mapping
+
+
+def get_cell_mapping(    da: xr.DataArray,
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    res_deg: float,
+) -> Dict[str, Any]:
+    """Return the cell mapping for da's native grid, building and persisting it on first use.
+
+    The mapping depends only on (grid definition, region bounds, resolution), so it
+    is shared across hours, variables and runs. Lookup order: process memory, then
+    memory-mapped arrays under CELL_MAP_DIR, then a fresh build from coordinates.
+    """
+    key = _cell_map_key(_grid_fingerprint(da), lat_min, lat_max, lon_min, lon_max, res_deg)
+    mapping = _cell_maps.get(key)
+    if mapping is not None:
+        return mapping
+
+    path = os.path.join(repomap.get("CELL_MAP_DIR", "cache/cell_maps"), key)
+    mapping = _load_cell_mapping(path)
+    if mapping is None:
+        lat2d = np.asarray(da.latitude)
+        lon2d = np.asarray(da.longitude)
+        if lat2d.ndim == 1 and lon2d.ndim == 1:
+            lat2d, lon2d = np.meshgrid(lat2d, lon2d, indexing='ij')
+        mapping = _build_cell_mapping(lat2d, lon2d, lat_min, lat_max, lon_min, lon_max, res_deg)
+        try:
+            _save_cell_mapping(path, mapping)
+        except OSError as exc:
+            logger.warning(f"Could not persist cell mapping {key}: {exc}")
+        logger.info(f"Built cell mapping {key} ({mapping['gather'].size} points, {mapping['cells'].size} cells)")
+
+    _cell_maps[key] = mapping
+    return mapping
+
+
+def _reduce_stats_mapped(values2d: np.ndarray, mapping: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reduce a native 2D field to (min, max, mean) tiles via a precomputed CSR mapping.
+
+    Only the in-region bounding box is touched; the per-call cost is one gather
+    plus segment reductions, O(points in region).
+    """
+    ny, nx = mapping["ny"], mapping["nx"]
+    offsets = mapping["offsets"]
+    if offsets.size <= 1:
+        nan_grid = np.full((ny, nx), np.nan, dtype=np.float32)
+        return nan_grid, nan_grid.copy(), nan_grid.copy()
+
+    sub = values2d[mapping["y0"]:mapping["y1"], mapping["x0"]:mapping["x1"]]
+    v = np.ascontiguousarray(sub).ravel().take(mapping["gather"])
+    starts = np.asarray(offsets[:-1])
+    counts = np.diff(offsets)
+
+    sums = np.add.reduceat(v, starts)
+    means = sums / np.maximum(counts, 1)
+    mins = np.minimum.reduceat(v, starts)
+    maxs = np.maximum.reduceat(v, starts)
+
+    cells = mapping["cells"]
+    mean_grid = np.full((ny * nx,), np.nan, dtype=np.float32)
+    min_grid = np.full((ny * nx,), np.nan, dtype=np.float32)
+    max_grid = np.full((ny * nx,), np.nan, dtype=np.float32)
+    mean_grid[cells] = means.astype(np.float32)
+    min_grid[cells] = mins.astype(np.float32)
+    max_grid[cells] = maxs.astype(np.float32)
+
+    return min_grid.reshape(ny, nx), max_grid.reshape(ny, nx), mean_grid.reshape(ny, nx)
+
+
 @time_function
 def build_tiles_for_variable(
     datasets_by_hour: Dict[int, xr.Dataset],
@@ -144,14 +367,15 @@ def build_tiles_for_variable(
 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[int], Dict[str, Any]]:
     """Build (min, max, mean) tiles for all hours for a single variable.
 
-    Accepts pre-opened xarray Datasets (from Herbie) keyed by forecast hour.
+    Accepts pre-opened xarray Datasets (from Herbie) or grib_fetcher.GribField
+    objects keyed by forecast hour.
     Returns arrays shaped (time, ny, nx) and the sorted hours list.
     """
     hours_sorted = sorted(datasets_by_hour.keys())
     if not hours_sorted:
         raise ValueError("No datasets provided")
 
-    # Use first hour to get grid and precompute mapping
+    # Use first hour to get grid and look up the (cached) mapping
     ds0 = datasets_by_hour[hours_sorted[0]]
     da0 = _extract_data_var(ds0)
 
@@ -162,21 +386,10 @@ def build_tiles_for_variable(
     if src_units and src_units in by_units:
         conversion = by_units[src_units]
 
-    if conversion:
-        da0 = convert_units(da0, conversion)
-
-    lat2d = np.array(da0.latitude)
-    lon2d = np.array(da0.longitude)
-
-    # Handle 1D coordinates (e.g. GFS) by broadcasting to 2D
-    if lat2d.ndim == 1 and lon2d.ndim == 1:
-        lat2d, lon2d = np.meshgrid(lat2d, lon2d, indexing='ij')
-
-    order, starts, unique_ids, valid_mask_flat, n_cells, ny, nx = _prep_cell_index(
-        lat2d, lon2d, lat_min, lat_max, lon_min, lon_max, res_deg
-    )
-    lon_0_360 = bool(np.nanmin(lon2d) >= 0)
-    used_lon_min = lon_min if not lon_0_360 else (360.0 + lon_min if lon_min < 0 else lon_min)
+    mapping = get_cell_mapping(da0, lat_min, lat_max, lon_min, lon_max, res_deg)
+    ny, nx = mapping["ny"], mapping["nx"]
+    lon_0_360 = bool(mapping["lon_0_360"])
+    used_lon_min = float(mapping["index_lon_min"])
 
     t = len(hours_sorted)
     mins = np.full((t, ny, nx), np.nan, dtype=np.float32)
@@ -185,11 +398,10 @@ def build_tiles_for_variable(
 
     for ti, hour in enumerate(hours_sorted):
         ds = datasets_by_hour[hour]
-        da = _extract_data_var(ds)
+        v2d = np.asarray(_extract_data_var(ds).values)
         if conversion:
-            da = convert_units(da, conversion)
-        v2d = np.array(da.values)
-        mn, mx, mu = _reduce_stats(v2d, valid_mask_flat, order, starts, unique_ids, n_cells, ny, nx)
+            v2d = convert_units(v2d, conversion)
+        mn, mx, mu = _reduce_stats_mapped(v2d, mapping)
         mins[ti] = mn
         maxs[ti] = mx
         means[ti] = mu
@@ -313,6 +525,374 @@ def upsert_tiles_npz(    base_dir: str,
 
     return npz_path, merged_hours
 
+
+# ---------------------------------------------------------------------------
+# rctile v2 (cell-major, per-cell gzip chunks) — see docs/rctile-v2-spec.md
+# ---------------------------------------------------------------------------
+
+RCTILE_MAGIC = b"RCT2"
+RCTILE_VERSION = 2
+RCTILE_HEADER_SIZE = 128
+# magic, version, ny, nx, n_cells, lat_min, lat_max, lon_min, lon_max, resolution,
+# n_runs, total_values_per_cell, runs_table_offset, index_offset, data_offset
+_RCTILE_HEADER = struct.Struct("<4sHHHIfffffHHQQQ")
+_RCTILE_RUN_HEAD = struct.Struct("<16sqH")
+
+# Values below these thresholds (display units) are snapped to 0.0 before writing,
+# matching the Rust worker's snap_threshold().
+RCTILE_SNAP_THRESHOLDS = {"apcp": 0.005, "asnow": 0.005, "snod": 0.01}
+
+
+def rctile_path(base_dir: str, region_id: str, resolution_deg: float, model_id: str, run_id: str, variable_id: str) -> str:
+    """Path of the per-run v2 file: {region}/{res}/{model}/{variable}/{run_id}.rctile."""
+    res_dir = f"{resolution_deg:.3f}deg".rstrip("0").rstrip(".")
+    return os.path.join(base_dir, region_id, res_dir, model_id, variable_id, f"{run_id}.rctile")
+
+
+def write_rctile_v2(    path: str,
+    runs: List[Dict[str, Any]],
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    resolution_deg: float,
+) -> None:
+    """Write a v2 rctile file atomically (temp file + rename).
+
+    Each run is a dict with ``run_id``, ``init_unix``, ``hours`` and ``values``
+    shaped (len(hours), ny, nx). Cells that are 0.0 for every value of every run
+    are elided (equal adjacent offsets in the cell index).
+    """
+    if not runs:
+        raise ValueError("rctile v2 needs at least one run")
+    ny, nx = runs[0]["values"].shape[1:]
+    n_cells = ny * nx
+
+    runs_table = bytearray()
+    for run in runs:
+        hours = np.asarray(run["hours"], dtype="<i4")
+        runs_table += _RCTILE_RUN_HEAD.pack(run["run_id"].encode()[:16], int(run["init_unix"]), hours.size)
+        runs_table += hours.tobytes()
+
+    # Cell-major view: one row of all runs' hours per cell
+    stacked = np.concatenate([np.asarray(run["values"], dtype=np.float32) for run in runs], axis=0)
+    total_values = stacked.shape[0]
+    cell_major = np.ascontiguousarray(stacked.reshape(total_values, n_cells).T, dtype="<f4")
+    elided = np.all(cell_major == 0.0, axis=1)
+
+    chunks: List[bytes] = []
+    sizes = np.zeros(n_cells, dtype=np.uint64)
+    for cell in np.flatnonzero(~elided):
+        chunk = gzip.compress(cell_major[cell].tobytes(), compresslevel=1, mtime=0)
+        chunks.append(chunk)
+        sizes[cell] = len(chunk)
+    offsets = np.zeros(n_cells + 1, dtype="<u8")
+    np.cumsum(sizes, out=offsets[1:])
+
+    runs_table_offset = RCTILE_HEADER_SIZE
+    index_offset = runs_table_offset + len(runs_table)
+    data_offset = index_offset + offsets.nbytes
+    header = _RCTILE_HEADER.pack(
+        RCTILE_MAGIC, RCTILE_VERSION, ny, nx, n_cells,
+        lat_min, lat_max, lon_min, lon_max, resolution_deg,
+        len(runs), total_values, runs_table_offset, index_offset, data_offset,
+    ).ljust(RCTILE_HEADER_SIZE, b"\0")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(runs_table)
+        f.write(offsets.tobytes())
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_tiles_rctile(    base_dir: str,
+    region_id: str,
+    resolution_deg: float,
+    model_id: str,
+    run_id: str,
+    variable_id: str,
+    means: np.ndarray,
+    hours: List[int],
+    meta: Dict[str, Any],
+) -> str:
+    """Write one run of ``build_tiles_for_variable`` output as a v2 rctile file.
+
+    v2 stores a single value per cell per hour, so only the means are kept.
+    """
+    values = np.array(means, dtype=np.float32)
+    threshold = RCTILE_SNAP_THRESHOLDS.get(variable_id)
+    if threshold:
+        values[np.abs(values) < threshold] = 0.0
+    path = rctile_path(base_dir, region_id, resolution_deg, model_id, run_id, variable_id)
+    run = {"run_id": run_id, "init_unix": _run_init_unix(run_id, meta), "hours": hours, "values": values}
+    write_rctile_v2(
+        path,
+        [run],
+        meta["lat_min"],
+        meta["lat_max"],
+        meta["lon_min"],
+        meta["lon_max"],
+        resolution_deg,
+    )
+    return path
+
+
+def _run_init_unix(run_id: str, meta: Dict[str, Any]) -> int:
+    from datetime import datetime, timezone
+
+    init_time = meta.get("init_time_utc")
+    if init_time:
+        dt = datetime.strptime(init_time, "%Y-%m-%dT%H:%M:%SZ")
+    else:
+        dt = datetime.strptime(run_id, "run_%Y%m%d_%H")
+    return int(dt.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _read_rctile_header(buf) -> Dict[str, Any]:
+    if len(buf) < RCTILE_HEADER_SIZE:
+        raise ValueError("File too small for rctile v2 header")
+    (magic, version, ny, nx, n_cells, lat_min, lat_max, lon_min, lon_max, res,
+     n_runs, total_values, runs_table_offset, index_offset, data_offset) = _RCTILE_HEADER.unpack_from(buf, 0)
+    if magic != RCTILE_MAGIC:
+        raise ValueError("Invalid magic: expected RCT2")
+    if version != RCTILE_VERSION:
+        raise ValueError(f"Unsupported rctile version: {version}")
+
+    runs = []
+    pos = runs_table_offset
+    for _ in range(n_runs):
+        run_id, init_unix, n_hours = _RCTILE_RUN_HEAD.unpack_from(buf, pos)
+        pos += _RCTILE_RUN_HEAD.size
+        hours = np.frombuffer(buf, dtype="<i4", count=n_hours, offset=pos).astype(np.int32)
+        pos += 4 * n_hours
+        runs.append({"run_id": run_id.rstrip(b"\0").decode(), "init_unix": init_unix, "hours": hours})
+
+    return {
+        "ny": ny, "nx": nx, "n_cells": n_cells,
+        "lat_min": lat_min, "lat_max": lat_max, "lon_min": lon_min, "lon_max": lon_max,
+        "resolution_deg": res, "total_values": total_values,
+        "index_offset": index_offset, "data_offset": data_offset, "runs": runs,
+    }
+
+
+def _read_rctile_cell(buf, header: Dict[str, Any], iy: int, ix: int) -> np.ndarray:
+    """Decompress the values of one cell (all runs' hours, in runs-table order)."""
+    cell = iy * header["nx"] + ix
+    start, end = struct.unpack_from("<QQ", buf, header["index_offset"] + cell * 8)
+    if start == end:
+        return np.zeros(header["total_values"], dtype=np.float32)
+    base = header["data_offset"]
+    raw = gzip.decompress(buf[base + start:base + end])
+    return np.frombuffer(raw, dtype="<f4").astype(np.float32)
+
+
+def _rctile_cell_for(header: Dict[str, Any], lat: float, lon: float) -> Tuple[int, int]:
+    # v2 headers are always west-negative; cell math is the same as the Rust reader
+    if lon > 180.0:
+        lon -= 360.0
+    res = header["resolution_deg"]
+    iy = int(np.floor((lat - header["lat_min"]) / res))
+    ix = int(np.floor((lon - header["lon_min"]) / res))
+    return max(0, min(header["ny"] - 1, iy)), max(0, min(header["nx"] - 1, ix))
+
+
+def query_point_rctile_v2(path: str, lat: float, lon: float) -> List[Dict[str, Any]]:
+    """Point query against a v2 rctile file via mmap.
+
+    Reads the header, runs table and one cell-index entry, then decompresses a
+    single cell chunk. Returns one dict per run with ``run_id``, ``init_unix``,
+    ``hours`` and ``values``.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        header = _read_rctile_header(buf)
+        iy, ix = _rctile_cell_for(header, lat, lon)
+        values = _read_rctile_cell(buf, header, iy, ix)
+    return _split_rctile_runs(header, values)
+
+
+def _split_rctile_runs(header: Dict[str, Any], values: np.ndarray) -> List[Dict[str, Any]]:
+    out = []
+    pos = 0
+    for run in header["runs"]:
+        n = run["hours"].size
+        out.append({**run, "values": values[pos:pos + n]})
+        pos += n
+    return out
+
+
+def _nearest_valid_column(column, iy: int, ix: int, ny: int, nx: int, search_radius: int = 3) -> np.ndarray:
+    """Return column(iy, ix), or the nearest non-all-NaN neighbour within the radius.
+
+    Handles sparse native grids tiled at a finer resolution (e.g. GFS 0.25 deg on
+    0.1 deg tiles) where many cells are empty.
+    """
+    values = column(iy, ix)
+    if not np.all(np.isnan(values)):
+        return values
+    best_dist_sq = float('inf')
+    y_min = max(0, iy - search_radius)
+    y_max = min(ny - 1, iy + search_radius)
+    x_min = max(0, ix - search_radius)
+    x_max = min(nx - 1, ix + search_radius)
+    for cy in range(y_min, y_max + 1):
+        for cx in range(x_min, x_max + 1):
+            if cy == iy and cx == ix:
+                continue
+            dist_sq = (cy - iy)**2 + (cx - ix)**2
+            if dist_sq >= best_dist_sq:
+                continue
+            cand_vals = column(cy, cx)
+            if not np.all(np.isnan(cand_vals)):
+                best_dist_sq = dist_sq
+                values = cand_vals
+    return values
+
+
+def _load_timeseries_rctile(path: str, run_id: str, lat: float, lon: float) -> Tuple[np.ndarray, np.ndarray]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        header = _read_rctile_header(buf)
+        runs = header["runs"]
+        slot = next((i for i, r in enumerate(runs) if r["run_id"] == run_id), None)
+        if slot is None:
+            raise FileNotFoundError(f"Run {run_id} not present in {path}")
+        start = sum(r["hours"].size for r in runs[:slot])
+        end = start + runs[slot]["hours"].size
+        iy, ix = _rctile_cell_for(header, lat, lon)
+        values = _nearest_valid_column(
+            lambda cy, cx: _read_rctile_cell(buf, header, cy, cx)[start:end],
+            iy, ix, header["ny"], header["nx"],
+        )
+    return runs[slot]["hours"].copy(), values
+
+
+# ---------------------------------------------------------------------------
+# Decoded tile cache (read path)
+# ---------------------------------------------------------------------------
+
+class TileArrayCache:
+    """Process-wide LRU of decoded tile arrays and parsed meta, bounded by bytes.
+
+    Keys are (kind, path, mtime_ns, size, ...) so a rewritten file is a miss;
+    entries for the same path with a different stamp are dropped when the new
+    version is stored. Other entries of the same version (e.g. the other
+    stats of one NPZ) are kept.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, value: Any, nbytes: int) -> None:
+        with self._lock:
+            for old_key in [k for k in self._entries if k[:2] == key[:2] and k[2:4] != key[2:4]]:
+                self._drop(old_key)
+            if nbytes > self.max_bytes:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: tuple) -> None:
+        _, nbytes = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_tile_cache = TileArrayCache(int(repomap.get("TILE_CACHE_MAX_MB", 128)) * 1024 * 1024)
+
+
+def tile_cache_stats() -> Dict[str, Any]:
+    return _tile_cache.stats()
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _cached_meta(meta_path: str) -> Dict[str, Any]:
+    stamp = _file_stamp(meta_path)
+    key = ("meta", meta_path) + stamp
+    meta = _tile_cache.get(key)
+    if meta is None:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        # Parsed JSON is a few times the file size; close enough for budgeting
+        _tile_cache.put(key, meta, 4 * stamp[1])
+    return meta
+
+
+def _cached_stat_array(npz_path: str, stat: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (hours, stat array) for an NPZ, decoding at most once per file version.
+
+    Falls back to means when the requested stat is not stored. The returned arrays
+    are shared and read-only.
+    """
+    stamp = _file_stamp(npz_path)
+    key = ("npz", npz_path) + stamp + (stat,)
+    cached = _tile_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        npz_data = np.load(npz_path)
+    except Exception:
+        raise FileNotFoundError(f"Corrupt tile at {npz_path}")
+    with npz_data as d:
+        hours = d["hours"].copy()
+        # Fallback to means when requested stat is not available
+        name = "means"
+        if stat == "min" and "mins" in d.files:
+            name = "mins"
+        elif stat == "max" and "maxs" in d.files:
+            name = "maxs"
+        arr = d[name]
+    hours.setflags(write=False)
+    arr.setflags(write=False)
+    _tile_cache.put(key, (hours, arr), hours.nbytes + arr.nbytes)
+    return hours, arr
+
+
+
 def load_timeseries_for_point(    base_dir: str,
     region_id: str,
     resolution_deg: float,
@@ -325,79 +905,60 @@ def load_timeseries_for_point(    base_dir: str,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
     Load a timeseries for the cell containing (lat, lon). Returns (hours, values).
+
+    Means are read from the v2 rctile file when present (one cell chunk is
+    decompressed); v2 stores a single value per cell, so min/max always come
+    from the NPZ.
     """
+    rct_path = rctile_path(base_dir, region_id, resolution_deg, model_id, run_id, variable_id)
+    if stat == "mean" and os.path.exists(rct_path):
+        try:
+            return _load_timeseries_rctile(rct_path, run_id, lat, lon)
+        except (ValueError, struct.error, OSError, EOFError) as exc:
+            logger.warning(f"Unreadable rctile at {rct_path}, falling back to NPZ: {exc}")
+
     res_dir = f"{resolution_deg:.3f}deg".rstrip("0").rstrip(".")
     npz_path = os.path.join(base_dir, region_id, res_dir, model_id, run_id, f"{variable_id}.npz")
     meta_path = os.path.join(base_dir, region_id, res_dir, model_id, run_id, f"{variable_id}.meta.json")
-    if not os.path.exists(npz_path) or not os.path.exists(meta_path):
+    if not os.path.exists(npz_path):
         raise FileNotFoundError(f"Tiles not found for {variable_id} at {npz_path}")
-    with open(meta_path, "r") as f:
-        meta = json.load(f)
-    lat_min = meta["lat_min"]
-    # Use indexing lon_min if present (handles 0-360 indexing)
-    lon_min_index = meta.get("index_lon_min", meta.get("lon_min"))
-    lon_0_360 = bool(meta.get("lon_0_360", False))
+    # Geometry comes from the catalog; meta.json only for runs recorded without bounds
+    run = get_catalog(repomap.get("DB_PATH")).run(region_id, resolution_deg, model_id, run_id)
+    if run and run.get("lat_min") is not None and run.get("index_lon_min") is not None:
+        lat_min = run["lat_min"]
+        lon_min_index = run["index_lon_min"]
+        lon_0_360 = bool(run.get("lon_0_360"))
+        res = resolution_deg
+    else:
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Tiles not found for {variable_id} at {npz_path}")
+        meta = _cached_meta(meta_path)
+        lat_min = meta["lat_min"]
+        # Use indexing lon_min if present (handles 0-360 indexing)
+        lon_min_index = meta.get("index_lon_min", meta.get("lon_min"))
+        lon_0_360 = bool(meta.get("lon_0_360", False))
+        res = meta["resolution_deg"]
     try:
-        npz_data = np.load(npz_path)
-    except Exception:
+        hours, arr = _cached_stat_array(npz_path, stat)
+    except FileNotFoundError:
         raise FileNotFoundError(f"Corrupt tile for {variable_id} at {npz_path}")
-    with npz_data as d:
-        hours = d["hours"].copy()
-        # Fallback to means when requested stat is not available
-        key = "means"
-        if stat == "min" and "mins" in d.files:
-            key = "mins"
-        elif stat == "max" and "maxs" in d.files:
-            key = "maxs"
-        arr = d[key]
-
-        ny, nx = arr.shape[1], arr.shape[2]
-        iy = int(np.floor((lat - lat_min) / meta["resolution_deg"]))
-        # Normalize longitude if tiles were indexed on 0-360
-        target_lon = lon + 360.0 if (lon_0_360 and lon < 0) else lon
-        ix = int(np.floor((target_lon - lon_min_index) / meta["resolution_deg"]))
-        iy = max(0, min(ny - 1, iy))
-        ix = max(0, min(nx - 1, ix))
-        values = arr[:, iy, ix].copy()
-
-        # If the exact point is missing (NaN) due to sparse grid vs tile resolution mismatch,
-        # search for the nearest valid neighbor within a small radius.
-        # This handles cases like GFS (0.25 deg) on 0.1 deg tiles where many cells are empty.
-        if np.all(np.isnan(values)):
-            search_radius = 3
-            best_dist_sq = float('inf')
-
-            y_min = max(0, iy - search_radius)
-            y_max = min(ny - 1, iy + search_radius)
-            x_min = max(0, ix - search_radius)
-            x_max = min(nx - 1, ix + search_radius)
-
-            for cy in range(y_min, y_max + 1):
-                for cx in range(x_min, x_max + 1):
-                    if cy == iy and cx == ix:
-                        continue
-                    cand_vals = arr[:, cy, cx].copy()
-                    if not np.all(np.isnan(cand_vals)):
-                        dist_sq = (cy - iy)**2 + (cx - ix)**2
-                        if dist_sq < best_dist_sq:
-                            best_dist_sq = dist_sq
-                            values = cand_vals
-
-    return hours, values
+
+    ny, nx = arr.shape[1], arr.shape[2]
+    iy = int(np.floor((lat - lat_min) / res))
+    # Normalize longitude if tiles were indexed on 0-360
+    target_lon = lon + 360.0 if (lon_0_360 and lon < 0) else lon
+    ix = int(np.floor((target_lon - lon_min_index) / res))
+    iy = max(0, min(ny - 1, iy))
+    ix = max(0, min(nx - 1, ix))
+    values = _nearest_valid_column(lambda cy, cx: arr[:, cy, cx].copy(), iy, ix, ny, nx)
+
+    return hours.copy(), values
 
 
 def list_tile_runs(base_dir: str, region_id: str, resolution_deg: float, model_id: str) -> List[str]:
-    conn = init_db(repomap.get("DB_PATH"))
-    try:
-        return list_tile_runs_db(conn, region_id, resolution_deg, model_id)
-    finally:
-        conn.close()
+    return get_catalog(repomap.get("DB_PATH")).runs(region_id, resolution_deg, model_id)
 
 
 def list_tile_models(base_dir: str, region_id: str, resolution_deg: float) -> Dict[str, List[str]]:
     """Return models present under a region/resolution with their available runs."""
-    conn = init_db(repomap.get("DB_PATH"))
-    try:
-        return list_tile_models_db(conn, region_id, resolution_deg)
-    finally:
-        conn.close()
+    return get_catalog(repomap.get("DB_PATH")).models(region_id, resolution_deg)